@@ -0,0 +1,88 @@
+"""
+Cost of building the model context for every turn of a long conversation.
+
+Compares the old character-based prune_messages, which walked the whole
+history backwards on each turn, with the token ledger from
+src/utils/tokens.py, which counts each new message once and finds the
+window with a binary search over prefix sums.
+
+Usage:
+    python benchmarks/bench_context.py
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.functions import prune_messages
+from src.utils.tokens import TokenLedger, context_budget
+
+HISTORY_SIZES = [1_000, 10_000]
+TURNS = 200
+
+
+def sample_message(index: int):
+    role = "user" if index % 2 == 0 else "assistant"
+    return {"role": role, "content": f"Message {index}: " + "tell me more about the weather " * 8}
+
+
+def legacy_prune(messages, max_chars):
+    # prune_messages before token budgeting: O(n) per turn
+    pruned_messages = []
+    total_chars = 0
+    for message in reversed(messages):
+        content_length = len(message["content"])
+        remaining_chars = max_chars - total_chars
+        if remaining_chars <= 0:
+            break
+        if content_length > remaining_chars:
+            pruned_messages.append({"role": message["role"], "content": message["content"][:remaining_chars]})
+            break
+        pruned_messages.append(message)
+        total_chars += content_length
+    return list(reversed(pruned_messages))
+
+
+def report(label: str, elapsed: float):
+    print(f"  {label:<28} {elapsed / TURNS * 1e6:10.1f} us/turn")
+
+
+async def bench(history_size: int):
+    print(f"{history_size} messages, {TURNS} turns:")
+    # A budget larger than the history is the worst case for the old walk
+    budget = context_budget("gpt-5")
+
+    messages = [sample_message(i) for i in range(history_size)]
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        messages.append(sample_message(history_size + turn))
+        legacy_prune(messages, max_chars=budget * 4)
+    report("characters, full walk", time.perf_counter() - start)
+
+    messages = [sample_message(i) for i in range(history_size)]
+    ledger = TokenLedger()
+    ledger.sync(messages)  # counted once, as when loaded from storage
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        messages.append(sample_message(history_size + turn))
+        await prune_messages(messages, max_tokens=budget, ledger=ledger)
+    report("tokens, ledger", time.perf_counter() - start)
+
+    # A small budget keeps only the newest messages, slicing is then cheap too
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        messages.append(sample_message(history_size + TURNS + turn))
+        await prune_messages(messages, max_tokens=4_000, ledger=ledger)
+    report("tokens, ledger, 4k budget", time.perf_counter() - start)
+
+
+def main():
+    for history_size in HISTORY_SIZES:
+        asyncio.run(bench(history_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Encryption throughput for 1 KB, 32 KB and 256 KB of history.
+
+Compares the old path, which built a new Fernet per row and encrypted the
+whole history as one JSON blob, with the per-message envelopes that
+ConversationMessages stores: the cached Fernet and the binary AEAD
+envelopes from src/database/encryption.py, with and without the
+compression stage.
+
+A second part sends one payload of each size through encrypt_text_async /
+decrypt_text_async, which move payloads of OFFLOAD_THRESHOLD and more to a
+thread, and reports the longest the event loop was blocked meanwhile.
+
+Usage:
+    python benchmarks/bench_encryption.py
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.database import encryption
+from src.database.encryption import (
+    OFFLOAD_THRESHOLD,
+    decrypt_text,
+    decrypt_text_async,
+    encrypt_text,
+    encrypt_text_async,
+)
+
+SIZES = {"1KB": 1024, "32KB": 32 * 1024, "256KB": 256 * 1024}
+
+# Pieces of typical turns; messages mix them so no two are alike
+OPENERS = [
+    "Can you help me with", "Could you please explain", "What is the difference between",
+    "Sure! Here's how to handle", "Great question. In short,", "I tried your suggestion for",
+    "Thanks, that worked, but now", "Translate this into German:", "Summarize the article about",
+]
+TOPICS = [
+    "a Postgres index on a jsonb column", "the rent increase clause in my lease", "sourdough hydration at 78%",
+    "retrying HTTP 429 responses with jitter", "the Treaty of Westphalia", "a 5k training plan for week 3",
+    "migrating a Django app from 3.2 to 5.0", "the eigenvalues of a 3x3 rotation matrix",
+    "booking a train from Lyon to Milan on 14 May", "why my React effect runs twice",
+]
+DETAILS = [
+    "The error says KeyError: 'user_id' on line 212.", "It costs about $1,240 a month right now.",
+    "I get 503 from the gateway roughly every 40 requests.", "My oven only goes up to 230°C.",
+    "Die Besprechung wurde auf Donnerstag verschoben.", "会议改到星期四下午三点。",
+    "The deadline is the end of Q3, so roughly eleven weeks.", "Here is the stack trace from the worker.",
+]
+CODE = [
+    "```python\nfor attempt in range(5):\n    await asyncio.sleep(2 ** attempt * random.random())\n```",
+    "```sql\nCREATE INDEX idx_meta ON events USING gin (meta jsonb_path_ops);\n```",
+    "```bash\npython manage.py migrate --plan | grep -v auth\n```",
+]
+
+
+def sample_history(size: int, seed: int = 7):
+    """Varied user and assistant messages, about ``size`` bytes of content, as ConversationMessages stores them."""
+    rng = random.Random(seed)
+    messages = []
+    total = 0
+    index = 0
+    while total < size:
+        if index % 2 == 0:
+            content = f"{rng.choice(OPENERS)} {rng.choice(TOPICS)}? {rng.choice(DETAILS)}"
+        else:
+            parts = [f"{rng.choice(OPENERS)} {rng.choice(TOPICS)}."]
+            parts += rng.sample(DETAILS, rng.randint(1, 4))
+            if rng.random() < 0.3:
+                parts.append(rng.choice(CODE))
+            parts.append(f"Step {rng.randint(1, 9)}: check the value {rng.randint(10, 99999)} again.")
+            content = " ".join(parts)
+        content = content[:size - total]
+        messages.append({"role": "user" if index % 2 == 0 else "assistant", "content": content})
+        total += len(content.encode())
+        index += 1
+    return messages
+
+
+def legacy_roundtrip(messages) -> int:
+    # What UserData.to_db_row/from_db_row used to do: one blob per user row
+    text = json.dumps(messages)
+    f = Fernet(config.security.encryption_key.encode())
+    stored = f"ENC:{f.encrypt(text.encode()).decode()}"
+    f = Fernet(config.security.encryption_key.encode())
+    f.decrypt(stored.split("ENC:", 1)[1].encode())
+    return len(stored)
+
+
+def module_roundtrip(messages) -> int:
+    # One envelope per message row, as history.py writes and reads them
+    stored_size = 0
+    for message in messages:
+        stored = encrypt_text(message["content"])
+        decrypt_text(stored)
+        stored_size += len(stored)
+    return stored_size
+
+
+def bench(label: str, func, messages, iterations: int):
+    size = sum(len(message["content"].encode()) for message in messages)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        stored_size = func(messages)
+    elapsed = time.perf_counter() - start
+    throughput = size * iterations / elapsed / 1024 / 1024
+    overhead = stored_size / size - 1
+    print(f"  {label:<16} {throughput:8.1f} MB/s  {overhead:+6.1%} size")
+
+
+async def bench_async(label: str, text: str, iterations: int):
+    """Round trips through the async API, with a ticker measuring event loop stalls."""
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0)
+
+    ticking = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await decrypt_text_async(await encrypt_text_async(text))
+        # As between two requests, so a stall is one round trip at most
+        await asyncio.sleep(0)
+    end = time.perf_counter()
+    ticking.cancel()
+    moments = [start] + [tick for tick in ticks if tick > start] + [end]
+    stall = max(later - earlier for earlier, later in zip(moments, moments[1:]))
+    throughput = len(text.encode()) * iterations / (end - start) / 1024 / 1024
+    print(f"  {label:<16} {throughput:8.1f} MB/s  {stall * 1000:6.2f} ms longest loop stall")
+
+
+async def bench_payloads():
+    config.security.cipher = "aesgcm"
+    config.database.compression = "none"
+    print(f"Single payloads through the async API (offloaded from {OFFLOAD_THRESHOLD // 1024} KB)")
+    for size_label, size in SIZES.items():
+        text = " ".join(message["content"] for message in sample_history(size))[:size]
+        iterations = max(20, 4 * 1024 * 1024 // size)
+        offloaded = "thread" if len(text) >= OFFLOAD_THRESHOLD else "inline"
+        await bench_async(f"{size_label} ({offloaded})", text, iterations)
+        if offloaded == "thread":
+            # The same payload kept on the event loop, for comparison
+            encryption.OFFLOAD_THRESHOLD = len(text) + 1
+            await bench_async(f"{size_label} (inline)", text, iterations)
+            encryption.OFFLOAD_THRESHOLD = OFFLOAD_THRESHOLD
+
+
+def main():
+    if not config.security.encryption_key:
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    for size_label, size in SIZES.items():
+        messages = sample_history(size)
+        iterations = max(5, 2 * 1024 * 1024 // size)
+        print(f"{size_label} history in {len(messages)} messages, {iterations} encrypt+decrypt round trips")
+        bench("fernet (per row)", legacy_roundtrip, messages, iterations)
+        config.security.cipher = "fernet"
+        bench("fernet", module_roundtrip, messages, iterations)
+        for cipher in ("aesgcm", "chacha20"):
+            for compression in ("none", "zlib"):
+                config.security.cipher = cipher
+                config.database.compression = compression
+                bench(f"{cipher}+{compression}", module_roundtrip, messages, iterations)
+
+    asyncio.run(bench_payloads())
+
+
+if __name__ == "__main__":
+    main()
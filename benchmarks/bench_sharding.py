@@ -0,0 +1,78 @@
+"""
+Write throughput of the single-file backend versus K shards.
+
+Simulates concurrent chat turns: every task appends a user/assistant
+exchange to its own user and saves it, like handle_text_model does.
+
+Each layout runs with synchronous=FULL and OFF; the gap between the two
+is the commit/fsync cost that per-shard writers are meant to overlap.
+Measured on one ext4 volume (200 users x 10 turns), K shards are no faster
+than one file in either mode: about 4000 saves/s with FULL, 6000 with OFF.
+The fsyncs of all shards still go through the same filesystem journal,
+and without them the saves are bound by the event loop, which encrypts
+every message and hops to aiosqlite's threads for each statement.
+Sharding can only pay off with shards on separate devices.
+
+Usage:
+    python benchmarks/bench_sharding.py [users] [turns]
+"""
+import asyncio
+import dataclasses
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.database.backends import SQLiteBackend, ShardedSQLiteBackend
+from src.database.entities import UserData
+
+
+async def run(backend, users: int, turns: int) -> float:
+    user_data = [UserData(user_id=user_id) for user_id in range(users)]
+
+    async def chat(user: UserData):
+        for turn in range(turns):
+            user.messages.append({"role": "user", "content": f"Question {turn} " * 20})
+            user.messages.append({"role": "assistant", "content": f"Answer {turn} " * 80})
+            user.count_messages += 1
+            for callback in await backend.write_users([(user, user.take_changes())]):
+                callback()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(user) for user in user_data))
+    return users * turns / (time.perf_counter() - start)
+
+
+async def main(users: int, turns: int):
+    if not config.security.encryption_key:
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    print(f"{'':<12} {'FULL':>8} {'OFF':>8}  saves/s by synchronous")
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in (1, 2, 4, 8):
+            rates = []
+            for synchronous in ("FULL", "OFF"):
+                settings = dataclasses.replace(config.database, synchronous=synchronous)
+                if shards == 1:
+                    backend = SQLiteBackend(Path(tmp) / f"single_{synchronous}.db", settings)
+                else:
+                    backend = ShardedSQLiteBackend(Path(tmp) / f"shards_{shards}_{synchronous}", shards, settings)
+                await backend.open()
+                try:
+                    rates.append(await run(backend, users, turns))
+                finally:
+                    await backend.close()
+            label = "single file" if shards == 1 else f"{shards} shards"
+            print(f"{label:<12} {rates[0]:8.0f} {rates[1]:8.0f}")
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(users, turns))
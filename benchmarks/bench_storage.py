@@ -0,0 +1,100 @@
+"""
+Per-operation latency of the storage layer.
+
+Compares the old "open a new aiosqlite connection per call" pattern with the
+pooled SQLiteEngine used by src/database/storage.py.
+
+Usage:
+    python benchmarks/bench_storage.py [iterations]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database.engine import SQLiteEngine
+from src.database.backends import SELECT_USER_SQL, UPSERT_USER_SQL
+
+CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS UsersData (
+        user_id TEXT PRIMARY KEY, model TEXT, model_message_info TEXT,
+        model_message_chat TEXT, messages TEXT, count_messages INTEGER,
+        max_out INTEGER, voice_answer BOOLEAN, system_message TEXT,
+        pic_grade TEXT, pic_size TEXT, username TEXT, last_active INTEGER,
+        response_cache BOOLEAN
+    )
+"""
+
+
+def sample_row(user_id: int):
+    # Plain row without encryption so the benchmark only measures SQLite
+    return (
+        str(user_id), "gpt-5-nano", "5 nano", "5 nano:\n\n", "[]",
+        1, 128000, False, "", "standard", "1024x1024", f"user{user_id}", 0, True,
+    )
+
+
+def report(label: str, elapsed: float, iterations: int):
+    print(f"{label:<28} {elapsed / iterations * 1e6:10.1f} us/op")
+
+
+async def bench_per_call(path: Path, iterations: int):
+    start = time.perf_counter()
+    for i in range(iterations):
+        async with aiosqlite.connect(path) as db:
+            await db.execute(UPSERT_USER_SQL, sample_row(i % 100))
+            await db.commit()
+    report("per-call connect: save", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        async with aiosqlite.connect(path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(SELECT_USER_SQL, (str(i % 100),)) as cursor:
+                await cursor.fetchone()
+    report("per-call connect: load", time.perf_counter() - start, iterations)
+
+
+async def bench_pooled(path: Path, iterations: int):
+    engine = SQLiteEngine(path)
+    await engine.open()
+    try:
+        start = time.perf_counter()
+        for i in range(iterations):
+            async with engine.writer() as db:
+                await db.execute(UPSERT_USER_SQL, sample_row(i % 100))
+        report("pooled engine: save", time.perf_counter() - start, iterations)
+
+        start = time.perf_counter()
+        for i in range(iterations):
+            async with engine.reader() as db:
+                async with db.execute(SELECT_USER_SQL, (str(i % 100),)) as cursor:
+                    await cursor.fetchone()
+        report("pooled engine: load", time.perf_counter() - start, iterations)
+    finally:
+        await engine.close()
+
+
+async def main(iterations: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.db"
+        async with aiosqlite.connect(legacy_path) as db:
+            await db.execute(CREATE_SQL)
+            await db.commit()
+        await bench_per_call(legacy_path, iterations)
+
+        pooled_path = Path(tmp) / "pooled.db"
+        async with aiosqlite.connect(pooled_path) as db:
+            await db.execute(CREATE_SQL)
+            await db.commit()
+        await bench_pooled(pooled_path, iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
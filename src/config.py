@@ -10,22 +10,142 @@ class TelegramConfig:
 @dataclass
 class OpenAIConfig:
     api_key: str
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    chat_timeout: float = 120.0
+    image_timeout: float = 180.0
+    audio_timeout: float = 120.0
 
 @dataclass
 class SecurityConfig:
     encryption_key: str
+    cipher: str = "aesgcm"
+
+@dataclass
+class DatabaseConfig:
+    readers: int = 2
+    synchronous: str = "NORMAL"
+    cache_size_kb: int = 16384
+    mmap_size: int = 268435456
+    busy_timeout_ms: int = 5000
+    write_behind: bool = False
+    flush_interval_ms: int = 500
+    flush_max_records: int = 100
+    compression: str = "none"
+    shards: int = 1
+    shard_dir: str = ""
+
+@dataclass
+class CacheConfig:
+    user_cache_mb: int = 256
+    user_cache_ttl: int = 3600
+    response_cache_mb: int = 64
+    response_cache_ttl: int = 86400
+    response_cache_persistent: bool = False
+    response_cache_path: str = ""
+    response_cache_max_rows: int = 100000
+    media_cache_mb: int = 32
+    media_cache_ttl: int = 2592000
+    media_cache_persistent: bool = True
+    media_cache_path: str = ""
+    media_cache_max_rows: int = 50000
+    speech_cache_mb: int = 16
+    speech_cache_ttl: int = 86400
+
+@dataclass
+class ChatConfig:
+    streaming: bool = True
+    stream_edit_interval: float = 1.5
+
+@dataclass
+class SchedulerConfig:
+    concurrency: int = 8
+    tokens_per_minute: int = 0
+    queue_size: int = 50
+    model_limits: str = ""
+
+@dataclass
+class ResilienceConfig:
+    max_attempts: int = 4
+    backoff_base: float = 0.5
+    backoff_cap: float = 20.0
+    breaker_failures: int = 5
+    breaker_cooldown: float = 30.0
+    request_deadline: float = 300.0
+
+@dataclass
+class SummaryConfig:
+    enabled: bool = True
+    model: str = "gpt-5-nano"
+    threshold_tokens: int = 12000
+    keep_recent_tokens: int = 4000
+    deferred: bool = False
+
+@dataclass
+class BatchConfig:
+    enabled: bool = False
+    max_requests: int = 500
+    flush_interval: float = 300.0
+    poll_interval: float = 60.0
+
+@dataclass
+class RoutingConfig:
+    enabled: bool = True
+    slo: float = 30.0
+    model_slos: str = ""
+    fallbacks: str = "gpt-5>gpt-5-mini>gpt-5-nano, gpt-4o>gpt-4o-mini"
+    hedge: bool = True
+    completion_slo: float = 0.0
+    model_completion_slos: str = ""
+
+@dataclass
+class VoiceConfig:
+    transcode: bool = False
+    transcode_format: str = "mp3"
+    ffmpeg_path: str = "ffmpeg"
+    ffmpeg_processes: int = 2
+    chunk_threshold: int = 120
+    segment_seconds: float = 60.0
+    segment_overlap: float = 1.0
+    segment_concurrency: int = 4
+    silence_noise: str = "-30dB"
+    silence_duration: float = 0.4
+    speech_concurrency: int = 2
+
+@dataclass
+class VisionConfig:
+    detail: str = "auto"
+    low_side: int = 512
+    high_side: int = 768
+    max_side: int = 2048
+    downscale: bool = True
+    jpeg_quality: int = 85
+    image_workers: int = 2
 
 @dataclass
 class Config:
     telegram: TelegramConfig
     openai: OpenAIConfig
     security: SecurityConfig
+    database: DatabaseConfig
+    cache: CacheConfig
+    chat: ChatConfig
+    scheduler: SchedulerConfig
+    resilience: ResilienceConfig
+    summary: SummaryConfig
+    batch: BatchConfig
+    routing: RoutingConfig
+    voice: VoiceConfig
+    vision: VisionConfig
 
 def load_config(path: Path = None) -> Config:
     if path is None:
         path = Path(__file__).parent.parent / "config.ini"
     
-    config_parser = configparser.ConfigParser()
+    # Options may carry a "; comment" after the value, as in the README
+    config_parser = configparser.ConfigParser(inline_comment_prefixes=(";",))
     config_parser.read(path)
     
     try:
@@ -42,10 +162,111 @@ def load_config(path: Path = None) -> Config:
         ),
         openai=OpenAIConfig(
             api_key=config_parser.get("OpenAI", "api_key"),
+            max_connections=config_parser.getint("OpenAI", "max_connections", fallback=100),
+            max_keepalive_connections=config_parser.getint("OpenAI", "max_keepalive_connections", fallback=20),
+            keepalive_expiry=config_parser.getfloat("OpenAI", "keepalive_expiry", fallback=30.0),
+            connect_timeout=config_parser.getfloat("OpenAI", "connect_timeout", fallback=10.0),
+            chat_timeout=config_parser.getfloat("OpenAI", "chat_timeout", fallback=120.0),
+            image_timeout=config_parser.getfloat("OpenAI", "image_timeout", fallback=180.0),
+            audio_timeout=config_parser.getfloat("OpenAI", "audio_timeout", fallback=120.0),
         ),
         security=SecurityConfig(
             encryption_key=config_parser.get("Security", "encryption_key", fallback=""),
-        )
+            cipher=config_parser.get("Security", "cipher", fallback="aesgcm").lower(),
+        ),
+        database=DatabaseConfig(
+            readers=config_parser.getint("Database", "readers", fallback=2),
+            synchronous=config_parser.get("Database", "synchronous", fallback="NORMAL"),
+            cache_size_kb=config_parser.getint("Database", "cache_size_kb", fallback=16384),
+            mmap_size=config_parser.getint("Database", "mmap_size", fallback=268435456),
+            busy_timeout_ms=config_parser.getint("Database", "busy_timeout_ms", fallback=5000),
+            write_behind=config_parser.getboolean("Database", "write_behind", fallback=False),
+            flush_interval_ms=config_parser.getint("Database", "flush_interval_ms", fallback=500),
+            flush_max_records=config_parser.getint("Database", "flush_max_records", fallback=100),
+            compression=config_parser.get("Database", "compression", fallback="none").lower(),
+            shards=config_parser.getint("Database", "shards", fallback=1),
+            shard_dir=config_parser.get("Database", "shard_dir", fallback=""),
+        ),
+        cache=CacheConfig(
+            user_cache_mb=config_parser.getint("Cache", "user_cache_mb", fallback=256),
+            user_cache_ttl=config_parser.getint("Cache", "user_cache_ttl", fallback=3600),
+            response_cache_mb=config_parser.getint("Cache", "response_cache_mb", fallback=64),
+            response_cache_ttl=config_parser.getint("Cache", "response_cache_ttl", fallback=86400),
+            response_cache_persistent=config_parser.getboolean("Cache", "response_cache_persistent", fallback=False),
+            response_cache_path=config_parser.get("Cache", "response_cache_path", fallback=""),
+            response_cache_max_rows=config_parser.getint("Cache", "response_cache_max_rows", fallback=100000),
+            media_cache_mb=config_parser.getint("Cache", "media_cache_mb", fallback=32),
+            media_cache_ttl=config_parser.getint("Cache", "media_cache_ttl", fallback=2592000),
+            media_cache_persistent=config_parser.getboolean("Cache", "media_cache_persistent", fallback=True),
+            media_cache_path=config_parser.get("Cache", "media_cache_path", fallback=""),
+            media_cache_max_rows=config_parser.getint("Cache", "media_cache_max_rows", fallback=50000),
+            speech_cache_mb=config_parser.getint("Cache", "speech_cache_mb", fallback=16),
+            speech_cache_ttl=config_parser.getint("Cache", "speech_cache_ttl", fallback=86400),
+        ),
+        chat=ChatConfig(
+            streaming=config_parser.getboolean("Chat", "streaming", fallback=True),
+            stream_edit_interval=config_parser.getfloat("Chat", "stream_edit_interval", fallback=1.5),
+        ),
+        scheduler=SchedulerConfig(
+            concurrency=config_parser.getint("Scheduler", "concurrency", fallback=8),
+            tokens_per_minute=config_parser.getint("Scheduler", "tokens_per_minute", fallback=0),
+            queue_size=config_parser.getint("Scheduler", "queue_size", fallback=50),
+            model_limits=config_parser.get("Scheduler", "model_limits", fallback=""),
+        ),
+        resilience=ResilienceConfig(
+            max_attempts=config_parser.getint("Resilience", "max_attempts", fallback=4),
+            backoff_base=config_parser.getfloat("Resilience", "backoff_base", fallback=0.5),
+            backoff_cap=config_parser.getfloat("Resilience", "backoff_cap", fallback=20.0),
+            breaker_failures=config_parser.getint("Resilience", "breaker_failures", fallback=5),
+            breaker_cooldown=config_parser.getfloat("Resilience", "breaker_cooldown", fallback=30.0),
+            request_deadline=config_parser.getfloat("Resilience", "request_deadline", fallback=300.0),
+        ),
+        summary=SummaryConfig(
+            enabled=config_parser.getboolean("Summary", "enabled", fallback=True),
+            model=config_parser.get("Summary", "model", fallback="gpt-5-nano"),
+            threshold_tokens=config_parser.getint("Summary", "threshold_tokens", fallback=12000),
+            keep_recent_tokens=config_parser.getint("Summary", "keep_recent_tokens", fallback=4000),
+            deferred=config_parser.getboolean("Summary", "deferred", fallback=False),
+        ),
+        batch=BatchConfig(
+            enabled=config_parser.getboolean("Batch", "enabled", fallback=False),
+            max_requests=config_parser.getint("Batch", "max_requests", fallback=500),
+            flush_interval=config_parser.getfloat("Batch", "flush_interval", fallback=300.0),
+            poll_interval=config_parser.getfloat("Batch", "poll_interval", fallback=60.0),
+        ),
+        routing=RoutingConfig(
+            enabled=config_parser.getboolean("Routing", "enabled", fallback=True),
+            slo=config_parser.getfloat("Routing", "slo", fallback=30.0),
+            model_slos=config_parser.get("Routing", "model_slos", fallback=""),
+            fallbacks=config_parser.get(
+                "Routing", "fallbacks", fallback="gpt-5>gpt-5-mini>gpt-5-nano, gpt-4o>gpt-4o-mini"
+            ),
+            hedge=config_parser.getboolean("Routing", "hedge", fallback=True),
+            completion_slo=config_parser.getfloat("Routing", "completion_slo", fallback=0.0),
+            model_completion_slos=config_parser.get("Routing", "model_completion_slos", fallback=""),
+        ),
+        voice=VoiceConfig(
+            transcode=config_parser.getboolean("Voice", "transcode", fallback=False),
+            transcode_format=config_parser.get("Voice", "transcode_format", fallback="mp3"),
+            ffmpeg_path=config_parser.get("Voice", "ffmpeg_path", fallback="ffmpeg"),
+            ffmpeg_processes=config_parser.getint("Voice", "ffmpeg_processes", fallback=2),
+            chunk_threshold=config_parser.getint("Voice", "chunk_threshold", fallback=120),
+            segment_seconds=config_parser.getfloat("Voice", "segment_seconds", fallback=60.0),
+            segment_overlap=config_parser.getfloat("Voice", "segment_overlap", fallback=1.0),
+            segment_concurrency=config_parser.getint("Voice", "segment_concurrency", fallback=4),
+            silence_noise=config_parser.get("Voice", "silence_noise", fallback="-30dB"),
+            silence_duration=config_parser.getfloat("Voice", "silence_duration", fallback=0.4),
+            speech_concurrency=config_parser.getint("Voice", "speech_concurrency", fallback=2),
+        ),
+        vision=VisionConfig(
+            detail=config_parser.get("Vision", "detail", fallback="auto"),
+            low_side=config_parser.getint("Vision", "low_side", fallback=512),
+            high_side=config_parser.getint("Vision", "high_side", fallback=768),
+            max_side=config_parser.getint("Vision", "max_side", fallback=2048),
+            downscale=config_parser.getboolean("Vision", "downscale", fallback=True),
+            jpeg_quality=config_parser.getint("Vision", "jpeg_quality", fallback=85),
+            image_workers=config_parser.getint("Vision", "image_workers", fallback=2),
+        ),
     )
 
 # Singleton instance to be used across the app
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Protocol, Set, Tuple
+
+
+from src.config import DatabaseConfig
+from src.database.engine import SQLiteEngine
+from src.database.entities import UserData
+from src.database.history import (
+    has_legacy_messages,
+    load_history,
+    migrate_legacy_user,
+    write_history,
+)
+from src.database.migrations import run_migrations, run_background_migrations
+from src.utils.tokens import context_budget
+
+# A user paired with the changed column fields taken for one write
+TakenChanges = List[Tuple[UserData, Set[str]]]
+
+# Hot queries are kept as constants so the per-connection statement cache
+# always sees the exact same SQL text and reuses the prepared statement.
+SELECT_USER_SQL = "SELECT * FROM UsersData WHERE user_id = ?"
+
+UPSERT_USER_SQL = """
+    INSERT INTO UsersData (user_id, model, model_message_info, model_message_chat, messages,
+    count_messages, max_out, voice_answer, system_message, pic_grade, pic_size, username, last_active,
+    response_cache)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id)
+    DO UPDATE SET
+        model = excluded.model,
+        model_message_info = excluded.model_message_info,
+        model_message_chat = excluded.model_message_chat,
+        messages = excluded.messages,
+        count_messages = excluded.count_messages,
+        max_out = excluded.max_out,
+        voice_answer = excluded.voice_answer,
+        system_message = excluded.system_message,
+        pic_grade = excluded.pic_grade,
+        pic_size = excluded.pic_size,
+        username = excluded.username,
+        last_active = excluded.last_active,
+        response_cache = excluded.response_cache
+"""
+
+
+def _update_columns_sql(fields: Tuple[str, ...]) -> str:
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    return f"UPDATE UsersData SET {assignments} WHERE user_id = ?"
+
+
+class StorageBackend(Protocol):
+    """What storage.py needs from a persistence backend."""
+
+    @property
+    def shard_backends(self) -> List["SQLiteBackend"]:
+        """The single-file backends this backend is made of."""
+
+    def shard_for(self, user_id: int) -> "SQLiteBackend":
+        """The single-file backend that holds ``user_id``."""
+
+    async def open(self) -> None:
+        """Open connections and make sure the schema is up to date."""
+
+    async def close(self) -> None:
+        """Close every connection."""
+
+    async def load_user(self, user_id: int) -> Optional[UserData]:
+        """Load a user with its recent history, or None if unknown."""
+
+    async def write_users(self, taken: TakenChanges) -> List[Callable[[], None]]:
+        """
+        Persist users and return callbacks to run once everything committed.
+        """
+
+    def iter_users(
+        self,
+        batch_size: int = 500,
+        active_since: Optional[float] = None,
+        has_username: Optional[bool] = None,
+    ) -> AsyncIterator[List[Dict[str, str]]]:
+        """Stream users in bounded batches."""
+
+
+class SQLiteBackend:
+    """All users in one SQLite file. This is the default layout."""
+
+    def __init__(self, path: Path, settings: DatabaseConfig):
+        self.path = Path(path)
+        self.engine = SQLiteEngine(self.path, settings)
+        self._background_migrations: Optional[asyncio.Task] = None
+
+    @property
+    def shard_backends(self) -> List["SQLiteBackend"]:
+        return [self]
+
+    def shard_for(self, user_id: int) -> "SQLiteBackend":
+        return self
+
+    async def open(self) -> None:
+        await self.engine.open()
+        background = await run_migrations(self.engine)
+        if background:
+            self._background_migrations = asyncio.create_task(
+                run_background_migrations(self.engine, background)
+            )
+
+    async def close(self) -> None:
+        task = self._background_migrations
+        self._background_migrations = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.engine.close()
+
+    async def load_user(self, user_id: int) -> Optional[UserData]:
+        async with self.engine.reader() as db:
+            async with db.execute(SELECT_USER_SQL, (str(user_id),)) as cursor:
+                row = await cursor.fetchone()
+            if not row:
+                return None
+            if not has_legacy_messages(row["messages"]):
+                user_data = UserData.from_db_row(row)
+                await load_history(db, user_data, max_tokens=context_budget(user_data.model, user_data.max_out))
+                return user_data
+
+        # The background backfill has not reached this user yet, migrate it now
+        async with self.engine.writer() as db:
+            await migrate_legacy_user(db, row["user_id"])
+        async with self.engine.reader() as db:
+            user_data = UserData.from_db_row(row)
+            await load_history(db, user_data, max_tokens=context_budget(user_data.model, user_data.max_out))
+        return user_data
+
+    async def write_users(self, taken: TakenChanges) -> List[Callable[[], None]]:
+        """
+        Write user rows and their new history in one transaction.
+
+        Users without a row get a full UPSERT. Stored users only get an UPDATE
+        of the columns that changed, and history rows are only written when
+        messages were added or replaced.
+        """
+        new_rows = []
+        updates: Dict[Tuple[str, ...], List[Tuple]] = defaultdict(list)
+        for user_data, changes in taken:
+            if not user_data.is_stored:
+                new_rows.append(user_data.to_db_row())
+            elif changes:
+                fields = tuple(sorted(changes))
+                updates[fields].append(user_data.column_values(fields) + (str(user_data.user_id),))
+
+        async with self.engine.writer() as db:
+            if new_rows:
+                await db.executemany(UPSERT_USER_SQL, new_rows)
+            for fields, rows in updates.items():
+                await db.executemany(_update_columns_sql(fields), rows)
+            on_commit = [await write_history(db, user_data) for user_data, _ in taken]
+
+        on_commit.extend(user_data.mark_stored for user_data, _ in taken)
+        return on_commit
+
+    async def iter_users(
+        self,
+        batch_size: int = 500,
+        active_since: Optional[float] = None,
+        has_username: Optional[bool] = None,
+    ) -> AsyncIterator[List[Dict[str, str]]]:
+        conditions = ["user_id > ?"]
+        filter_params = []
+        if active_since is not None:
+            conditions.append("last_active >= ?")
+            filter_params.append(int(active_since))
+        if has_username is True:
+            conditions.append("username IS NOT NULL AND username != '' AND username != 'Unknown'")
+        elif has_username is False:
+            conditions.append("(username IS NULL OR username = '' OR username = 'Unknown')")
+
+        sql = (
+            f"SELECT user_id, username FROM UsersData WHERE {' AND '.join(conditions)} "
+            "ORDER BY user_id LIMIT ?"
+        )
+        last_user_id = ""
+        while True:
+            async with self.engine.reader() as db:
+                async with db.execute(sql, (last_user_id, *filter_params, batch_size)) as cursor:
+                    rows = await cursor.fetchall()
+            if not rows:
+                return
+
+            yield [
+                {"user_id": str(row["user_id"]), "username": row["username"] or "Unknown"}
+                for row in rows
+            ]
+            if len(rows) < batch_size:
+                return
+            last_user_id = rows[-1]["user_id"]
+
+
+def shard_index(user_id: int, shard_count: int) -> int:
+    """Stable shard placement; must never change for an existing layout."""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+
+class ShardedSQLiteBackend:
+    """
+    Users spread over K SQLite files by a hash of user_id.
+
+    Every shard has its own writer connection, so writes for users on
+    different shards commit in parallel instead of queueing on one file lock.
+    """
+
+    def __init__(self, directory: Path, shard_count: int, settings: DatabaseConfig):
+        self.directory = Path(directory)
+        self.shards = [
+            SQLiteBackend(self.directory / f"users_data_{index:03d}.db", settings)
+            for index in range(shard_count)
+        ]
+
+    @property
+    def shard_backends(self) -> List[SQLiteBackend]:
+        return self.shards
+
+    def shard_for(self, user_id: int) -> SQLiteBackend:
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    async def open(self) -> None:
+        await asyncio.gather(*(shard.open() for shard in self.shards))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    async def load_user(self, user_id: int) -> Optional[UserData]:
+        return await self.shard_for(user_id).load_user(user_id)
+
+    async def write_users(self, taken: TakenChanges) -> List[Callable[[], None]]:
+        """
+        Write each shard's users in that shard's own transaction, concurrently.
+
+        Shards that committed keep their result even if another shard failed;
+        the failure is raised afterwards so the caller retries everything,
+        which is idempotent for the already committed users.
+        """
+        by_shard: Dict[int, TakenChanges] = defaultdict(list)
+        for item in taken:
+            by_shard[shard_index(item[0].user_id, len(self.shards))].append(item)
+
+        results = await asyncio.gather(
+            *(self.shards[index].write_users(items) for index, items in by_shard.items()),
+            return_exceptions=True,
+        )
+        on_commit = []
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                on_commit.extend(result)
+        if errors:
+            for callback in on_commit:
+                callback()
+            logging.error(f"{len(errors)} of {len(by_shard)} shards failed to write")
+            raise errors[0]
+        return on_commit
+
+    async def iter_users(
+        self,
+        batch_size: int = 500,
+        active_since: Optional[float] = None,
+        has_username: Optional[bool] = None,
+    ) -> AsyncIterator[List[Dict[str, str]]]:
+        # Shard by shard: ordered by user_id within a shard, not globally
+        for shard in self.shards:
+            async for batch in shard.iter_users(batch_size, active_since, has_username):
+                yield batch
+
+
+def create_backend(settings: DatabaseConfig, default_path: Path) -> StorageBackend:
+    """Build the backend selected by ``[Database] shards``."""
+    if settings.shards > 1:
+        directory = Path(settings.shard_dir) if settings.shard_dir else default_path.parent / "shards"
+        return ShardedSQLiteBackend(directory, settings.shards, settings)
+    return SQLiteBackend(default_path, settings)
@@ -0,0 +1,144 @@
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from src.database.entities import UserData
+
+# Rough per-object overheads (CPython, 64-bit) used to charge cache entries
+USER_DATA_OVERHEAD = 1024
+MESSAGE_OVERHEAD = sys.getsizeof({}) + 2 * sys.getsizeof("")
+
+
+def estimate_message_size(message: Dict) -> int:
+    return MESSAGE_OVERHEAD + len(message["role"]) + len(message["content"])
+
+
+class UserDataCache:
+    """
+    LRU cache of UserData with an idle TTL and an approximate memory budget.
+
+    Entries are charged by the size of their in-memory history. The cache
+    itself never drops anything: ``victims()`` lists the entries that should
+    go, and the storage layer flushes them if needed before calling
+    ``remove()``.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[int, UserData]" = OrderedDict()
+        self._last_access: Dict[int, float] = {}
+        # user_id -> (messages list, number of messages charged, charged bytes)
+        self._charges: Dict[int, Tuple[list, int, int]] = {}
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __delitem__(self, user_id: int) -> None:
+        self.remove(user_id)
+
+    def get(self, user_id: int) -> Optional[UserData]:
+        """Return the entry and mark it as recently used."""
+        user_data = self._entries.get(user_id)
+        if user_data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(user_id)
+        return user_data
+
+    def peek(self, user_id: int) -> Optional[UserData]:
+        """Return the entry without touching counters or recency."""
+        return self._entries.get(user_id)
+
+    def put(self, user_data: UserData) -> UserData:
+        """Insert an entry unless one already exists; returns the cached entry."""
+        existing = self._entries.get(user_data.user_id)
+        if existing is not None:
+            return existing
+        self._entries[user_data.user_id] = user_data
+        self._touch(user_data.user_id)
+        self.charge(user_data.user_id)
+        return user_data
+
+    def pop(self, user_id: int, default=None):
+        user_data = self._entries.get(user_id)
+        if user_data is None:
+            return default
+        self.remove(user_id)
+        return user_data
+
+    def remove(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        self._last_access.pop(user_id, None)
+        charge = self._charges.pop(user_id, None)
+        if charge is not None:
+            self.total_bytes -= charge[2]
+
+    def evict(self, user_id: int) -> None:
+        """Remove a victim entry and count the eviction."""
+        if user_id in self._entries:
+            self.remove(user_id)
+            self.evictions += 1
+
+    def charge(self, user_id: int) -> None:
+        """
+        Update the memory charge of an entry after its history changed.
+
+        Appends are charged incrementally; a replaced list is re-measured.
+        """
+        user_data = self._entries.get(user_id)
+        if user_data is None:
+            return
+        messages = user_data.messages
+        charged_list, charged_count, charged_bytes = self._charges.get(user_id, (None, 0, 0))
+
+        if messages is charged_list and len(messages) >= charged_count:
+            size = charged_bytes + sum(estimate_message_size(m) for m in messages[charged_count:])
+        else:
+            size = USER_DATA_OVERHEAD + len(user_data.system_message) + sum(
+                estimate_message_size(m) for m in messages
+            )
+
+        self.total_bytes += size - charged_bytes
+        self._charges[user_id] = (messages, len(messages), size)
+
+    def victims(self, now: Optional[float] = None) -> List[int]:
+        """
+        Entries that are idle past the TTL or needed to get under the budget.
+
+        Returned least recently used first. The most recently used entry is
+        never a victim, so the user being served always stays cached.
+        """
+        now = time.monotonic() if now is None else now
+        victims = []
+        over_budget = self.total_bytes - self.max_bytes
+        for user_id in islice(self._entries, max(0, len(self._entries) - 1)):
+            expired = now - self._last_access[user_id] > self.ttl
+            if not expired and over_budget <= 0:
+                break
+            victims.append(user_id)
+            over_budget -= self._charges.get(user_id, (None, 0, 0))[2]
+        return victims
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _touch(self, user_id: int) -> None:
+        self._entries.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
@@ -0,0 +1,64 @@
+import zlib
+from typing import Tuple
+
+# Codec ids stored in the envelope header. A codec id is tied to its preset
+# dictionary forever: add a new id instead of editing an existing dictionary.
+CODEC_NONE = 0x00
+CODEC_ZLIB_CHAT_V1 = 0x01
+
+CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB_CHAT_V1}
+
+# Values shorter than this are stored as-is, the header would eat the gain
+MIN_COMPRESS_SIZE = 64
+
+# Preset dictionary of phrases common in chat turns and model answers. zlib
+# back-references into it, which is what makes short messages compressible.
+# Most frequent strings go last, closest to the data.
+CHAT_DICTIONARY_V1 = (
+    "```python\n```javascript\n```bash\n```json\n```\n"
+    "def __init__(self, return None import from class function const let var "
+    "https://www. http:// .com .org "
+    "| --- | --- |\n**Note:** **Example:** ### Summary\n## Steps\n"
+    "1. 2. 3. 4. 5. - **\n\n"
+    "Here is an example of how you can Here's a step-by-step guide "
+    "Let me know if you have any other questions! "
+    "I hope this helps! If you have any further questions, feel free to ask. "
+    "In summary, Additionally, However, For example, This means that "
+    "Sure! Of course! Certainly! Great question! "
+    "Can you help me with Could you please explain What is the difference between "
+    "How do I How can I What does Why does Please write Translate this into "
+    "the following the same as well as in order to it is important to "
+    "you can use make sure that for example, such as because of "
+    "there are a few ways to depending on your "
+    " the of and to in is that for it with as on be this are you "
+    "was by not or have from but which can an they your what will "
+    "would there their about more when if has should could been "
+).encode()
+
+_COMPRESSION_LEVEL = 6
+
+
+def compress(data: bytes, codec: int) -> Tuple[int, bytes]:
+    """
+    Compress ``data`` with ``codec``.
+
+    Returns the codec actually used: values that are too short or would not
+    shrink are kept uncompressed.
+    """
+    if codec == CODEC_NONE or len(data) < MIN_COMPRESS_SIZE:
+        return CODEC_NONE, data
+
+    compressor = zlib.compressobj(_COMPRESSION_LEVEL, zdict=CHAT_DICTIONARY_V1)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) >= len(data):
+        return CODEC_NONE, data
+    return CODEC_ZLIB_CHAT_V1, compressed
+
+
+def decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB_CHAT_V1:
+        decompressor = zlib.decompressobj(zdict=CHAT_DICTIONARY_V1)
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"Unknown compression codec {codec}")
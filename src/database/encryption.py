@@ -0,0 +1,137 @@
+import asyncio
+import base64
+import os
+from functools import lru_cache
+from typing import Union
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from src.config import config
+from src.database.compression import CODECS, compress, decompress
+
+# Legacy text envelope: "ENC:" + Fernet token
+LEGACY_PREFIX = "ENC:"
+MISSING_KEY_MARKER = "ENC:ERROR_NO_KEY"
+
+# Binary envelopes:
+#   v2: version byte, algorithm byte, 12 byte nonce, ciphertext + tag
+#   v3: version byte, algorithm byte, codec byte, 12 byte nonce, ciphertext + tag
+#       where the plaintext was compressed with the codec before encryption
+ENVELOPE_V2 = 0x02
+ENVELOPE_V3 = 0x03
+ENVELOPES = {ENVELOPE_V2: 2, ENVELOPE_V3: 3}  # version -> header length
+ALGORITHMS = {"aesgcm": 0x01, "chacha20": 0x02}
+NONCE_SIZE = 12
+
+# Payloads above this size are encrypted/decrypted in a worker thread
+OFFLOAD_THRESHOLD = 64 * 1024
+
+StoredValue = Union[str, bytes]
+
+
+class _Ciphers:
+    """All cipher objects derived from one configured key."""
+
+    def __init__(self, key: str):
+        self.fernet = Fernet(key.encode())
+        aead_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"telegram-ai-chatbot storage v2",
+        ).derive(base64.urlsafe_b64decode(key.encode()))
+        self.aead = {
+            ALGORITHMS["aesgcm"]: AESGCM(aead_key),
+            ALGORITHMS["chacha20"]: ChaCha20Poly1305(aead_key),
+        }
+
+
+@lru_cache(maxsize=4)
+def _ciphers_for(key: str) -> _Ciphers:
+    return _Ciphers(key)
+
+
+def _ciphers() -> _Ciphers:
+    if not config.security.encryption_key:
+        raise ValueError("Data is encrypted but key is missing.")
+    return _ciphers_for(config.security.encryption_key)
+
+
+def is_encrypted(value: StoredValue) -> bool:
+    if isinstance(value, bytes):
+        return bool(value) and value[0] in ENVELOPES
+    return value.startswith(LEGACY_PREFIX)
+
+
+def is_current_format(value: StoredValue) -> bool:
+    """
+    Whether ``value`` uses the envelope and algorithm encrypt_text() writes now.
+
+    The codec byte is not compared: short values are legitimately stored
+    uncompressed in the current format.
+    """
+    if config.security.cipher == "fernet":
+        return isinstance(value, str) and value.startswith(LEGACY_PREFIX)
+    return isinstance(value, bytes) and value[:2] == bytes([ENVELOPE_V3, ALGORITHMS[config.security.cipher]])
+
+
+def encrypt_text(text: str) -> StoredValue:
+    """
+    Encrypt a single value for storage.
+
+    Compresses with ``[Database] compression``, then encrypts with the AEAD
+    algorithm from ``[Security] cipher`` into a binary envelope. With cipher
+    ``fernet`` the legacy uncompressed ``ENC:`` token is written instead.
+    """
+    # Enforce encryption: do not save in plain text.
+    if not config.security.encryption_key:
+        return MISSING_KEY_MARKER
+
+    ciphers = _ciphers()
+    if config.security.cipher == "fernet":
+        return f"{LEGACY_PREFIX}{ciphers.fernet.encrypt(text.encode()).decode()}"
+
+    algorithm = ALGORITHMS[config.security.cipher]
+    codec, plaintext = compress(text.encode(), CODECS[config.database.compression])
+    nonce = os.urandom(NONCE_SIZE)
+    header = bytes([ENVELOPE_V3, algorithm, codec])
+    return header + nonce + ciphers.aead[algorithm].encrypt(nonce, plaintext, header)
+
+
+def decrypt_text(stored: StoredValue) -> str:
+    """Reverse encrypt_text(). Raises if the value cannot be decrypted."""
+    if isinstance(stored, bytes):
+        header_size = ENVELOPES.get(stored[0]) if stored else None
+        if header_size is None:
+            raise ValueError(f"Unknown storage envelope {stored[:1]!r}")
+        header = stored[:header_size]
+        nonce = stored[header_size:header_size + NONCE_SIZE]
+        ciphertext = stored[header_size + NONCE_SIZE:]
+        aead = _ciphers().aead.get(header[1])
+        if aead is None:
+            raise ValueError(f"Unknown storage algorithm {header[1]}")
+        plaintext = aead.decrypt(nonce, ciphertext, header)
+        if header[0] == ENVELOPE_V3:
+            plaintext = decompress(plaintext, header[2])
+        return plaintext.decode()
+
+    if not stored.startswith(LEGACY_PREFIX):
+        return stored
+    return _ciphers().fernet.decrypt(stored[len(LEGACY_PREFIX):].encode()).decode()
+
+
+async def encrypt_text_async(text: str) -> StoredValue:
+    """encrypt_text() that moves large payloads off the event loop."""
+    if len(text) < OFFLOAD_THRESHOLD:
+        return encrypt_text(text)
+    return await asyncio.to_thread(encrypt_text, text)
+
+
+async def decrypt_text_async(stored: StoredValue) -> str:
+    """decrypt_text() that moves large payloads off the event loop."""
+    if len(stored) < OFFLOAD_THRESHOLD:
+        return decrypt_text(stored)
+    return await asyncio.to_thread(decrypt_text, stored)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+from src.config import DatabaseConfig
+
+
+class SQLiteEngine:
+    """
+    Owns a small pool of long-lived SQLite connections for one database file.
+
+    A single writer connection is guarded by a lock (SQLite serializes writers
+    anyway), while N reader connections are handed out from a queue. WAL mode
+    lets the readers run alongside the writer. Each connection keeps sqlite3's
+    statement cache, so the hot queries are prepared once per connection.
+    """
+
+    def __init__(self, path: Path, settings: Optional[DatabaseConfig] = None):
+        self.path = Path(path)
+        self.settings = settings or DatabaseConfig()
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path, cached_statements=256)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {int(self.settings.busy_timeout_ms)}")
+        await db.execute(f"PRAGMA synchronous = {self.settings.synchronous}")
+        # A negative cache_size is interpreted by SQLite as KiB instead of pages
+        await db.execute(f"PRAGMA cache_size = -{int(self.settings.cache_size_kb)}")
+        await db.execute(f"PRAGMA mmap_size = {int(self.settings.mmap_size)}")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        return db
+
+    async def open(self) -> None:
+        """Open the writer and reader connections."""
+        if self.is_open:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._writer = await self._connect()
+        # journal_mode is persistent, setting it once on the writer is enough
+        async with self._writer.execute("PRAGMA journal_mode = WAL") as cursor:
+            mode = (await cursor.fetchone())[0]
+        if mode.lower() != "wal":
+            logging.warning(f"SQLite WAL mode unavailable for {self.path}, using {mode}")
+
+        self._idle_readers = asyncio.Queue()
+        for _ in range(max(1, self.settings.readers)):
+            reader = await self._connect(read_only=True)
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+
+    async def close(self) -> None:
+        """Close every pooled connection."""
+        if not self.is_open:
+            return
+        async with self._write_lock:
+            for reader in self._readers:
+                await reader.close()
+            self._readers = []
+            self._idle_readers = None
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool."""
+        if not self.is_open:
+            raise RuntimeError("Database is not initialized, call init_db() first")
+        idle_readers = self._idle_readers
+        db = await idle_readers.get()
+        try:
+            yield db
+        finally:
+            idle_readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Hold the writer connection for one transaction.
+
+        Commits when the block exits normally and rolls back on error.
+        """
+        if not self.is_open:
+            raise RuntimeError("Database is not initialized, call init_db() first")
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
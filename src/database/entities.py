@@ -1,6 +1,37 @@
 from dataclasses import dataclass, field
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
+
+from src.database.encryption import decrypt_text
+from src.utils.tokens import TokenLedger, context_budget
+
+# Fields stored as UsersData columns (the column has the same name)
+COLUMN_FIELDS: Tuple[str, ...] = (
+    "model",
+    "model_message_info",
+    "model_message_chat",
+    "count_messages",
+    "max_out",
+    "voice_answer",
+    "system_message",
+    "pic_grade",
+    "pic_size",
+    "username",
+    "last_active",
+    "response_cache",
+)
+
+
+def decode_legacy_messages(raw_messages: Optional[str]) -> List[Dict]:
+    """
+    Decode the old single-blob ``UsersData.messages`` column.
+
+    Kept for the migration to the ConversationMessages table.
+    """
+    if not raw_messages:
+        return []
+    return json.loads(decrypt_text(raw_messages))
+
 
 @dataclass
 class UserData:
@@ -10,35 +41,132 @@ class UserData:
     model: str = "gpt-5-nano"
     model_message_info: str = "5 nano"
     model_message_chat: str = "5 nano:\n\n"
-    max_out: int = 128000
+    # History token budget, see src/utils/tokens.py
+    max_out: int = field(default_factory=lambda: context_budget("gpt-5-nano"))
     voice_answer: bool = False
     system_message: str = ""
     pic_grade: str = "standard"
     pic_size: str = "1024x1024"
     username: str = "Unknown"
+    # Unix timestamp of the last save, used to filter active users
+    last_active: int = 0
+    # Whether identical requests may be answered from the shared response cache
+    response_cache: bool = True
+    # Sequence number of messages[0] in the ConversationMessages table
+    history_start_seq: int = field(default=0, repr=False, compare=False)
+    # Stored messages written in an older envelope, rewritten on the next save
+    stale_history_seqs: Set[int] = field(default_factory=set, repr=False, compare=False)
+    # Token counts of messages, filled from the stored counts on load
+    token_ledger: TokenLedger = field(default_factory=TokenLedger, repr=False, compare=False)
+    # Summary of the turns before messages[0], which stay archived in the DB
+    summary: str = field(default="", repr=False, compare=False)
+    _summary_for: Optional[List[Dict]] = field(default=None, init=False, repr=False, compare=False)
+    _summary_version: int = field(default=0, init=False, repr=False, compare=False)
+    _summary_synced_version: int = field(default=0, init=False, repr=False, compare=False)
+    # The list object and prefix length that are already stored in the DB
+    _synced_messages: Optional[List[Dict]] = field(default=None, init=False, repr=False, compare=False)
+    _synced_count: int = field(default=0, init=False, repr=False, compare=False)
 
-    def to_db_row(self):
-        # Encryption
-        from src.config import config
-        from cryptography.fernet import Fernet
-        
-        messages_json = json.dumps(self.messages)
-        
-        # If encryption key is set, encrypt the messages
-        if config.security.encryption_key:
-            f = Fernet(config.security.encryption_key.encode())
-            encrypted_messages = f.encrypt(messages_json.encode()).decode()
-            stored_messages = f"ENC:{encrypted_messages}"
-        else:
-            # Enforce encryption: do not save in plain text.
-            stored_messages = "ENC:ERROR_NO_KEY"
+    def __post_init__(self):
+        # Set after __init__ so the constructor itself is not tracked
+        object.__setattr__(self, "_changed_fields", set())
+        object.__setattr__(self, "_stored", False)
+
+    def __setattr__(self, name, value):
+        changed_fields = self.__dict__.get("_changed_fields")
+        if changed_fields is not None and name in COLUMN_FIELDS and self.__dict__.get(name) != value:
+            changed_fields.add(name)
+        object.__setattr__(self, name, value)
+
+    @property
+    def is_stored(self) -> bool:
+        """Whether a UsersData row exists for this user."""
+        return self._stored
+
+    def mark_stored(self) -> None:
+        object.__setattr__(self, "_stored", True)
+
+    def take_changes(self) -> Set[str]:
+        """Return and reset the column fields changed since the last write."""
+        changes = self._changed_fields
+        object.__setattr__(self, "_changed_fields", set())
+        return changes
+
+    def restore_changes(self, changes: Set[str]) -> None:
+        """Put back changes taken for a write that failed."""
+        self._changed_fields.update(changes)
+
+    def column_values(self, fields) -> Tuple:
+        return tuple(getattr(self, name) for name in fields)
 
+    def mark_history_synced(self, messages: List[Dict], count: int) -> None:
+        """Record that the first ``count`` items of ``messages`` are stored."""
+        self._synced_messages = messages
+        self._synced_count = count
+
+    def pending_history(self):
+        """
+        Return ``(reset, start_seq, new_messages)`` for the next history write.
+
+        Appending to ``messages`` only yields the new tail. Replacing the list
+        (e.g. clearing the context) yields ``reset=True`` and the whole list,
+        which then has to replace everything stored for this user.
+        """
+        if self.messages is not self._synced_messages:
+            return True, 0, list(self.messages)
+        return False, self.history_start_seq + self._synced_count, self.messages[self._synced_count:]
+
+    @property
+    def active_summary(self) -> str:
+        """The summary, unless the history it summarizes was replaced since."""
+        return self.summary if self.summary and self.messages is self._summary_for else ""
+
+    def set_summary(self, summary: str, synced: bool = False) -> None:
+        self.summary = summary
+        self._summary_for = self.messages
+        self._summary_version += 1
+        if synced:
+            self._summary_synced_version = self._summary_version
+
+    def compact_history(self, count: int, summary: str) -> None:
+        """
+        Replace the oldest ``count`` messages with ``summary``.
+
+        Only stored messages can be compacted: they are removed from memory
+        (in place, so this is not a history reset) and stay archived in
+        ConversationMessages.
+        """
+        if self.messages is not self._synced_messages or count > self._synced_count:
+            raise ValueError("Only stored messages can be compacted")
+        del self.messages[:count]
+        self.history_start_seq += count
+        self._synced_count -= count
+        self.token_ledger.drop_front(count)
+        self.set_summary(summary)
+
+    def pending_summary(self):
+        """Return ``(version, summary)`` if the summary changed since the last write, else None."""
+        if self._summary_version == self._summary_synced_version:
+            return None
+        return self._summary_version, self.active_summary
+
+    def mark_summary_synced(self, version: int) -> None:
+        self._summary_synced_version = max(self._summary_synced_version, version)
+
+    def has_unsaved_changes(self) -> bool:
+        if not self._stored or self._changed_fields or self.pending_summary():
+            return True
+        reset, _, new_messages = self.pending_history()
+        return reset or bool(new_messages)
+
+    def to_db_row(self):
+        # History lives in ConversationMessages, the legacy column stays empty
         return (
             str(self.user_id),
             self.model,
             self.model_message_info,
             self.model_message_chat,
-            stored_messages,
+            None,
             self.count_messages,
             self.max_out,
             self.voice_answer,
@@ -46,42 +174,24 @@ class UserData:
             self.pic_grade,
             self.pic_size,
             self.username,
+            self.last_active,
+            self.response_cache,
         )
 
     @classmethod
     def from_db_row(cls, row):
-        # Decryption
-        from src.config import config
-        from cryptography.fernet import Fernet
-        
-        raw_messages = row["messages"]
-        messages = []
-        
-        if raw_messages:
-            try:
-                if raw_messages.startswith("ENC:") and config.security.encryption_key:
-                    f = Fernet(config.security.encryption_key.encode())
-                    encrypted_data = raw_messages.split("ENC:", 1)[1]
-                    decrypted_json = f.decrypt(encrypted_data.encode()).decode()
-                    messages = json.loads(decrypted_json)
-                elif raw_messages.startswith("ENC:") and not config.security.encryption_key:
-                     # Key missing but data is encrypted
-                     messages = [{"role": "system", "content": "Error: Data is encrypted but key is missing."}]
-                else:
-                    messages = json.loads(raw_messages)
-            except Exception as e:
-                messages = [{"role": "system", "content": f"Error loading messages: {e}"}]
-
+        """Build a UserData from a UsersData row; history is loaded separately."""
         # Handle simplified backward compatibility if username missing in row (though query should return it if updated)
         # We'll assume row has it or we handle it in storage.py SQL
         username = row["username"] if "username" in row.keys() else "Unknown"
+        last_active = row["last_active"] if "last_active" in row.keys() else None
+        response_cache = row["response_cache"] if "response_cache" in row.keys() else None
 
-        return cls(
+        user_data = cls(
             user_id=int(row["user_id"]),
             model=row["model"],
             model_message_info=row["model_message_info"],
             model_message_chat=row["model_message_chat"],
-            messages=messages,
             count_messages=row["count_messages"],
             max_out=row["max_out"],
             voice_answer=bool(row["voice_answer"]),
@@ -89,4 +199,8 @@ class UserData:
             pic_grade=row["pic_grade"],
             pic_size=row["pic_size"],
             username=username,
+            last_active=last_active or 0,
+            response_cache=bool(response_cache) if response_cache is not None else True,
         )
+        user_data.mark_stored()
+        return user_data
@@ -0,0 +1,215 @@
+import logging
+from typing import Callable
+
+import aiosqlite
+
+from src.database.encryption import (
+    MISSING_KEY_MARKER,
+    encrypt_text_async,
+    decrypt_text_async,
+    is_current_format,
+)
+from src.database.entities import UserData, decode_legacy_messages
+from src.utils.tokens import CHARS_PER_TOKEN, MESSAGE_OVERHEAD, message_tokens
+
+# Each message is its own row so a new turn only inserts the new rows instead
+# of re-encrypting the whole conversation.
+CREATE_MESSAGES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ConversationMessages (
+        user_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content_length INTEGER NOT NULL,
+        payload BLOB,
+        PRIMARY KEY (user_id, seq)
+    ) WITHOUT ROWID
+"""
+
+# One row per compacted user: the summary of every message before start_seq
+CREATE_SUMMARIES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ConversationSummaries (
+        user_id TEXT PRIMARY KEY,
+        start_seq INTEGER NOT NULL,
+        payload BLOB
+    ) WITHOUT ROWID
+"""
+
+SELECT_HISTORY_NEWEST_FIRST_SQL = """
+    SELECT seq, role, content_length, token_count, payload FROM ConversationMessages
+    WHERE user_id = ? AND seq >= ? ORDER BY seq DESC
+"""
+
+INSERT_MESSAGE_SQL = """
+    INSERT OR REPLACE INTO ConversationMessages (user_id, seq, role, content_length, token_count, payload)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+DELETE_HISTORY_SQL = "DELETE FROM ConversationMessages WHERE user_id = ?"
+
+SELECT_SUMMARY_SQL = "SELECT start_seq, payload FROM ConversationSummaries WHERE user_id = ?"
+
+UPSERT_SUMMARY_SQL = "INSERT OR REPLACE INTO ConversationSummaries (user_id, start_seq, payload) VALUES (?, ?, ?)"
+
+DELETE_SUMMARY_SQL = "DELETE FROM ConversationSummaries WHERE user_id = ?"
+
+UPDATE_PAYLOAD_SQL = "UPDATE ConversationMessages SET payload = ? WHERE user_id = ? AND seq = ?"
+
+
+async def _load_summary(db: aiosqlite.Connection, user_id: str):
+    """Return ``(start_seq, summary)`` of a compacted history, or ``(0, "")``."""
+    async with db.execute(SELECT_SUMMARY_SQL, (user_id,)) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return 0, ""
+    try:
+        return row["start_seq"], await decrypt_text_async(row["payload"])
+    except Exception as e:
+        logging.error(f"Error loading summary of user {user_id}: {e}")
+        return row["start_seq"], ""
+
+
+async def load_history(db: aiosqlite.Connection, user_data: UserData, max_tokens: int) -> None:
+    """
+    Load the newest messages of a user, stopping once ``max_tokens`` is covered.
+
+    Older rows stay in the database; only what prune_messages() could send to
+    the model is decrypted and kept in memory. Stored token counts seed the
+    user's token ledger, so loaded messages are not tokenized again. Rows
+    archived by compaction are skipped, the summary stands in for them.
+    """
+    user_id = str(user_data.user_id)
+    summary_start_seq, summary = await _load_summary(db, user_id)
+
+    rows = []
+    total_tokens = 0
+    async with db.execute(SELECT_HISTORY_NEWEST_FIRST_SQL, (user_id, summary_start_seq)) as cursor:
+        async for row in cursor:
+            rows.append(row)
+            # Rows stored before token counts existed are estimated from their length
+            total_tokens += row["token_count"] or MESSAGE_OVERHEAD + row["content_length"] // CHARS_PER_TOKEN
+            if total_tokens >= max_tokens:
+                break
+
+    messages = []
+    counts = []
+    stale_seqs = set()
+    for row in reversed(rows):
+        try:
+            content = await decrypt_text_async(row["payload"])
+        except Exception as e:
+            content = f"Error loading messages: {e}"
+        else:
+            if not is_current_format(row["payload"]):
+                stale_seqs.add(row["seq"])
+        message = {"role": row["role"], "content": content}
+        messages.append(message)
+        counts.append(row["token_count"] or message_tokens(message))
+
+    user_data.messages = messages
+    user_data.stale_history_seqs = stale_seqs
+    user_data.history_start_seq = rows[-1]["seq"] if rows else summary_start_seq
+    user_data.mark_history_synced(messages, len(messages))
+    user_data.token_ledger.seed(messages, counts)
+    if summary:
+        user_data.set_summary(summary, synced=True)
+
+
+async def write_history(db: aiosqlite.Connection, user_data: UserData) -> Callable[[], None]:
+    """
+    Write the messages that are not stored yet, and the summary if it changed.
+
+    Stored messages loaded in an older envelope are re-encrypted in the
+    current format along the way. Returns a callback that marks everything as
+    synced; call it only after the surrounding transaction has committed.
+
+    Everything is captured before the first await: a compaction may run
+    while the rows are being encrypted.
+    """
+    messages = user_data.messages
+    reset, start_seq, new_messages = user_data.pending_history()
+    user_id = str(user_data.user_id)
+    stale_seqs = set(user_data.stale_history_seqs)
+    base_seq = user_data.history_start_seq
+    upgrades = [
+        (seq, messages[seq - base_seq]["content"])
+        for seq in sorted(stale_seqs)
+        if not reset and 0 <= seq - base_seq < user_data._synced_count
+    ]
+    ledger = user_data.token_ledger
+    ledger.sync(messages)
+    offset = len(messages) - len(new_messages)
+    token_counts = [ledger.count(offset + i) for i in range(len(new_messages))]
+    pending_summary = user_data.pending_summary()
+    summary_start_seq = 0 if reset else base_seq
+    # Absolute seq after the last stored message, stays valid across compactions
+    synced_end_seq = start_seq + len(new_messages)
+
+    if reset:
+        await db.execute(DELETE_HISTORY_SQL, (user_id,))
+        await db.execute(DELETE_SUMMARY_SQL, (user_id,))
+    elif upgrades:
+        await db.executemany(
+            UPDATE_PAYLOAD_SQL,
+            [(await encrypt_text_async(content), user_id, seq) for seq, content in upgrades],
+        )
+    if new_messages:
+        await db.executemany(
+            INSERT_MESSAGE_SQL,
+            [
+                (
+                    user_id,
+                    start_seq + i,
+                    message["role"],
+                    len(message["content"]),
+                    token_counts[i],
+                    await encrypt_text_async(message["content"]),
+                )
+                for i, message in enumerate(new_messages)
+            ],
+        )
+    if pending_summary is not None and pending_summary[1]:
+        await db.execute(
+            UPSERT_SUMMARY_SQL,
+            (user_id, summary_start_seq, await encrypt_text_async(pending_summary[1])),
+        )
+
+    def mark_synced():
+        if reset:
+            user_data.history_start_seq = 0
+        user_data.stale_history_seqs.difference_update(stale_seqs)
+        user_data.mark_history_synced(messages, synced_end_seq - user_data.history_start_seq)
+        if pending_summary is not None:
+            user_data.mark_summary_synced(pending_summary[0])
+
+    return mark_synced
+
+
+def has_legacy_messages(raw_messages) -> bool:
+    """Whether an old ``UsersData.messages`` blob still has to be migrated."""
+    return bool(raw_messages) and raw_messages != MISSING_KEY_MARKER
+
+
+async def migrate_legacy_user(db: aiosqlite.Connection, user_id: str) -> bool:
+    """
+    Move one old ``UsersData.messages`` blob into ConversationMessages.
+
+    The blob is read inside the caller's write transaction, so a user migrated
+    meanwhile by another path is not migrated twice. A blob that cannot be
+    decrypted (e.g. the key is missing) is left untouched so it can be
+    migrated once the key is configured.
+    """
+    async with db.execute("SELECT messages FROM UsersData WHERE user_id = ?", (user_id,)) as cursor:
+        row = await cursor.fetchone()
+    if row is None or not has_legacy_messages(row["messages"]):
+        return False
+
+    try:
+        messages = decode_legacy_messages(row["messages"])
+    except Exception as e:
+        logging.warning(f"Could not migrate history of user {user_id}: {e}")
+        return False
+
+    user_data = UserData(user_id=int(user_id), messages=messages)
+    await write_history(db, user_data)
+    await db.execute("UPDATE UsersData SET messages = NULL WHERE user_id = ?", (user_id,))
+    return True
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Set
+
+import aiosqlite
+
+from src.database.engine import SQLiteEngine
+from src.database.history import (
+    CREATE_MESSAGES_TABLE_SQL,
+    CREATE_SUMMARIES_TABLE_SQL,
+    has_legacy_messages,
+    migrate_legacy_user,
+)
+
+# Rows handled per transaction by backfills, so live writes interleave
+BACKFILL_BATCH_SIZE = 200
+
+
+@dataclass
+class Migration:
+    """
+    One schema step, applied at most once per database file.
+
+    Foreground steps run inside a single transaction while the database is
+    opened. Background steps run after startup on the engine itself and must
+    commit in small batches and be safe to resume if interrupted.
+    """
+
+    version: int
+    name: str
+    apply: Callable
+    background: bool = False
+
+
+async def _column_exists(db: aiosqlite.Connection, table: str, column: str) -> bool:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return any(row["name"] == column for row in await cursor.fetchall())
+
+
+async def _create_users_table(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS UsersData (
+            user_id TEXT PRIMARY KEY,
+            model TEXT,
+            model_message_info TEXT,
+            model_message_chat TEXT,
+            messages TEXT,
+            count_messages INTEGER,
+            max_out INTEGER,
+            voice_answer BOOLEAN,
+            system_message TEXT,
+            pic_grade TEXT,
+            pic_size TEXT
+        )
+    """
+    )
+
+
+async def _add_username(db: aiosqlite.Connection) -> None:
+    if not await _column_exists(db, "UsersData", "username"):
+        await db.execute("ALTER TABLE UsersData ADD COLUMN username TEXT")
+
+
+async def _create_messages_table(db: aiosqlite.Connection) -> None:
+    await db.execute(CREATE_MESSAGES_TABLE_SQL)
+
+
+async def _add_last_active(db: aiosqlite.Connection) -> None:
+    if not await _column_exists(db, "UsersData", "last_active"):
+        await db.execute("ALTER TABLE UsersData ADD COLUMN last_active INTEGER")
+
+
+async def _add_response_cache(db: aiosqlite.Connection) -> None:
+    if not await _column_exists(db, "UsersData", "response_cache"):
+        await db.execute("ALTER TABLE UsersData ADD COLUMN response_cache BOOLEAN NOT NULL DEFAULT 1")
+
+
+async def _add_token_count(db: aiosqlite.Connection) -> None:
+    # NULL for messages stored before this column; they are counted on load
+    if not await _column_exists(db, "ConversationMessages", "token_count"):
+        await db.execute("ALTER TABLE ConversationMessages ADD COLUMN token_count INTEGER")
+
+
+async def _create_summaries_table(db: aiosqlite.Connection) -> None:
+    await db.execute(CREATE_SUMMARIES_TABLE_SQL)
+
+
+async def _index_last_active(engine: SQLiteEngine) -> None:
+    async with engine.writer() as db:
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_usersdata_last_active ON UsersData (last_active)"
+        )
+
+
+async def _backfill_legacy_messages(engine: SQLiteEngine) -> None:
+    # Blobs that cannot be decrypted yet are skipped here; load_user() still
+    # migrates them on first access once the key is configured.
+    last_user_id = ""
+    migrated = 0
+    while True:
+        async with engine.reader() as db:
+            async with db.execute(
+                """
+                SELECT user_id, messages FROM UsersData
+                WHERE user_id > ? AND messages IS NOT NULL AND messages != ''
+                ORDER BY user_id LIMIT ?
+                """,
+                (last_user_id, BACKFILL_BATCH_SIZE),
+            ) as cursor:
+                batch = await cursor.fetchall()
+        if not batch:
+            break
+
+        async with engine.writer() as db:
+            for row in batch:
+                if has_legacy_messages(row["messages"]):
+                    migrated += await migrate_legacy_user(db, row["user_id"])
+        last_user_id = batch[-1]["user_id"]
+        # Let request handlers get the writer between batches
+        await asyncio.sleep(0)
+
+    if migrated:
+        logging.info(f"Migrated legacy message history of {migrated} users")
+
+
+# Ordered, append-only: never edit or renumber a step that has shipped
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create UsersData", _create_users_table),
+    Migration(2, "add UsersData.username", _add_username),
+    Migration(3, "create ConversationMessages", _create_messages_table),
+    Migration(4, "add UsersData.last_active", _add_last_active),
+    Migration(5, "index UsersData.last_active", _index_last_active, background=True),
+    Migration(6, "backfill legacy message blobs", _backfill_legacy_messages, background=True),
+    Migration(7, "add UsersData.response_cache", _add_response_cache),
+    Migration(8, "add ConversationMessages.token_count", _add_token_count),
+    Migration(9, "create ConversationSummaries", _create_summaries_table),
+]
+
+
+async def _applied_versions(engine: SQLiteEngine) -> Set[int]:
+    async with engine.writer() as db:
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at INTEGER NOT NULL,
+                duration_ms INTEGER NOT NULL
+            )
+        """
+        )
+        async with db.execute("SELECT version FROM schema_version") as cursor:
+            return {row["version"] for row in await cursor.fetchall()}
+
+
+async def _record(engine: SQLiteEngine, db: aiosqlite.Connection, migration: Migration, started: float) -> None:
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    await db.execute(
+        "INSERT INTO schema_version (version, name, applied_at, duration_ms) VALUES (?, ?, ?, ?)",
+        (migration.version, migration.name, int(time.time()), duration_ms),
+    )
+    logging.info(f"{engine.path.name}: migration {migration.version} ({migration.name}) took {duration_ms} ms")
+
+
+async def run_migrations(engine: SQLiteEngine, migrations: List[Migration] = MIGRATIONS) -> List[Migration]:
+    """
+    Apply the pending foreground migrations in order.
+
+    Returns the pending background migrations, to be passed to
+    run_background_migrations() once the bot is serving requests.
+    """
+    applied = await _applied_versions(engine)
+    pending = [m for m in sorted(migrations, key=lambda m: m.version) if m.version not in applied]
+
+    background = []
+    for migration in pending:
+        if migration.background:
+            background.append(migration)
+            continue
+        started = time.perf_counter()
+        async with engine.writer() as db:
+            await migration.apply(db)
+            await _record(engine, db, migration, started)
+    return background
+
+
+async def run_background_migrations(engine: SQLiteEngine, migrations: List[Migration]) -> None:
+    """Run background migrations one after another, recording each when done."""
+    for migration in migrations:
+        started = time.perf_counter()
+        try:
+            await migration.apply(engine)
+        except asyncio.CancelledError:
+            logging.info(f"Migration {migration.version} ({migration.name}) interrupted, resuming on next start")
+            raise
+        except Exception:
+            logging.exception(f"Migration {migration.version} ({migration.name}) failed")
+            return
+        async with engine.writer() as db:
+            await _record(engine, db, migration, started)
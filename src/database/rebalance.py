@@ -0,0 +1,121 @@
+"""
+Copy every user from one storage layout into another.
+
+Used to move from the single file to K shards, or from K to M shards.
+Rows are copied as stored (still encrypted), nothing is decrypted. Run it
+while the bot is stopped, then point ``[Database] shards``/``shard_dir`` at
+the new layout and remove the old files once the bot runs fine.
+
+Usage:
+    python -m src.database.rebalance --source-shards 1 --target-shards 4 --target-dir data/shards_4
+"""
+import argparse
+import asyncio
+import dataclasses
+import logging
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.database.backends import SQLiteBackend, StorageBackend, create_backend
+from src.database.storage import DB_FILE
+
+# Tables keyed by user_id that are copied along with each UsersData row
+USER_TABLES = ("ConversationMessages", "ConversationSummaries")
+
+
+def _insert_sql(table: str, columns: List[str]) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+async def _copy_batch(shard: SQLiteBackend, target: StorageBackend, last_user_id: str, batch_size: int):
+    async with shard.engine.reader() as db:
+        async with db.execute(
+            "SELECT * FROM UsersData WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            (last_user_id, batch_size),
+        ) as cursor:
+            users = await cursor.fetchall()
+        if not users:
+            return None
+        user_ids = [row["user_id"] for row in users]
+        placeholders = ", ".join("?" for _ in user_ids)
+        related = {}
+        for table in USER_TABLES:
+            async with db.execute(
+                f"SELECT * FROM {table} WHERE user_id IN ({placeholders})", user_ids
+            ) as cursor:
+                related[table] = await cursor.fetchall()
+
+    users_by_target: Dict[SQLiteBackend, list] = defaultdict(list)
+    related_by_target: Dict[Tuple[SQLiteBackend, str], list] = defaultdict(list)
+    for row in users:
+        users_by_target[target.shard_for(int(row["user_id"]))].append(row)
+    for table, table_rows in related.items():
+        for row in table_rows:
+            related_by_target[target.shard_for(int(row["user_id"])), table].append(row)
+
+    for target_shard, rows in users_by_target.items():
+        async with target_shard.engine.writer() as db:
+            await db.executemany(_insert_sql("UsersData", list(rows[0].keys())), [tuple(row) for row in rows])
+            for table in USER_TABLES:
+                table_rows = related_by_target.get((target_shard, table))
+                if table_rows:
+                    await db.executemany(
+                        _insert_sql(table, list(table_rows[0].keys())),
+                        [tuple(row) for row in table_rows],
+                    )
+    return user_ids[-1], len(users)
+
+
+async def rebalance(source: StorageBackend, target: StorageBackend, batch_size: int = 500) -> int:
+    """Copy all users and their history from ``source`` to ``target``. Returns the user count."""
+    copied = 0
+    for shard in source.shard_backends:
+        last_user_id = ""
+        while True:
+            result = await _copy_batch(shard, target, last_user_id, batch_size)
+            if result is None:
+                break
+            last_user_id, count = result
+            copied += count
+        logging.info(f"Copied {shard.path} ({copied} users so far)")
+    return copied
+
+
+async def main(args: argparse.Namespace) -> None:
+    source_settings = dataclasses.replace(config.database, shards=args.source_shards, shard_dir=args.source_dir)
+    target_settings = dataclasses.replace(config.database, shards=args.target_shards, shard_dir=args.target_dir)
+    source = create_backend(source_settings, DB_FILE)
+    target = create_backend(target_settings, Path(args.target_dir) / DB_FILE.name)
+
+    source_files = {shard.path.resolve() for shard in source.shard_backends}
+    if any(shard.path.resolve() in source_files for shard in target.shard_backends):
+        raise SystemExit("Target layout must not share files with the source layout")
+
+    await source.open()
+    await target.open()
+    try:
+        start = time.perf_counter()
+        copied = await rebalance(source, target, args.batch_size)
+        print(f"Copied {copied} users in {time.perf_counter() - start:.1f}s")
+    finally:
+        await source.close()
+        await target.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source-shards", type=int, default=config.database.shards)
+    parser.add_argument("--source-dir", default=config.database.shard_dir)
+    parser.add_argument("--target-shards", type=int, required=True)
+    parser.add_argument("--target-dir", required=True)
+    parser.add_argument("--batch-size", type=int, default=500)
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(main(parser.parse_args()))
@@ -1,101 +1,248 @@
+import asyncio
+import time
+import weakref
 from pathlib import Path
-from typing import List, Dict, Optional
-import aiosqlite
+from typing import AsyncIterator, List, Dict, Optional, Set
 import logging
 
+from src.config import config
+from src.database.backends import StorageBackend, create_backend
+from src.database.cache import UserDataCache
 from src.database.entities import UserData
 
 DB_FILE = Path(__file__).parent.parent.parent / "data/users_data.db"
 
-# Dictionary for storing user data (Cache)
-users_data_cache: Dict[int, UserData] = {}
+# Bounded LRU cache of user data
+users_data_cache = UserDataCache(
+    max_bytes=config.cache.user_cache_mb * 1024 * 1024,
+    ttl=config.cache.user_cache_ttl,
+)
+
+# Evicted entries that a handler may still be holding. Looking them up here
+# keeps a single UserData object per user until the last reference is gone.
+_evicted_users: "weakref.WeakValueDictionary[int, UserData]" = weakref.WeakValueDictionary()
+
+# Single-file or sharded backend, opened by init_db() and closed by close_db()
+backend: Optional[StorageBackend] = None
+
+# Write-behind state: users whose cached data has not been written yet
+dirty_users: Set[int] = set()
+_flush_wakeup: Optional[asyncio.Event] = None
+_flusher_task: Optional[asyncio.Task] = None
+
+
+def _get_backend() -> StorageBackend:
+    if backend is None:
+        raise RuntimeError("Database is not initialized, call init_db() first")
+    return backend
+
 
 async def init_db():
-    """Initialize the database table."""
-    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS UsersData (
-                user_id TEXT PRIMARY KEY,
-                model TEXT,
-                model_message_info TEXT,
-                model_message_chat TEXT,
-                messages TEXT,
-                count_messages INTEGER,
-                max_out INTEGER,
-                voice_answer BOOLEAN,
-                system_message TEXT,
-                pic_grade TEXT,
-                pic_size TEXT,
-                username TEXT
-            )
-        """
-        )
-        # Migration: Check if username column exists, if not add it
+    """Open the storage backend and make sure its schema is up to date."""
+    global backend
+    if backend is None:
+        backend = create_backend(config.database, DB_FILE)
+        await backend.open()
+
+    if config.database.write_behind:
+        start_flusher()
+
+
+async def close_db():
+    """Flush pending writes and close the storage backend. Safe to call more than once."""
+    global backend
+    await stop_flusher()
+    if backend is not None:
+        await backend.close()
+        backend = None
+
+
+def start_flusher() -> None:
+    """Start the background task that writes dirty users in batches."""
+    global _flush_wakeup, _flusher_task
+    if _flusher_task is not None and not _flusher_task.done():
+        return
+    _flush_wakeup = asyncio.Event()
+    _flusher_task = asyncio.create_task(_flusher_loop())
+
+
+async def stop_flusher() -> None:
+    """Stop the background flusher and write whatever is still dirty."""
+    global _flush_wakeup, _flusher_task
+    task = _flusher_task
+    _flusher_task = None
+    _flush_wakeup = None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    if dirty_users and backend is not None:
+        await flush_dirty_users()
+
+
+async def _flusher_loop() -> None:
+    interval = config.database.flush_interval_ms / 1000
+    while True:
+        try:
+            await asyncio.wait_for(_flush_wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _flush_wakeup.clear()
+        if not dirty_users:
+            continue
+        try:
+            await flush_dirty_users()
+        except Exception as e:
+            # The users stay dirty and are retried on the next tick
+            logging.error(f"Write-behind flush failed: {e}")
+
+
+async def flush_dirty_users() -> int:
+    """
+    Write every dirty user in a single batch.
+
+    Returns the number of users written. On failure the users are marked
+    dirty again so a later flush can retry them.
+    """
+    if not dirty_users:
+        return 0
+
+    return await _flush_users(list(dirty_users))
+
+
+async def _flush_users(pending: List[int]) -> int:
+    dirty_users.difference_update(pending)
+    users = [
+        user_data
+        for user_data in (_lookup_cached(user_id) for user_id in pending)
+        if user_data is not None
+    ]
+    try:
+        await _persist_users(users)
+    except BaseException:
+        dirty_users.update(pending)
+        raise
+    return len(users)
+
+
+async def _persist_users(users: List[UserData]) -> None:
+    """Write the given users in one transaction (one per shard when sharded)."""
+    taken = [(user_data, user_data.take_changes()) for user_data in users]
+    try:
+        on_commit = await _get_backend().write_users(taken)
+    except BaseException:
+        for user_data, changes in taken:
+            user_data.restore_changes(changes)
+        raise
+    for callback in on_commit:
+        callback()
+
+
+def _lookup_cached(user_id: int) -> Optional[UserData]:
+    user_data = users_data_cache.peek(user_id)
+    if user_data is None:
+        user_data = _evicted_users.get(user_id)
+    return user_data
+
+
+async def _evict_idle_users() -> None:
+    """Drop idle or over-budget users from the cache, flushing dirty ones first."""
+    victims = users_data_cache.victims()
+    if not victims:
+        return
+
+    dirty_victims = [user_id for user_id in victims if user_id in dirty_users]
+    if dirty_victims:
         try:
-             await db.execute("SELECT username FROM UsersData LIMIT 1")
-        except aiosqlite.OperationalError:
-             await db.execute("ALTER TABLE UsersData ADD COLUMN username TEXT")
-             
-        await db.commit()
+            await _flush_users(dirty_victims)
+        except Exception as e:
+            logging.error(f"Could not flush users before eviction: {e}")
+            victims = [user_id for user_id in victims if user_id not in dirty_victims]
+
+    for user_id in victims:
+        # Skip users that became dirty again while the flush was running
+        user_data = users_data_cache.peek(user_id)
+        if user_data is None or user_id in dirty_users:
+            continue
+        _evicted_users[user_id] = user_data
+        users_data_cache.evict(user_id)
+
 
 async def get_or_create_user_data(user_id: int) -> UserData:
     """Get user data from cache or DB, or create new."""
-    if user_id in users_data_cache:
-        return users_data_cache[user_id]
-
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM UsersData WHERE user_id = ?", (str(user_id),)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                user_data = UserData.from_db_row(row)
-            else:
-                user_data = UserData(user_id=user_id)
-
-    users_data_cache[user_id] = user_data
+    user_data = users_data_cache.get(user_id)
+    if user_data is not None:
+        return user_data
+
+    user_data = _evicted_users.pop(user_id, None)
+    if user_data is not None:
+        users_data_cache.put(user_data)
+        await _evict_idle_users()
+        return user_data
+
+    user_data = await _get_backend().load_user(user_id)
+    if user_data is None:
+        user_data = UserData(user_id=user_id)
+
+    # Another task may have loaded the same user while we were waiting
+    user_data = users_data_cache.put(user_data)
+    await _evict_idle_users()
     return user_data
 
 async def save_user_data(user_id: int) -> None:
-    """Save user data from cache to DB."""
-    user_data = users_data_cache.get(user_id)
-    if not user_data:
-        logging.warning(f"Attempted to save non-existent user data for {user_id}")
+    """
+    Save user data from cache to DB.
+
+    In write-behind mode the user is only marked dirty here and the background
+    flusher writes it within the configured flush interval.
+    """
+    user_data = users_data_cache.peek(user_id)
+    if user_data is None:
+        # A handler may still hold an entry that was evicted meanwhile
+        user_data = _evicted_users.pop(user_id, None)
+        if user_data is None:
+            logging.warning(f"Attempted to save non-existent user data for {user_id}")
+            return
+        users_data_cache.put(user_data)
+    users_data_cache.charge(user_id)
+
+    if not user_data.has_unsaved_changes():
+        return
+    user_data.last_active = int(time.time())
+
+    if _flusher_task is not None:
+        dirty_users.add(user_id)
+        if len(dirty_users) >= config.database.flush_max_records:
+            _flush_wakeup.set()
         return
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            """
-            INSERT INTO UsersData (user_id, model, model_message_info, model_message_chat, messages,
-            count_messages, max_out, voice_answer, system_message, pic_grade, pic_size, username)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id)
-            DO UPDATE SET
-                model = excluded.model,
-                model_message_info = excluded.model_message_info,
-                model_message_chat = excluded.model_message_chat,
-                messages = excluded.messages,
-                count_messages = excluded.count_messages,
-                max_out = excluded.max_out,
-                voice_answer = excluded.voice_answer,
-                system_message = excluded.system_message,
-                pic_grade = excluded.pic_grade,
-                pic_size = excluded.pic_size,
-                username = excluded.username
-            """,
-            user_data.to_db_row(),
-        )
-        await db.commit()
+    await _persist_users([user_data])
+
+
+def iter_users(
+    batch_size: int = 500,
+    active_since: Optional[float] = None,
+    has_username: Optional[bool] = None,
+) -> AsyncIterator[List[Dict[str, str]]]:
+    """
+    Stream users in batches of at most ``batch_size``.
+
+    Uses keyset pagination on user_id, so memory stays constant no matter how
+    many users exist. Batches are ordered by user_id (per shard when the
+    sharded backend is used).
+
+    Args:
+        active_since: only users saved at or after this unix timestamp
+        has_username: only users with (True) or without (False) a known username
+    """
+    return _get_backend().iter_users(batch_size, active_since, has_username)
+
 
 async def get_all_users() -> List[Dict[str, str]]:
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT user_id, username FROM UsersData") as cursor:
-            users = []
-            for row in await cursor.fetchall():
-                username = row["username"] if "username" in row.keys() and row["username"] else "Unknown"
-                users.append({"user_id": str(row["user_id"]), "username": username})
-            return users
+    users = []
+    async for batch in iter_users():
+        users.extend(batch)
+    return users
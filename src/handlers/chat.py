@@ -1,17 +1,32 @@
 import asyncio
 import logging
+import time
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.types import BufferedInputFile, Message
 from aiogram.utils.formatting import Text, Bold
 from aiogram.enums import ParseMode
 
+from src.config import config
 from src.database.storage import get_or_create_user_data, save_user_data
 from src.utils.access_control import checkAccess
-from src.utils.functions import prune_messages, process_voice_message, simple_bot_responses
+from src.utils.functions import prune_messages, process_voice_message, queue_notice, simple_bot_responses
+from src.utils.metrics import metrics
+from src.utils.streaming import StreamingReply
+from src.utils.texts import overloaded_message, unavailable_message
+from src.utils.tokens import context_budget, count_tokens, message_tokens
 from src.services.openai_service import OpenAIService
+from src.services.resilience import ServiceUnavailableError, request_deadline
+from src.services.routing import model_prefix, model_router
+from src.services.scheduler import QueueFullError
+from src.services.speech import SpeechAnswer
+from src.services.single_flight import SingleFlight, normalize_prompt
+from src.services.summarizer import schedule_compaction, summary_message
 
 router = Router()
 
+# Turns in flight by (user, prompt, model), so a double-tapped send is answered once
+chat_flights = SingleFlight("chat")
+
 @router.message(F.content_type.in_({"text", "voice"}))
 async def chatgpt_text_handler(message: Message):
     if not await checkAccess(message):
@@ -35,28 +50,42 @@ async def chatgpt_text_handler(message: Message):
     last_message_id = response.message_id
 
     try:
-        if message.voice:
-            user_prompt = await process_voice_message(message.bot, message, message.from_user.id)
-        elif message.text:
-            user_prompt = message.text
-
-        # First, check for simple bot responses
-        simple_response = await simple_bot_responses(user_prompt)
-        if simple_response:
-            await message.bot.delete_message(message.chat.id, last_message_id)
-            await message.reply(simple_response)
-            return
-
-        # Image Generation Handling
-        if user_data.model in ["gpt-image-1-mini", "gpt-image-1", "gpt-image-1.5"]:
-            await handle_dalle(message, user_data, user_prompt, last_message_id)
-            return
-
-        # Text Models Handling
-        if user_data.model in ["gpt-5-nano", "gpt-4o-mini", "gpt-5-mini", "gpt-4o", "gpt-5"]:
-            await handle_text_model(message, user_data, user_prompt, last_message_id)
-            return
+        with request_deadline(config.resilience.request_deadline):
+            if message.voice:
+                user_prompt = await process_voice_message(
+                    message.bot, message, message.from_user.id,
+                    on_queued=queue_notice(message.bot, message.chat.id, last_message_id),
+                )
+            elif message.text:
+                user_prompt = message.text
+
+            # First, check for simple bot responses
+            simple_response = await simple_bot_responses(user_prompt)
+            if simple_response:
+                await message.bot.delete_message(message.chat.id, last_message_id)
+                await message.reply(simple_response)
+                return
+
+            # Image Generation Handling
+            if user_data.model in ["gpt-image-1-mini", "gpt-image-1", "gpt-image-1.5"]:
+                await handle_dalle(message, user_data, user_prompt, last_message_id)
+                return
+
+            # Text Models Handling
+            if user_data.model in ["gpt-5-nano", "gpt-4o-mini", "gpt-5-mini", "gpt-4o", "gpt-5"]:
+                # A resent prompt waits for the answer already being written
+                key = (message.from_user.id, normalize_prompt(user_prompt), user_data.model)
+                _, shared = await chat_flights.run(
+                    key, lambda: handle_text_model(message, user_data, user_prompt, last_message_id)
+                )
+                if shared:
+                    await message.bot.delete_message(message.chat.id, last_message_id)
+                return
             
+    except QueueFullError:
+        await message.bot.edit_message_text(overloaded_message, chat_id=message.chat.id, message_id=last_message_id)
+    except ServiceUnavailableError:
+        await message.bot.edit_message_text(unavailable_message, chat_id=message.chat.id, message_id=last_message_id)
     except Exception as e:
         logging.exception(e)
         await message.reply(f"An error occurred: {e}")
@@ -68,7 +97,10 @@ async def handle_dalle(message, user_data, prompt, loading_msg_id):
             prompt=prompt,
             model=user_data.model,
             size=user_data.pic_size,
-            quality=user_data.pic_grade
+            quality=user_data.pic_grade,
+            user_id=message.from_user.id,
+            on_queued=queue_notice(message.bot, message.chat.id, loading_msg_id),
+            use_cache=user_data.response_cache,
         )
         
         user_data.count_messages += 1
@@ -80,79 +112,157 @@ async def handle_dalle(message, user_data, prompt, loading_msg_id):
             image_url,
             reply_to_message_id=message.message_id,
         )
+    except QueueFullError:
+        await message.bot.edit_message_text(overloaded_message, chat_id=message.chat.id, message_id=loading_msg_id)
+    except ServiceUnavailableError:
+        await message.bot.edit_message_text(unavailable_message, chat_id=message.chat.id, message_id=loading_msg_id)
     except Exception as e:
         logging.exception(e)
         await message.reply(f"An error occurred generating image: {e}")
 
 
 async def handle_text_model(message, user_data, prompt, loading_msg_id):
+    started = time.monotonic()
     # Add the user's message to the chat history
     user_data.messages.append({"role": "user", "content": prompt})
 
-    # Apply the trim function
-    pruned_messages = await prune_messages(
-        user_data.messages, max_chars=user_data.max_out
-    )
-    
     # Process system message
     system_msg = user_data.system_message if user_data.system_message else None
+
+    # Apply the trim function, the system message and summary share the model's budget
+    budget = context_budget(user_data.model, user_data.max_out) - count_tokens(system_msg or "")
+    pinned = summary_message(user_data)
+    if pinned:
+        budget -= message_tokens(pinned)
+    pruned_messages = await prune_messages(
+        user_data.messages, max_tokens=budget, ledger=user_data.token_ledger
+    )
+    if pinned:
+        pruned_messages = [pinned] + pruned_messages
     
     # Bot is typing...
     await message.bot.send_chat_action(message.chat.id, action="typing")
     
-    response_message = await OpenAIService.chat_completion(
-        model=user_data.model,
-        messages=pruned_messages,
-        system_message=system_msg
+    if config.chat.streaming:
+        await stream_text_model(message, user_data, pruned_messages, system_msg, loading_msg_id, started)
+        return
+
+    answered_by, response_message = await model_router.complete(
+        user_data.model,
+        lambda model: OpenAIService.chat_completion(
+            model=model,
+            messages=pruned_messages,
+            system_message=system_msg,
+            user_id=message.from_user.id,
+            on_queued=queue_notice(message.bot, message.chat.id, loading_msg_id),
+            use_cache=user_data.response_cache,
+        ),
     )
+    metrics.observe("chat.completion_time", time.monotonic() - started)
 
     # Adding the model's response to the chat history
     user_data.messages.append({"role": "assistant", "content": response_message})
     user_data.count_messages += 1
     await save_user_data(message.from_user.id)
+    schedule_compaction(message.from_user.id, user_data)
     
     await message.bot.delete_message(message.chat.id, loading_msg_id)
     
-    await send_response(message, user_data, response_message)
+    await send_response(message, user_data, response_message, reply_prefix(user_data, answered_by))
 
 
-async def send_response(message, user_data, response_text):
-    async def send_voice_if_enabled():
-        if user_data.voice_answer:
-            from pathlib import Path
-            speech_file_path = Path(__file__).parent.parent.parent / f"data/voice/speech_{message.chat.id}.mp3"
-            speech_file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            await OpenAIService.text_to_speech(response_text, str(speech_file_path))
-            
-            from aiogram.types import FSInputFile
-            audio = FSInputFile(speech_file_path)
+def reply_prefix(user_data, answered_by):
+    """The user's prefix for their model, or the prefix of the fallback model that answered."""
+    return user_data.model_message_chat if answered_by == user_data.model else model_prefix(answered_by)
+
+
+async def stream_text_model(message, user_data, pruned_messages, system_msg, loading_msg_id, started):
+    """Edit the placeholder message with the answer while it is being generated."""
+    answered_by, deltas = await model_router.stream(
+        user_data.model,
+        lambda model: OpenAIService.chat_completion_stream(
+            model=model,
+            messages=pruned_messages,
+            system_message=system_msg,
+            user_id=message.from_user.id,
+            on_queued=queue_notice(message.bot, message.chat.id, loading_msg_id),
+            use_cache=user_data.response_cache,
+        ),
+    )
+    reply = StreamingReply(
+        message.bot,
+        message.chat.id,
+        loading_msg_id,
+        prefix=reply_prefix(user_data, answered_by),
+        interval=config.chat.stream_edit_interval,
+    )
+    # The spoken answer is synthesized sentence by sentence while the text streams
+    speech = SpeechAnswer(message.from_user.id) if user_data.voice_answer else None
+    try:
+        async for delta in deltas:
+            if not reply.text:
+                metrics.observe("chat.time_to_first_token", time.monotonic() - started)
+            await reply.append(delta)
+            if speech:
+                speech.feed(delta)
+        await reply.finish()
+    except BaseException:
+        if speech:
+            speech.cancel()
+        raise
+    response_message = reply.text
+
+    # Adding the model's response to the chat history
+    user_data.messages.append({"role": "assistant", "content": response_message})
+    user_data.count_messages += 1
+    await save_user_data(message.from_user.id)
+    schedule_compaction(message.from_user.id, user_data)
+
+    await send_speech(message, speech)
+
+
+async def send_speech(message, speech):
+    """Send the spoken answer once all of its chunks are synthesized."""
+    if speech is None:
+        return
+    try:
+        audio = await speech.finish()
+        if audio:
             await message.bot.send_audio(
-                message.chat.id, audio, title="Audio answer option"
+                message.chat.id, BufferedInputFile(audio, filename="answer.mp3"), title="Audio answer option"
             )
+    except Exception as e:
+        logging.error(f"Error sending audio answer: {e}")
 
+
+async def send_response(message, user_data, response_text, prefix=None):
+    prefix = prefix or user_data.model_message_chat
+    # Synthesis starts before the text is sent, not after
+    speech = None
+    if user_data.voice_answer:
+        speech = SpeechAnswer(message.from_user.id)
+        speech.feed(response_text)
     try:
         if "```" in response_text:
             # Code block present, use Markdown
             if len(response_text) > 4096:
-                await send_long_message(message, user_data.model_message_chat, response_text, parse_mode=ParseMode.MARKDOWN)
+                await send_long_message(message, prefix, response_text, parse_mode=ParseMode.MARKDOWN)
             else:
-                final_message = f"*{user_data.model_message_chat}*{response_text}"
+                final_message = f"*{prefix}*{response_text}"
                 await message.reply(final_message, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
         else:
             # Plain text
             if len(response_text) > 4096:
-                await send_long_message(message, user_data.model_message_chat, response_text, parse_mode=None)
+                await send_long_message(message, prefix, response_text, parse_mode=None)
             else:
-                content_kwargs = Text(Bold(user_data.model_message_chat), response_text)
+                content_kwargs = Text(Bold(prefix), response_text)
                 await message.reply(**content_kwargs.as_kwargs(), disable_web_page_preview=True)
-        
-        await send_voice_if_enabled()
-        
     except Exception as e:
         logging.error(f"Error sending message: {e}")
         # Fallback to splitting plain text
-        await send_long_message(message, user_data.model_message_chat, response_text, parse_mode=None)
+        await send_long_message(message, prefix, response_text, parse_mode=None)
+
+    await send_speech(message, speech)
 
 
 async def send_long_message(message, prefix, text, parse_mode=None):
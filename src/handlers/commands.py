@@ -1,11 +1,17 @@
+import time
+
 from aiogram import Router, F, flags
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
-from src.database.storage import get_or_create_user_data, save_user_data
+from src.database.storage import get_or_create_user_data, save_user_data, iter_users, users_data_cache
 from src.utils.access_control import checkAccess
 from src.utils.texts import start_message, help_message
 from src.config import config
+from src.utils.metrics import metrics
+from src.utils.tokens import context_budget
+from src.services.response_cache import media_cache, response_cache, speech_cache
+from src.services.routing import fallback_rates
 from src.handlers import common_state
 
 router = Router()
@@ -27,7 +33,7 @@ async def command_start_handler(message: Message, state: FSMContext):
     user_data.model_message_chat = "5 nano:\n\n"
     user_data.messages = []
     user_data.count_messages = 0
-    user_data.max_out = 128000
+    user_data.max_out = context_budget(user_data.model)
     user_data.voice_answer = False
     user_data.system_message = ""
     user_data.pic_grade = "standard"
@@ -86,3 +92,99 @@ async def disable_all_access(message: Message):
     
     common_state.ALL_USERS_ACCESS = False
     await message.answer("Bot access has been disabled for all non-owner users. Owner access remains unaffected.")
+
+
+@router.message(F.text.startswith("/users"))
+async def list_users(message: Message):
+    """
+    Command to list known users, optionally only those active in the last N days.
+    Usage: /users [days]
+    Only users in OWNER_ID can use this command.
+    """
+    user_id = message.from_user.id
+
+    # Ensure who can use this command
+    if user_id != config.telegram.owner_id:
+        await message.answer("You do not have permission to use this command.")
+        return
+
+    args = message.text.split()[1:]
+    active_since = None
+    if args:
+        if not args[0].isdigit():
+            await message.answer("Usage: /users [days]")
+            return
+        active_since = time.time() - int(args[0]) * 86400
+
+    # Users are streamed page by page, only the current chunk is kept in memory
+    total = 0
+    chunk = ""
+    async for batch in iter_users(active_since=active_since):
+        for user in batch:
+            total += 1
+            line = f"{user['user_id']} — {user['username']}\n"
+            if len(chunk) + len(line) > 4096:
+                await message.answer(chunk, parse_mode=None)
+                chunk = ""
+            chunk += line
+
+    if chunk:
+        await message.answer(chunk, parse_mode=None)
+    await message.answer(f"Users: {total}")
+
+
+@router.message(F.text == "/stats")
+async def show_stats(message: Message):
+    """
+    Command to show latency metrics and user cache counters.
+    Only users in OWNER_ID can use this command.
+    """
+    user_id = message.from_user.id
+
+    # Ensure who can use this command
+    if user_id != config.telegram.owner_id:
+        await message.answer("You do not have permission to use this command.")
+        return
+
+    cache_stats = ", ".join(f"{key}={value}" for key, value in users_data_cache.stats().items())
+    response_stats = ", ".join(
+        f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in response_cache.stats().items()
+    )
+    media_stats = ", ".join(
+        f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in media_cache.stats().items()
+    )
+    speech_stats = ", ".join(
+        f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in speech_cache.stats().items()
+    )
+    fallback_stats = ", ".join(f"{model}={rate:.0%}" for model, rate in sorted(fallback_rates().items()))
+    await message.answer(
+        f"{metrics.format()}\nuser cache: {cache_stats}\nresponse cache: {response_stats}"
+        f"\nmedia cache: {media_stats}\nspeech cache: {speech_stats}"
+        f"\nfallbacks: {fallback_stats or 'none'}",
+        parse_mode=None,
+    )
+
+
+@router.message(F.text.startswith("/cache"))
+async def toggle_response_cache(message: Message):
+    """
+    Command to choose whether identical requests may be answered from the shared cache.
+    Usage: /cache [on|off]
+    """
+    if not await checkAccess(message):
+        return
+
+    user_data = await get_or_create_user_data(message.from_user.id)
+    args = message.text.split()[1:]
+    if args:
+        if args[0] not in ("on", "off"):
+            await message.answer("Usage: /cache [on|off]")
+            return
+        user_data.response_cache = args[0] == "on"
+        await save_user_data(message.from_user.id)
+
+    state = "on" if user_data.response_cache else "off"
+    await message.answer(f"Cached answers for repeated requests: {state}")
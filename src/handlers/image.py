@@ -1,14 +1,17 @@
-import asyncio
 import logging
-import base64
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
-from aiogram.client.session import aiohttp
 
 from src.database.storage import get_or_create_user_data, save_user_data
 from src.utils.access_control import checkAccess
+from src.utils.functions import queue_notice
+from src.utils.images import load_photo
+from src.config import config
+from src.utils.texts import overloaded_message, unavailable_message
 from src.services.openai_service import OpenAIService
+from src.services.resilience import ServiceUnavailableError, request_deadline
+from src.services.scheduler import QueueFullError
 
 router = Router()
 
@@ -25,16 +28,22 @@ async def chatgpt_photo_vision_handler(message: Message, state: FSMContext):
         temp_message = await message.answer("⏳ Hold on, your request is being processed!")
 
         text = message.caption or "What's in the picture?"
-        photo = message.photo[-1]
-        file_info = await message.bot.get_file(photo.file_id)
-        file_url = f"https://api.telegram.org/file/bot{message.bot.token}/{file_info.file_path}"
-
-        base64_image = await download_and_encode_image(file_url)
-
-        ai_response = await OpenAIService.vision_chat_completion(
-            text=text,
-            base64_image=base64_image
-        )
+        detail = config.vision.detail
+
+        async def load_image():
+            # Only fetched when the answer for this picture and caption is not cached
+            return await load_photo(message.bot, message.photo, detail)
+
+        with request_deadline(config.resilience.request_deadline):
+            ai_response = await OpenAIService.vision_chat_completion(
+                text=text,
+                load_image=load_image,
+                user_id=message.from_user.id,
+                on_queued=queue_notice(message.bot, message.chat.id, temp_message.message_id),
+                image_id=message.photo[-1].file_unique_id,
+                use_cache=user_data.response_cache,
+                detail=detail,
+            )
 
         user_data.count_messages += 1
         await save_user_data(message.from_user.id)
@@ -42,16 +51,11 @@ async def chatgpt_photo_vision_handler(message: Message, state: FSMContext):
         await message.bot.delete_message(message.chat.id, temp_message.message_id)
         await message.answer(ai_response)
 
+    except QueueFullError:
+        await message.bot.edit_message_text(overloaded_message, chat_id=message.chat.id, message_id=temp_message.message_id)
+    except ServiceUnavailableError:
+        await message.bot.edit_message_text(unavailable_message, chat_id=message.chat.id, message_id=temp_message.message_id)
     except Exception as e:
         logging.exception(e)
         await message.reply(f"An error occurred: {e}")
 
-
-async def download_and_encode_image(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                image_content = await resp.read()
-                base64_image = base64.b64encode(image_content).decode("utf-8")
-                return f"data:image/jpeg;base64,{base64_image}"
-    raise ValueError("Failed to download image")
@@ -12,6 +12,7 @@ from src.database.storage import get_or_create_user_data, save_user_data
 from src.utils.access_control import checkAccess
 from src.utils.functions import info_menu_func, process_voice_message
 from src.utils.texts import system_message_text
+from src.utils.tokens import context_budget
 from src.keyboards.buttons import (
     keyboard,
     keyboard_model,
@@ -129,7 +130,7 @@ async def set_model(callback_query, model_id, model_info, model_chat_prefix):
         return
 
     user_data.model = model_id
-    user_data.max_out = 128000
+    user_data.max_out = context_budget(model_id)
     user_data.model_message_info = model_info
     user_data.model_message_chat = model_chat_prefix
 
@@ -14,8 +14,12 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from src.handlers import router
 from src.config import config
-from src.database.storage import init_db
+from src.database.storage import init_db, close_db
 from src.middlewares.throttling import ThrottlingMiddleware
+from src.services.openai_service import OpenAIService, batch_queue
+from src.services.response_cache import media_cache, response_cache
+from src.services.summarizer import cancel_compactions
+from src.utils.images import close_image_workers
 
 async def set_commands(bot: Bot):
     commands = {
@@ -33,6 +37,10 @@ async def set_commands(bot: Bot):
 
 async def start_bot():
     await init_db()
+    await response_cache.open()
+    await media_cache.open()
+    if config.batch.enabled:
+        batch_queue.start()
     
     bot = Bot(token=config.telegram.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     dp = Dispatcher(storage=MemoryStorage())
@@ -56,6 +64,13 @@ async def main():
     finally:
         if bot is not None:
             await bot.session.close()
+        await cancel_compactions()
+        await batch_queue.stop()
+        await OpenAIService.close()
+        await response_cache.close()
+        await media_cache.close()
+        await close_db()
+        close_image_workers()
 
 
 if __name__ == "__main__":
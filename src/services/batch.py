@@ -0,0 +1,237 @@
+"""
+Deferred model calls, answered through a batch endpoint instead of the
+interactive API.
+
+Work that nobody is waiting on (history summaries, bulk re-runs, reports)
+is collected by ``BatchQueue``, written out as one JSONL batch and
+submitted through a ``BatchTransport``; a background loop polls submitted
+batches and resolves each caller's future with its response body. Batches
+do not count against the interactive rate limits and cost less per token,
+but may take up to the completion window (24 hours) to finish.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.config import BatchConfig
+from src.utils.metrics import metrics
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+# Batch states in which the output is not ready yet
+RUNNING_STATES = {"validating", "in_progress", "finalizing", "cancelling"}
+
+
+class BatchError(Exception):
+    """A deferred request (or its whole batch) failed."""
+
+
+class BatchTransport(ABC):
+    """Where batches go: OpenAI's Batch API, or a stand-in for tests."""
+
+    @abstractmethod
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit request lines of a batch and return its id."""
+
+    @abstractmethod
+    async def poll(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Result lines of a finished batch, None while it runs. Raises BatchError if the batch failed."""
+
+
+def encode_lines(lines: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode()
+
+
+def decode_lines(data: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+class OpenAIBatchTransport(BatchTransport):
+    def __init__(self, client, call: Callable[[str, Callable[[float], Awaitable]], Awaitable]):
+        self.client = client
+        # Wraps each API call, e.g. with retries
+        self.call = call
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        input_file = await self.call(
+            "files",
+            lambda timeout: self.client.files.create(
+                file=("batch.jsonl", encode_lines(requests)), purpose="batch", timeout=timeout
+            ),
+        )
+        batch = await self.call(
+            "batches",
+            lambda timeout: self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=CHAT_COMPLETIONS_URL,
+                completion_window=COMPLETION_WINDOW,
+                timeout=timeout,
+            ),
+        )
+        return batch.id
+
+    async def poll(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        batch = await self.call("batches", lambda timeout: self.client.batches.retrieve(batch_id, timeout=timeout))
+        if batch.status in RUNNING_STATES:
+            return None
+        if batch.status != "completed":
+            raise BatchError(f"Batch {batch_id} {batch.status}")
+        # Failed requests are reported in a separate error file
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.call("files", lambda timeout: self.client.files.content(file_id, timeout=timeout))
+                lines.extend(decode_lines(content.text))
+        return lines
+
+
+class LocalBatchTransport(BatchTransport):
+    """
+    File-based stand-in: batches are JSONL files in ``directory``, answered
+    by ``respond`` (request body -> response body) when first polled.
+    """
+
+    def __init__(self, directory: Path, respond: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        self.directory = Path(directory)
+        self.respond = respond
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread((self.directory / f"{batch_id}.jsonl").write_bytes, encode_lines(requests))
+        return batch_id
+
+    async def poll(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        output_path = self.directory / f"{batch_id}_output.jsonl"
+        if not output_path.exists():
+            requests = decode_lines(await asyncio.to_thread((self.directory / f"{batch_id}.jsonl").read_text))
+            results = []
+            for request in requests:
+                try:
+                    body = await self.respond(request["body"])
+                    results.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}})
+                except Exception as e:
+                    results.append({"custom_id": request["custom_id"], "error": {"message": str(e)}})
+            await asyncio.to_thread(output_path.write_bytes, encode_lines(results))
+        return decode_lines(await asyncio.to_thread(output_path.read_text))
+
+
+class BatchQueue:
+    """
+    Collects deferred requests and flushes them as one batch once
+    ``max_requests`` are waiting or the oldest waited ``flush_interval``
+    seconds. Callers await their result; pending and submitted requests
+    live in memory only and are cancelled on shutdown.
+    """
+
+    def __init__(self, settings: BatchConfig, transport: BatchTransport):
+        self.settings = settings
+        self.transport = transport
+        # custom_id -> (request line, future)
+        self._pending: Dict[str, tuple] = {}
+        self._oldest = 0.0
+        # batch id -> {custom_id: future}
+        self._submitted: Dict[str, Dict[str, asyncio.Future]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, body: Dict[str, Any], url: str = CHAT_COMPLETIONS_URL) -> Dict[str, Any]:
+        """Queue one request and wait for its response body."""
+        custom_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending[custom_id] = ({"custom_id": custom_id, "method": "POST", "url": url, "body": body}, future)
+        try:
+            if len(self._pending) >= self.settings.max_requests:
+                # The batch carries other callers' requests, giving up must not cancel it
+                await asyncio.shield(self.flush())
+            return await future
+        finally:
+            # A caller that gives up before the flush leaves the batch
+            self._pending.pop(custom_id, None)
+
+    async def flush(self) -> None:
+        """Submit the waiting requests as one batch."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            # Callers that gave up are not submitted
+            pending = {custom_id: job for custom_id, job in pending.items() if not job[1].done()}
+            if not pending:
+                return
+            try:
+                batch_id = await self.transport.submit([line for line, _ in pending.values()])
+            except Exception as e:
+                logging.error(f"Error submitting batch of {len(pending)} requests: {e}")
+                for _, future in pending.values():
+                    if not future.done():
+                        future.set_exception(BatchError(f"Batch submission failed: {e}"))
+                return
+            self._submitted[batch_id] = {custom_id: future for custom_id, (_, future) in pending.items()}
+            metrics.increment("batch.submitted")
+            metrics.increment("batch.requests", len(pending))
+
+    async def poll(self) -> None:
+        """Route the results of finished batches to their callers."""
+        for batch_id in list(self._submitted):
+            try:
+                results = await self.transport.poll(batch_id)
+            except BatchError as e:
+                results = []
+                error = e
+            except Exception as e:
+                logging.error(f"Error polling batch {batch_id}: {e}")
+                continue
+            else:
+                error = BatchError(f"No result in batch {batch_id}")
+            if results is None:
+                continue
+
+            futures = self._submitted.pop(batch_id)
+            for result in results:
+                future = futures.pop(result.get("custom_id"), None)
+                if future is None or future.done():
+                    continue
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code") != 200:
+                    metrics.increment("batch.failed")
+                    future.set_exception(BatchError(f"Deferred request failed: {result.get('error') or response}"))
+                else:
+                    metrics.increment("batch.completed")
+                    future.set_result(response["body"])
+            for future in futures.values():
+                if not future.done():
+                    metrics.increment("batch.failed")
+                    future.set_exception(error)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        futures = [future for _, future in self._pending.values()]
+        futures += [future for batch in self._submitted.values() for future in batch.values()]
+        for future in futures:
+            future.cancel()
+        self._pending.clear()
+        self._submitted.clear()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.poll_interval)
+            try:
+                if self._pending and time.monotonic() - self._oldest >= self.settings.flush_interval:
+                    await self.flush()
+                await self.poll()
+            except Exception as e:
+                logging.error(f"Batch queue error: {e}")
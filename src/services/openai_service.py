@@ -1,59 +1,226 @@
-import asyncio
+import importlib.util
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from src.config import config
+from src.services.batch import BatchQueue, OpenAIBatchTransport
+from src.services.resilience import resilience
+from src.services.response_cache import IMAGE_URL_TTL, cache_key, media_cache, response_cache
+from src.services.routing import chat_endpoint
+from src.services.scheduler import Priority, QueueCallback, priority_for, scheduler
+from src.services.single_flight import SingleFlight, normalize_prompt
+from src.utils.tokens import count_tokens
 
-# Initialize OpenAI client
-client = OpenAI(api_key=config.openai.api_key)
+
+def _timeout(total: float) -> httpx.Timeout:
+    return httpx.Timeout(total, connect=config.openai.connect_timeout)
+
+
+# One shared connection pool for every OpenAI call. HTTP/2 multiplexes
+# requests over fewer connections when the optional h2 package is installed.
+http_client = DefaultAsyncHttpxClient(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(
+        max_connections=config.openai.max_connections,
+        max_keepalive_connections=config.openai.max_keepalive_connections,
+        keepalive_expiry=config.openai.keepalive_expiry,
+    ),
+    timeout=_timeout(config.openai.chat_timeout),
+)
+
+# Initialize OpenAI client. Retries are done by src/services/resilience.py,
+# the SDK's own retries would multiply them.
+client = AsyncOpenAI(api_key=config.openai.api_key, http_client=http_client, max_retries=0)
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Prompt size for the scheduler's token budget, counted like the context budget."""
+    return sum(count_tokens(str(message["content"])) for message in messages)
+
+
+# Identical image requests in flight at the same time share one generation
+image_flights = SingleFlight("images")
+
+# Deferred, non-interactive requests go out together through the Batch API
+batch_queue = BatchQueue(
+    config.batch,
+    OpenAIBatchTransport(
+        client, lambda endpoint, request: resilience.call(endpoint, request, config.openai.chat_timeout)
+    ),
+)
 
 class OpenAIService:
     @staticmethod
-    async def chat_completion(
+    async def close() -> None:
+        """Close the shared HTTP connection pool."""
+        await client.close()
+
+    @staticmethod
+    def _chat_messages(
         model: str,
         messages: List[Dict[str, str]],
         system_message: Optional[str] = None
-    ) -> str:
-        
-        # Prepare messages
+    ) -> List[Dict[str, str]]:
         final_messages = []
         if system_message and model in ["gpt-5-nano", "gpt-4o-mini", "gpt-5-mini", "gpt-4o", "gpt-5"]:
              final_messages.append({"role": "system", "content": system_message})
-        
+
         final_messages.extend(messages)
+        return final_messages
+
+    @staticmethod
+    async def chat_completion(
+        model: str,
+        messages: List[Dict[str, str]],
+        system_message: Optional[str] = None,
+        user_id: Optional[int] = None,
+        on_queued: Optional[QueueCallback] = None,
+        use_cache: bool = True,
+        priority: Priority = Priority.TEXT
+    ) -> str:
+        
+        # Prepare messages
+        final_messages = OpenAIService._chat_messages(model, messages, system_message)
+        key = cache_key("chat", model, final_messages)
+        if use_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return cached
         
         try:
-            chat_completion = await asyncio.to_thread(
-                lambda: client.chat.completions.create(
-                    model=model, messages=final_messages
+            async with scheduler.slot(
+                model, priority_for(user_id, priority), _estimate_tokens(final_messages), on_queued
+            ) as ticket:
+                chat_completion = await resilience.call(
+                    chat_endpoint(model),
+                    lambda timeout: client.chat.completions.create(
+                        model=model,
+                        messages=final_messages,
+                        timeout=_timeout(timeout),
+                    ),
+                    config.openai.chat_timeout,
                 )
-            )
-            return chat_completion.choices[0].message.content
+                if chat_completion.usage:
+                    ticket.tokens = chat_completion.usage.total_tokens
+            content = chat_completion.choices[0].message.content
+            if use_cache:
+                await response_cache.put(key, content)
+            return content
         except Exception as e:
             logging.error(f"OpenAI Chat Completion Error: {e}")
             raise e
 
+    @staticmethod
+    async def chat_completion_deferred(
+        model: str,
+        messages: List[Dict[str, str]],
+        system_message: Optional[str] = None
+    ) -> str:
+        """
+        Same as chat_completion(), for work nobody is waiting on. The request
+        is answered through the Batch API, which can take hours; with batches
+        disabled it runs now at the lowest priority.
+        """
+        if not config.batch.enabled:
+            return await OpenAIService.chat_completion(
+                model, messages, system_message, use_cache=False, priority=Priority.MEDIA
+            )
+        final_messages = OpenAIService._chat_messages(model, messages, system_message)
+        body = await batch_queue.run({"model": model, "messages": final_messages})
+        return body["choices"][0]["message"]["content"]
+
+    @staticmethod
+    async def chat_completion_stream(
+        model: str,
+        messages: List[Dict[str, str]],
+        system_message: Optional[str] = None,
+        user_id: Optional[int] = None,
+        on_queued: Optional[QueueCallback] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """Same as chat_completion(), but yields the answer in text deltas as they arrive."""
+        final_messages = OpenAIService._chat_messages(model, messages, system_message)
+        key = cache_key("chat", model, final_messages)
+        if use_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+
+        try:
+            async with scheduler.slot(
+                model, priority_for(user_id, Priority.TEXT), _estimate_tokens(final_messages), on_queued
+            ) as ticket:
+                # Only opening the stream is retried, an answer cut off midway is not
+                stream = await resilience.call(
+                    chat_endpoint(model),
+                    lambda timeout: client.chat.completions.create(
+                        model=model,
+                        messages=final_messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        timeout=_timeout(timeout),
+                    ),
+                    config.openai.chat_timeout,
+                )
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.usage:
+                            ticket.tokens = chunk.usage.total_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+            if use_cache:
+                await response_cache.put(key, "".join(parts))
+        except Exception as e:
+            logging.error(f"OpenAI Chat Completion Stream Error: {e}")
+            raise e
+
     @staticmethod
     async def generate_image(
         prompt: str,
         model: str = "gpt-image-1-mini",
         size: str = "1024x1024",
         quality: str = "standard",
-        n: int = 1
+        n: int = 1,
+        user_id: Optional[int] = None,
+        on_queued: Optional[QueueCallback] = None,
+        use_cache: bool = True
     ) -> str:
-        try:
-            response = await asyncio.to_thread(
-                lambda: client.images.generate(
-                    model=model,
-                    prompt=prompt,
-                    n=n,
-                    size=size,
-                    quality=quality,
+        key = cache_key("image", prompt, model, size, quality, n)
+        if use_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def generate() -> str:
+            async with scheduler.slot(model, priority_for(user_id, Priority.MEDIA), on_queued=on_queued):
+                response = await resilience.call(
+                    "images",
+                    lambda timeout: client.images.generate(
+                        model=model,
+                        prompt=prompt,
+                        n=n,
+                        size=size,
+                        quality=quality,
+                        timeout=_timeout(timeout),
+                    ),
+                    config.openai.image_timeout,
                 )
-            )
-            return response.data[0].url
+            url = response.data[0].url
+            if use_cache:
+                await response_cache.put(key, url, ttl=IMAGE_URL_TTL)
+            return url
+
+        # Shared across users, unless the user opted out of shared answers
+        flight_key = (normalize_prompt(prompt), model, size, quality, n, None if use_cache else user_id)
+        try:
+            url, _ = await image_flights.run(flight_key, generate)
+            return url
         except Exception as e:
             logging.error(f"OpenAI Image Generation Error: {e}")
             raise e
@@ -61,57 +228,109 @@ class OpenAIService:
     @staticmethod
     async def vision_chat_completion(
         text: str,
-        base64_image: str,
+        base64_image: Optional[str] = None,
         model: str = "gpt-4o",
-        max_tokens: int = 4000
+        max_tokens: int = 4000,
+        user_id: Optional[int] = None,
+        on_queued: Optional[QueueCallback] = None,
+        image_id: Optional[str] = None,
+        use_cache: bool = True,
+        load_image: Optional[Callable[[], Awaitable[str]]] = None,
+        detail: str = "auto"
     ) -> str:
+        """
+        Describe an image, given as a data URL or by ``load_image``, which is
+        only awaited when the answer is not cached. ``image_id`` identifies
+        its content (Telegram's file_unique_id); without it the answer is not
+        cached. ``detail`` is the vision detail level the image is read at.
+        """
+        key = cache_key("vision", image_id, text, model, max_tokens, detail)
+        use_cache = use_cache and image_id is not None
+        if use_cache:
+            cached = await media_cache.get(key)
+            if cached is not None:
+                return cached
+        if base64_image is None:
+            base64_image = await load_image()
+
         messages = [
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": text},
-                    {"type": "image_url", "image_url": {"url": base64_image}},
+                    {"type": "image_url", "image_url": {"url": base64_image, "detail": detail}},
                 ],
             }
         ]
         try:
-            chat_completion = await asyncio.to_thread(
-                lambda: client.chat.completions.create(
-                    model=model, messages=messages, max_tokens=max_tokens
+            async with scheduler.slot(
+                model, priority_for(user_id, Priority.TEXT), count_tokens(text), on_queued
+            ) as ticket:
+                chat_completion = await resilience.call(
+                    "vision",
+                    lambda timeout: client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        timeout=_timeout(timeout),
+                    ),
+                    config.openai.chat_timeout,
                 )
-            )
-            return chat_completion.choices[0].message.content
+                if chat_completion.usage:
+                    ticket.tokens = chat_completion.usage.total_tokens
+            content = chat_completion.choices[0].message.content
+            if use_cache:
+                await media_cache.put(key, content)
+            return content
         except Exception as e:
             logging.error(f"OpenAI Vision Error: {e}")
             raise e
 
     @staticmethod
-    async def speech_to_text(file_path: str) -> str:
+    async def speech_to_text(
+        audio: bytes,
+        filename: str,
+        user_id: Optional[int] = None,
+        on_queued: Optional[QueueCallback] = None
+    ) -> str:
+        """Transcribe audio held in memory; ``filename``'s extension tells the API its format."""
+        async def transcribe(timeout: float):
+            return await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, audio),
+                timeout=_timeout(timeout),
+            )
+
+        # Transcription is the first step of an interactive text request
         try:
-            with open(file_path, "rb") as audio_file:
-                transcription = await asyncio.to_thread(
-                    lambda: client.audio.transcriptions.create(
-                        model="whisper-1", file=audio_file
-                    )
-                )
-                return transcription.text
+            async with scheduler.slot("whisper-1", priority_for(user_id, Priority.TEXT), on_queued=on_queued):
+                transcription = await resilience.call("transcriptions", transcribe, config.openai.audio_timeout)
+            return transcription.text
         except Exception as e:
             logging.error(f"OpenAI Speech to Text Error: {e}")
             raise e
 
     @staticmethod
-    async def text_to_speech(text: str, file_path: str) -> None:
+    async def text_to_speech(
+        text: str,
+        user_id: Optional[int] = None,
+        voice: str = "nova",
+        model: str = "gpt-4o-mini-tts"
+    ) -> bytes:
+        """MP3 audio of ``text``, kept in memory."""
         try:
-            response_voice = await asyncio.to_thread(
-                lambda: client.audio.speech.create(
-                    model="gpt-4o-mini-tts",
-                    voice="nova",
-                    input=text,
+            async with scheduler.slot(model, priority_for(user_id, Priority.MEDIA)):
+                response_voice = await resilience.call(
+                    "speech",
+                    lambda timeout: client.audio.speech.create(
+                        model=model,
+                        voice=voice,
+                        input=text,
+                        timeout=_timeout(timeout),
+                    ),
+                    config.openai.audio_timeout,
                 )
-            )
-            await asyncio.to_thread(
-                lambda: response_voice.stream_to_file(file_path)
-            )
+            return response_voice.content
         except Exception as e:
             logging.error(f"OpenAI Text to Speech Error: {e}")
             raise e
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import openai
+
+from src.config import ResilienceConfig, config
+from src.utils.metrics import metrics
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() by which the current user request must be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("openai_deadline", default=None)
+
+
+class ServiceUnavailableError(Exception):
+    """OpenAI is failing or too slow right now; the user should try again later."""
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised without calling OpenAI while the endpoint's circuit breaker is open."""
+
+
+class DeadlineExceededError(ServiceUnavailableError):
+    """Raised when the user request ran out of time before OpenAI answered."""
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """Bound every OpenAI call made inside the block, retries included, to ``seconds`` in total."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def clear_deadline() -> None:
+    """Drop the request deadline a background task inherited from the request that started it."""
+    _deadline.set(None)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx are worth another attempt."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        if error.code == "insufficient_quota":
+            # Also a 429, but waiting will not help
+            return False
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The delay the server asked for, in seconds, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        milliseconds = response.headers.get("retry-after-ms")
+        if milliseconds:
+            return float(milliseconds) / 1000
+        value = response.headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Fails fast after ``failure_threshold`` consecutive failures.
+
+    Once open, calls are refused for ``cooldown`` seconds; after that a single
+    probe call goes through and closes the circuit again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    @property
+    def refusing(self) -> bool:
+        """Whether a call made now would fail fast."""
+        return self.is_open and (self._probing or time.monotonic() - self.opened_at < self.cooldown)
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """The probe ended without an answer either way, let the next call probe."""
+        self._probing = False
+
+
+class Resilience:
+    """
+    Retries with exponential backoff and full jitter, per-endpoint circuit
+    breakers, and the per-request deadline set by request_deadline().
+    """
+
+    def __init__(self, settings: ResilienceConfig):
+        self.settings = settings
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                self.settings.breaker_failures, self.settings.breaker_cooldown
+            )
+        return breaker
+
+    def backoff(self, attempt: int, server_delay: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.settings.backoff_cap, self.settings.backoff_base * 2 ** (attempt - 1)))
+        return max(delay, server_delay) if server_delay is not None else delay
+
+    async def call(self, endpoint: str, request: Callable[[float], Awaitable[T]], timeout: float) -> T:
+        """
+        Run ``request(timeout)`` until it succeeds or is not worth retrying.
+
+        ``timeout`` is the per-attempt timeout in seconds, shortened to what is
+        left of the request deadline.
+        """
+        breaker = self.breaker(endpoint)
+        for attempt in range(1, self.settings.max_attempts + 1):
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                metrics.increment(f"openai.{endpoint}.deadline_exceeded")
+                raise DeadlineExceededError(f"No answer from OpenAI {endpoint} in time")
+            if not breaker.allow():
+                metrics.increment(f"openai.{endpoint}.circuit_open")
+                raise CircuitOpenError(f"OpenAI {endpoint} is temporarily unavailable")
+
+            try:
+                result = await request(timeout if remaining is None else min(timeout, remaining))
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # OpenAI answered, the request itself is at fault
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                metrics.increment(f"openai.{endpoint}.failures")
+                if attempt == self.settings.max_attempts:
+                    raise
+
+                delay = self.backoff(attempt, retry_after(e))
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    metrics.increment(f"openai.{endpoint}.deadline_exceeded")
+                    raise DeadlineExceededError(f"No answer from OpenAI {endpoint} in time") from e
+                logging.warning(f"OpenAI {endpoint} attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+                metrics.increment(f"openai.{endpoint}.retries")
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+
+# Singleton instance to be used across the app
+resilience = Resilience(config.resilience)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from src.config import CacheConfig, config
+from src.database.encryption import MISSING_KEY_MARKER, decrypt_text_async, encrypt_text_async
+from src.database.engine import SQLiteEngine
+from src.utils.metrics import metrics
+
+# OpenAI image URLs expire after about an hour, cached ones must expire first
+IMAGE_URL_TTL = 50 * 60
+
+# Rough per-entry overhead charged against the memory budget
+ENTRY_OVERHEAD = 200
+
+# The SQLite tier is pruned to its row limit once per this many writes
+PRUNE_EVERY = 100
+
+# Memory entries may be text or raw bytes (audio); only text is persisted
+Value = Union[str, bytes]
+
+CREATE_RESPONSES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS CachedResponses (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+
+
+def cache_key(kind: str, *parts: Any) -> str:
+    """Content address of a request: a hash of everything that shapes the answer."""
+    payload = json.dumps([kind, *parts], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return f"{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class ResponseCache:
+    """
+    Exact-match cache of OpenAI answers, shared by all users.
+
+    A memory tier with LRU eviction inside ``max_bytes`` sits in front of an
+    optional SQLite tier that survives restarts. Entries expire after ``ttl``
+    seconds in both tiers. Persisted answers are encrypted like message
+    history and are not persisted at all without an encryption key.
+    """
+
+    def __init__(self, settings: CacheConfig, path: Optional[Path] = None, name: str = "response_cache"):
+        self.settings = settings
+        # Prefix of the hit and miss metrics
+        self.name = name
+        self.max_bytes = settings.response_cache_mb * 1024 * 1024
+        self.total_bytes = 0
+        self.engine = SQLiteEngine(path, config.database) if path is not None else None
+        self._writes_since_prune = 0
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[str, Tuple[float, Value]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    async def open(self) -> None:
+        if self.engine is None:
+            return
+        await self.engine.open()
+        async with self.engine.writer() as db:
+            await db.execute(CREATE_RESPONSES_TABLE_SQL)
+            await self._prune(db)
+
+    async def _prune(self, db) -> None:
+        """Drop expired rows, then the soonest to expire beyond the row limit."""
+        await db.execute("DELETE FROM CachedResponses WHERE expires_at < ?", (int(time.time()),))
+        await db.execute(
+            """
+            DELETE FROM CachedResponses WHERE key IN (
+                SELECT key FROM CachedResponses ORDER BY expires_at
+                LIMIT max(0, (SELECT count(*) FROM CachedResponses) - ?)
+            )
+            """,
+            (self.settings.response_cache_max_rows,),
+        )
+        self._writes_since_prune = 0
+
+    async def close(self) -> None:
+        if self.engine is not None:
+            await self.engine.close()
+
+    async def get(self, key: str) -> Optional[Value]:
+        if not self.enabled:
+            return None
+        kind = key.split(":", 1)[0]
+        value = self._get_memory(key) or await self._get_persistent(key)
+        metrics.increment(f"{self.name}.{kind}.{'hits' if value is not None else 'misses'}")
+        return value
+
+    async def put(self, key: str, value: Value, ttl: Optional[float] = None) -> None:
+        if not self.enabled or not value:
+            return
+        ttl = min(ttl, self.settings.response_cache_ttl) if ttl else self.settings.response_cache_ttl
+        expires_at = time.time() + ttl
+        self._put_memory(key, value, expires_at)
+
+        if self.engine is None or not self.engine.is_open or not isinstance(value, str):
+            return
+        stored = await encrypt_text_async(value)
+        if stored == MISSING_KEY_MARKER:
+            return
+        try:
+            async with self.engine.writer() as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO CachedResponses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, stored, int(expires_at)),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= PRUNE_EVERY:
+                    await self._prune(db)
+        except Exception as e:
+            logging.error(f"Error persisting cached response: {e}")
+
+    def _get_memory(self, key: str) -> Optional[Value]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_memory(self, key: str, value: Value, expires_at: float) -> None:
+        self._remove(key)
+        self._entries[key] = (expires_at, value)
+        self.total_bytes += self._size(key, value)
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= self._size(key, entry[1])
+
+    @staticmethod
+    def _size(key: str, value: Value) -> int:
+        return ENTRY_OVERHEAD + len(key) + len(value)
+
+    async def _get_persistent(self, key: str) -> Optional[str]:
+        if self.engine is None or not self.engine.is_open:
+            return None
+        try:
+            async with self.engine.reader() as db:
+                async with db.execute(
+                    "SELECT value, expires_at FROM CachedResponses WHERE key = ?", (key,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            if row is None or row["expires_at"] < time.time():
+                return None
+            value = await decrypt_text_async(row["value"])
+        except Exception as e:
+            logging.error(f"Error reading cached response: {e}")
+            return None
+        # Promote to the memory tier for the next hit
+        self._put_memory(key, value, row["expires_at"])
+        return value
+
+    def stats(self) -> Dict[str, float]:
+        counters = metrics.counters
+        prefix = f"{self.name}."
+        hits = sum(value for name, value in counters.items() if name.startswith(prefix) and name.endswith(".hits"))
+        misses = sum(value for name, value in counters.items() if name.startswith(prefix) and name.endswith(".misses"))
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+def _persistent_path(settings: CacheConfig) -> Optional[Path]:
+    if not settings.response_cache_persistent:
+        return None
+    if settings.response_cache_path:
+        return Path(settings.response_cache_path)
+    return Path(__file__).parent.parent.parent / "data/response_cache.db"
+
+
+def _media_settings(settings: CacheConfig) -> CacheConfig:
+    """The media cache is a ResponseCache with its own budget, TTL and row limit."""
+    return replace(
+        settings,
+        response_cache_mb=settings.media_cache_mb,
+        response_cache_ttl=settings.media_cache_ttl,
+        response_cache_max_rows=settings.media_cache_max_rows,
+    )
+
+
+def _speech_settings(settings: CacheConfig) -> CacheConfig:
+    return replace(settings, response_cache_mb=settings.speech_cache_mb, response_cache_ttl=settings.speech_cache_ttl)
+
+
+def _media_path(settings: CacheConfig) -> Optional[Path]:
+    if not settings.media_cache_persistent:
+        return None
+    if settings.media_cache_path:
+        return Path(settings.media_cache_path)
+    return Path(__file__).parent.parent.parent / "data/media_cache.db"
+
+
+# Singleton instances to be used across the app
+response_cache = ResponseCache(config.cache, _persistent_path(config.cache))
+
+# Transcripts and image answers by Telegram's file_unique_id, which stays the
+# same for a file however often it is forwarded
+media_cache = ResponseCache(_media_settings(config.cache), _media_path(config.cache), name="media_cache")
+
+# Synthesized speech as raw MP3 bytes, in memory only: audio is large and
+# would crowd the text entries out of the media cache
+speech_cache = ResponseCache(_speech_settings(config.cache), name="speech_cache")
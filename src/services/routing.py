@@ -0,0 +1,213 @@
+"""
+Latency-aware model routing for chat answers.
+
+Each chat model has a time-to-first-token SLO. When the chosen model misses
+it, the request is hedged with the next faster sibling (or moved to it, with
+hedging off); whichever model starts answering first wins and the others are
+cancelled. Answers that are not streamed arrive whole, so only the optional
+completion SLO for the complete answer applies to them. Models whose circuit
+is open are skipped, and a model that fails with an overload or availability
+error hands over to the next one at once.
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.config import RoutingConfig, config
+from src.services.resilience import DeadlineExceededError, ServiceUnavailableError, is_retryable, resilience
+from src.services.scheduler import QueueFullError
+from src.utils.metrics import metrics
+
+# Reply prefixes of the chat models, as the model menu sets them
+MODEL_PREFIXES = {
+    "gpt-5-nano": "5 nano:\n\n",
+    "gpt-4o-mini": "4o mini:\n\n",
+    "gpt-5-mini": "5 mini:\n\n",
+    "gpt-4o": "4o:\n\n",
+    "gpt-5": "GPT-5:\n\n",
+}
+
+# Marks an answer that ended without any text
+_END = object()
+
+
+def model_prefix(model: str) -> str:
+    return MODEL_PREFIXES.get(model, f"{model}:\n\n")
+
+
+def chat_endpoint(model: str) -> str:
+    """Resilience endpoint of a chat model, so each model has its own circuit."""
+    return f"chat.{model}"
+
+
+def parse_fallbacks(spec: str) -> Dict[str, List[str]]:
+    """Parse ``model>fallback>...`` chains separated by commas; each model falls back to those after it."""
+    fallbacks = {}
+    for chain in filter(None, (part.strip() for part in spec.split(","))):
+        models = [model.strip() for model in chain.split(">")]
+        for index, model in enumerate(models):
+            fallbacks.setdefault(model, models[index + 1:])
+    return fallbacks
+
+
+def parse_slos(spec: str) -> Dict[str, float]:
+    """Parse ``model:seconds`` entries separated by commas."""
+    slos = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, seconds = entry.partition(":")
+        slos[model.strip()] = float(seconds)
+    return slos
+
+
+def should_fall_back(error: BaseException) -> bool:
+    """Errors another model may not have; a spent deadline or a bad request is the same everywhere."""
+    if isinstance(error, DeadlineExceededError):
+        return False
+    return isinstance(error, (ServiceUnavailableError, QueueFullError)) or is_retryable(error)
+
+
+def fallback_rates() -> Dict[str, float]:
+    """Share of each chosen model's requests that another model answered."""
+    rates = {}
+    for name, requests in metrics.counters.items():
+        if name.startswith("routing.") and name.endswith(".requests") and requests:
+            model = name[len("routing."):-len(".requests")]
+            rates[model] = metrics.counters.get(f"routing.{model}.fallbacks", 0) / requests
+    return rates
+
+
+class ModelRouter:
+    def __init__(self, settings: RoutingConfig):
+        self.settings = settings
+        self.fallbacks = parse_fallbacks(settings.fallbacks)
+        self.slos = parse_slos(settings.model_slos)
+        self.completion_slos = parse_slos(settings.model_completion_slos)
+
+    def slo(self, model: str) -> float:
+        return self.slos.get(model, self.settings.slo)
+
+    def completion_slo(self, model: str) -> Optional[float]:
+        return self.completion_slos.get(model, self.settings.completion_slo) or None
+
+    def chain(self, model: str) -> List[str]:
+        """The chosen model and its fallbacks, without those failing fast right now."""
+        if not self.settings.enabled:
+            return [model]
+        chain = [model] + self.fallbacks.get(model, [])
+        available = [candidate for candidate in chain if not resilience.breaker(chat_endpoint(candidate)).refusing]
+        # With every circuit open, let the chosen model report it
+        return available or [model]
+
+    async def stream(
+        self,
+        model: str,
+        open_stream: Callable[[str], AsyncIterator[str]],
+        slo: Optional[Callable[[str], Optional[float]]] = None,
+    ) -> Tuple[str, AsyncIterator[str]]:
+        """
+        Race ``open_stream(candidate)`` along ``model``'s fallback chain.
+
+        Returns once a model produced its first delta, with that model and
+        an iterator over its whole answer. ``slo`` gives each model's
+        seconds to the first delta, None to wait for it however long.
+        """
+        slo = slo or self.slo
+        chain = self.chain(model)
+        metrics.increment(f"routing.{model}.requests")
+        racers: Dict[asyncio.Future, Tuple[str, AsyncIterator[str]]] = {}
+        launched = 0
+        error: Optional[BaseException] = None
+        winner = None
+
+        def launch():
+            nonlocal launched
+            candidate = chain[launched]
+            launched += 1
+            deltas = open_stream(candidate)
+            racers[asyncio.ensure_future(self._first(deltas))] = (candidate, deltas)
+
+        launch()
+        try:
+            while winner is None:
+                if not racers:
+                    if launched == len(chain):
+                        raise error
+                    launch()
+                    continue
+
+                newest = chain[launched - 1]
+                timeout = slo(newest) if launched < len(chain) else None
+                done, _ = await asyncio.wait(racers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.increment(f"routing.{newest}.slo_exceeded")
+                    if not self.settings.hedge:
+                        await self._close(racers)
+                    launch()
+                    continue
+
+                # Several may finish together, the earliest in the chain wins
+                for task in sorted(done, key=lambda task: chain.index(racers[task][0])):
+                    candidate, deltas = racers.pop(task)
+                    if task.exception() is None and winner is None:
+                        winner = candidate, deltas, task.result()
+                    elif task.exception() is None:
+                        await deltas.aclose()
+                    else:
+                        metrics.increment(f"routing.{candidate}.failed")
+                        if not should_fall_back(task.exception()):
+                            raise task.exception()
+                        error = error or task.exception()
+        except BaseException:
+            if winner is not None:
+                await winner[1].aclose()
+            raise
+        finally:
+            await self._close(racers)
+
+        candidate, deltas, first = winner
+        if candidate != model:
+            metrics.increment(f"routing.{model}.fallbacks")
+        return candidate, self._resume(first, deltas)
+
+    async def complete(self, model: str, call: Callable[[str], Awaitable[str]]) -> Tuple[str, str]:
+        """
+        Same as stream(), for calls that return the whole answer at once.
+
+        Only the completion SLO hedges these; without one, other models take
+        over only when the chosen one fails.
+        """
+        async def single(candidate: str) -> AsyncIterator[str]:
+            yield await call(candidate)
+
+        answered, deltas = await self.stream(model, single, self.completion_slo)
+        return answered, "".join([delta async for delta in deltas])
+
+    @staticmethod
+    async def _first(deltas: AsyncIterator[str]):
+        try:
+            return await deltas.__anext__()
+        except StopAsyncIteration:
+            return _END
+
+    @staticmethod
+    async def _resume(first, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        try:
+            if first is _END:
+                return
+            yield first
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+    @staticmethod
+    async def _close(racers: Dict[asyncio.Future, Tuple[str, AsyncIterator[str]]]) -> None:
+        """Cancel the racing models and release what they hold."""
+        for task in racers:
+            task.cancel()
+        await asyncio.gather(*racers, return_exceptions=True)
+        for _, deltas in racers.values():
+            await deltas.aclose()
+        racers.clear()
+
+
+model_router = ModelRouter(config.routing)
@@ -0,0 +1,202 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.config import SchedulerConfig, config
+
+# Called with the 1-based queue position when a request has to wait
+QueueCallback = Callable[[int], Awaitable[None]]
+
+# Window of the tokens-per-minute budget, in seconds
+TPM_WINDOW = 60.0
+
+
+class Priority(IntEnum):
+    """Lower values are served first."""
+
+    OWNER = 0
+    TEXT = 1
+    MEDIA = 2
+
+
+class QueueFullError(Exception):
+    """Raised when a request is shed because the model's wait queue is full."""
+
+
+@dataclass
+class ModelLimits:
+    concurrency: int
+    tokens_per_minute: int = 0  # 0 disables the token budget
+
+
+@dataclass
+class Ticket:
+    """
+    A request's claim on a model.
+
+    ``tokens`` starts as the caller's estimate; set it to the real usage once
+    known so the token budget charges what was actually spent.
+    """
+
+    priority: Priority
+    tokens: int
+    _admitted: asyncio.Future = field(default=None, repr=False)
+
+
+def parse_model_limits(spec: str) -> Dict[str, ModelLimits]:
+    """Parse ``model:concurrency[:tokens_per_minute]`` entries separated by commas."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, rest = entry.partition(":")
+        values = [int(value) for value in rest.split(":")]
+        limits[model.strip()] = ModelLimits(*values)
+    return limits
+
+
+class ModelQueue:
+    """Concurrency slots and token budget of one model, with a priority wait queue."""
+
+    def __init__(self, limits: ModelLimits, queue_size: int):
+        self.limits = limits
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiting: List[Tuple[int, int, Ticket]] = []
+        self._order = itertools.count()
+        self._spent: Deque[Tuple[float, Ticket]] = deque()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def _tokens_in_window(self, now: float) -> int:
+        while self._spent and now - self._spent[0][0] >= TPM_WINDOW:
+            self._spent.popleft()
+        return sum(ticket.tokens for _, ticket in self._spent)
+
+    def _can_admit(self, ticket: Ticket, now: float) -> bool:
+        if self.active >= self.limits.concurrency:
+            return False
+        budget = self.limits.tokens_per_minute
+        if not budget or not ticket.tokens:
+            return True
+        spent = self._tokens_in_window(now)
+        # A request larger than the whole budget still runs once the window is empty
+        return spent == 0 or spent + ticket.tokens <= budget
+
+    def _admit(self, ticket: Ticket, now: float) -> None:
+        self.active += 1
+        # Spends are only needed for the token budget, and only it prunes them
+        if self.limits.tokens_per_minute:
+            self._spent.append((now, ticket))
+
+    def _dispatch(self) -> None:
+        """Admit waiters from the head of the queue while limits allow."""
+        self._wakeup = None
+        now = time.monotonic()
+        while self._waiting:
+            ticket = self._waiting[0][2]
+            if not self._can_admit(ticket, now):
+                break
+            heapq.heappop(self._waiting)
+            self._admit(ticket, now)
+            ticket._admitted.set_result(None)
+
+        if self._waiting and self.active < self.limits.concurrency and self._spent:
+            # Blocked by the token budget: retry when the oldest spend leaves the window
+            delay = max(0.0, self._spent[0][0] + TPM_WINDOW - now)
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, ticket: Ticket, on_queued: Optional[QueueCallback]) -> None:
+        now = time.monotonic()
+        if not self._waiting and self._can_admit(ticket, now):
+            self._admit(ticket, now)
+            return
+
+        if len(self._waiting) >= self.queue_size:
+            raise QueueFullError("Too many requests are waiting, please try again in a minute.")
+
+        ticket._admitted = asyncio.get_running_loop().create_future()
+        entry = (ticket.priority, next(self._order), ticket)
+        heapq.heappush(self._waiting, entry)
+        position = sorted(self._waiting).index(entry) + 1
+        if self._wakeup is None:
+            self._dispatch()
+        try:
+            if on_queued is not None and not ticket._admitted.done():
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    logging.error(f"Error reporting queue position: {e}")
+            await ticket._admitted
+        except asyncio.CancelledError:
+            if ticket._admitted.done() and not ticket._admitted.cancelled():
+                # Admitted just as the caller gave up, hand the slot on
+                self.release()
+            else:
+                ticket._admitted.cancel()
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._dispatch()
+
+
+class RequestScheduler:
+    """
+    Bounds concurrent OpenAI calls per model.
+
+    Each model gets a number of concurrent slots and an optional
+    tokens-per-minute budget. Requests over those limits wait in a bounded
+    queue ordered by priority, then arrival; when the queue is full new
+    requests are shed with QueueFullError instead of piling up on OpenAI.
+    """
+
+    def __init__(self, settings: SchedulerConfig):
+        self.settings = settings
+        self.model_limits = parse_model_limits(settings.model_limits)
+        self.queues: Dict[str, ModelQueue] = {}
+
+    def _queue(self, model: str) -> ModelQueue:
+        queue = self.queues.get(model)
+        if queue is None:
+            limits = self.model_limits.get(
+                model, ModelLimits(self.settings.concurrency, self.settings.tokens_per_minute)
+            )
+            queue = self.queues[model] = ModelQueue(limits, self.settings.queue_size)
+        return queue
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        priority: Priority,
+        tokens: int = 0,
+        on_queued: Optional[QueueCallback] = None,
+    ) -> AsyncIterator[Ticket]:
+        """Wait for a slot on ``model`` and hold it for the duration of the block."""
+        queue = self._queue(model)
+        ticket = Ticket(priority, tokens)
+        await queue.acquire(ticket, on_queued)
+        try:
+            yield ticket
+        finally:
+            queue.release()
+
+
+def priority_for(user_id: Optional[int], default: Priority) -> Priority:
+    """The owner's requests go first, everyone else gets the request type's class."""
+    if user_id is not None and user_id == config.telegram.owner_id:
+        return Priority.OWNER
+    return default
+
+
+# Singleton instance to be used across the app
+scheduler = RequestScheduler(config.scheduler)
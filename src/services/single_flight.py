@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from src.utils.metrics import metrics
+
+
+def normalize_prompt(text: str) -> str:
+    """Prompt as compared for duplicates: case and whitespace do not matter."""
+    return " ".join(text.split()).casefold()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers asking for the same key.
+
+    The first caller starts the call, callers arriving while it runs wait for
+    the same result (or exception). The call is cancelled only once every
+    caller waiting for it was cancelled. Finished calls are forgotten, storing
+    results is the response cache's job.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``, ``shared`` is True if another caller started the call."""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            metrics.increment(f"single_flight.{self.name}.shared")
+        else:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,115 @@
+"""
+Spoken versions of answers, synthesized while the text is delivered.
+
+The answer is cut at sentence ends into chunks that are synthesized as soon
+as each is complete, a few at a time ([Voice] speech_concurrency), so audio
+for a streamed answer is mostly ready when its text is. Chunks are cut from
+the text alone, never from how it arrived, so a repeated answer produces the
+same chunks and their audio comes from the speech cache.
+"""
+import asyncio
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from src.config import config
+from src.services.openai_service import OpenAIService
+from src.services.resilience import clear_deadline
+from src.services.response_cache import cache_key, speech_cache
+from src.utils.metrics import metrics
+
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "nova"
+
+# Characters a chunk collects before it ends at the next sentence end
+CHUNK_CHARS = 500
+
+# Input limit of the speech endpoint
+MAX_CHUNK_CHARS = 4096
+
+# Sentence end: punctuation, closing quotes or brackets, then whitespace
+SENTENCE_END = re.compile(r"[.!?…][\"')\]»]*\s")
+
+
+def split_sentences(text: str, target: int = CHUNK_CHARS, limit: int = MAX_CHUNK_CHARS) -> Tuple[List[str], str]:
+    """
+    Cut complete chunks off ``text``: each ends at the first sentence end
+    after ``target`` characters, or at a space if none comes within
+    ``limit``. Returns the chunks and the text left over.
+    """
+    chunks = []
+    start = 0
+    while True:
+        match = SENTENCE_END.search(text, start + target)
+        if match and match.end() - start <= limit:
+            end = match.end()
+        elif len(text) - start > limit:
+            end = text.rfind(" ", start, start + limit) + 1 or start + limit
+        else:
+            break
+        chunks.append(text[start:end].strip())
+        start = end
+    return [chunk for chunk in chunks if chunk], text[start:]
+
+
+async def synthesize(text: str, user_id: Optional[int] = None, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> bytes:
+    """MP3 audio of ``text``, from the speech cache when it was spoken before."""
+    key = cache_key("speech", text, voice, model)
+    cached = await speech_cache.get(key)
+    if cached is not None:
+        return cached
+    audio = await OpenAIService.text_to_speech(text, user_id=user_id, voice=voice, model=model)
+    await speech_cache.put(key, audio)
+    return audio
+
+
+class SpeechAnswer:
+    """
+    Collects an answer's text and synthesizes each complete chunk right away.
+
+    A chunk that fails is left out of the audio, the others are still sent.
+    """
+
+    def __init__(self, user_id: Optional[int] = None, voice: str = TTS_VOICE, model: str = TTS_MODEL):
+        self.user_id = user_id
+        self.voice = voice
+        self.model = model
+        self._rest = ""
+        self._parts: List[asyncio.Task] = []
+        # Keeps a long answer from filling the scheduler queue on its own
+        self._limit = asyncio.Semaphore(config.voice.speech_concurrency)
+
+    def feed(self, text: str) -> None:
+        chunks, self._rest = split_sentences(self._rest + text)
+        for chunk in chunks:
+            self._start(chunk)
+
+    async def finish(self) -> bytes:
+        """The answer's audio, its MP3 chunks joined in order; empty when none could be synthesized."""
+        if self._rest.strip():
+            self._start(self._rest.strip())
+        self._rest = ""
+        try:
+            parts = await asyncio.gather(*self._parts)
+        except BaseException:
+            self.cancel()
+            raise
+        return b"".join(parts)
+
+    def cancel(self) -> None:
+        for task in self._parts:
+            task.cancel()
+
+    def _start(self, chunk: str) -> None:
+        self._parts.append(asyncio.ensure_future(self._synthesize(chunk)))
+
+    async def _synthesize(self, chunk: str) -> bytes:
+        # Audio may take longer than the text answer's deadline allows
+        clear_deadline()
+        async with self._limit:
+            try:
+                return await synthesize(chunk, self.user_id, self.voice, self.model)
+            except Exception as e:
+                logging.error(f"Error synthesizing part of a voice answer: {e}")
+                metrics.increment("speech.failed_chunks")
+                return b""
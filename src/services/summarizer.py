@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Dict
+
+from src.config import SummaryConfig, config
+from src.database.entities import UserData
+from src.database.storage import get_or_create_user_data, save_user_data
+from src.services.openai_service import OpenAIService
+from src.services.resilience import clear_deadline
+from src.services.scheduler import Priority
+from src.utils.metrics import metrics
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a conversation between a user and an assistant. "
+    "Summarize the conversation you are given, merged with the previous summary if there is one. "
+    "Keep facts about the user, their goals and preferences, decisions made, open questions "
+    "and anything the assistant promised to do. Be concise and write in the language of the "
+    "conversation. Reply with the summary only."
+)
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+# Running compactions by user, at most one per user
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def summary_message(user_data: UserData):
+    """The pinned system entry sent before the active window, or None."""
+    summary = user_data.active_summary
+    if not summary:
+        return None
+    return {"role": "system", "content": SUMMARY_HEADER + summary}
+
+
+def compaction_split(user_data: UserData, settings: SummaryConfig) -> int:
+    """
+    How many of the oldest messages to fold into the summary; 0 while the
+    active history is below the threshold.
+
+    The newest ``keep_recent_tokens`` stay verbatim, and only messages that
+    are already stored can be compacted.
+    """
+    messages = user_data.messages
+    ledger = user_data.token_ledger
+    ledger.sync(messages)
+    if ledger.tokens_since(0) < settings.threshold_tokens:
+        return 0
+    if messages is not user_data._synced_messages:
+        return 0
+    return min(ledger.window_start(messages, settings.keep_recent_tokens), user_data._synced_count)
+
+
+def schedule_compaction(user_id: int, user_data: UserData) -> None:
+    """Summarize older turns in the background once the history grew past the threshold."""
+    if not config.summary.enabled or user_id in _tasks:
+        return
+    if compaction_split(user_data, config.summary) == 0:
+        return
+    task = asyncio.create_task(_compact(user_id, user_data))
+    _tasks[user_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(user_id, None))
+
+
+async def _compact(user_id: int, user_data: UserData) -> None:
+    # Started inside the user's request, but not bound by its deadline
+    clear_deadline()
+    messages = user_data.messages
+    count = compaction_split(user_data, config.summary)
+    if not count:
+        return
+    older = messages[:count]
+    previous = user_data.active_summary
+
+    transcript = "\n\n".join(f"{message['role']}: {message['content']}" for message in older)
+    prompt = f"Previous summary:\n{previous}\n\n" if previous else ""
+    prompt += f"Conversation:\n{transcript}"
+    try:
+        if config.summary.deferred:
+            summary = await OpenAIService.chat_completion_deferred(
+                model=config.summary.model,
+                messages=[{"role": "user", "content": prompt}],
+                system_message=SUMMARY_PROMPT,
+            )
+        else:
+            summary = await OpenAIService.chat_completion(
+                model=config.summary.model,
+                messages=[{"role": "user", "content": prompt}],
+                system_message=SUMMARY_PROMPT,
+                priority=Priority.MEDIA,
+                use_cache=False,
+            )
+    except Exception as e:
+        logging.error(f"Error summarizing history of user {user_id}: {e}")
+        return
+    if not summary or not summary.strip():
+        return
+
+    # The user may have cleared the context or been reloaded meanwhile
+    current = await get_or_create_user_data(user_id)
+    if (
+        current is not user_data
+        or user_data.messages is not messages
+        or any(a is not b for a, b in zip(messages[:count], older))
+        or count > user_data._synced_count
+    ):
+        return
+
+    user_data.compact_history(count, summary.strip())
+    metrics.increment("summary.compactions")
+    await save_user_data(user_id)
+
+
+async def cancel_compactions() -> None:
+    """Stop running compactions; they start over on the next turn."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
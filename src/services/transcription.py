@@ -0,0 +1,158 @@
+"""
+Transcription of long voice notes in parallel pieces.
+
+A note longer than ``[Voice] chunk_threshold`` seconds is cut in the middle
+of detected silences into segments of about ``segment_seconds``, each
+starting ``segment_overlap`` seconds early so no word is lost at a cut. The
+segments are transcribed concurrently and their texts joined in order,
+dropping the words the overlap transcribed twice. Latency then follows the
+segment length instead of the note's duration.
+"""
+import asyncio
+import logging
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from src.config import config
+from src.services.openai_service import OpenAIService
+from src.services.scheduler import QueueCallback
+from src.utils.audio import AudioProcessingError, VOICE_FILENAME, detect_silences, extract_segment, transcode
+from src.utils.metrics import metrics
+
+# Longest run of letters and digits an overlap is expected to transcribe
+# twice (about 8 words); a single repeated character is taken for chance
+MAX_OVERLAP_CHARS = 60
+MIN_OVERLAP_CHARS = 2
+
+# Scripts written without spaces between words: Thai, CJK punctuation, kana,
+# CJK ideographs and full-width forms
+UNSPACED = re.compile(r"[\u0e00-\u0e7f\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# Punctuation that follows a word without a space
+CLOSING_PUNCTUATION = ",.;:!?…"
+
+
+def plan_segments(
+    duration: float,
+    silences: Sequence[Tuple[float, float]],
+    length: float,
+    overlap: float,
+) -> List[Tuple[float, float]]:
+    """
+    Split ``0..duration`` seconds into ``(start, end)`` segments of about
+    ``length`` seconds, at most one and a half times that.
+
+    Each cut goes in the middle of the silence closest to the target length,
+    or falls at the target itself without a silence nearby. Every segment but
+    the first starts ``overlap`` seconds before the previous one ended.
+    """
+    longest = length * 1.5
+    pauses = sorted((start + end) / 2 for start, end in silences)
+    cuts = []
+    start = 0.0
+    while duration - start > longest:
+        candidates = [pause for pause in pauses if start + length / 2 <= pause <= start + longest]
+        cut = min(candidates, key=lambda pause: abs(pause - start - length)) if candidates else start + length
+        cuts.append(cut)
+        start = cut
+
+    bounds = [0.0, *cuts, float(duration)]
+    return [(max(0.0, begin - overlap) if index else begin, end)
+            for index, (begin, end) in enumerate(zip(bounds, bounds[1:]))]
+
+
+def _boundary(text: str, index: int) -> bool:
+    """Whether a word may start or end at ``index`` of ``text``."""
+    if index <= 0 or index >= len(text):
+        return True
+    before, after = text[index - 1], text[index]
+    return not (before.isalnum() and after.isalnum()) or bool(UNSPACED.match(before) or UNSPACED.match(after))
+
+
+def _overlap(text: str, following: str) -> int:
+    """
+    Where ``following`` continues after the words it repeats from the end
+    of ``text``; 0 without an overlap.
+
+    Letters and digits are compared one by one, case-insensitively, so
+    punctuation, spacing and scripts without spaces do not hide an overlap.
+    """
+    tail = []
+    for index in range(len(text) - 1, -1, -1):
+        if len(tail) == MAX_OVERLAP_CHARS:
+            break
+        if text[index].isalnum():
+            tail.append((index, text[index].casefold()))
+    tail.reverse()
+    head = [(index, char.casefold()) for index, char in enumerate(following) if char.isalnum()][:MAX_OVERLAP_CHARS]
+
+    for size in range(min(len(tail), len(head)), MIN_OVERLAP_CHARS - 1, -1):
+        if [char for _, char in tail[-size:]] != [char for _, char in head[:size]]:
+            continue
+        start, end = tail[-size][0], head[size - 1][0] + 1
+        if _boundary(text, start) and _boundary(following, end):
+            return end
+    return 0
+
+
+def stitch(texts: Sequence[str]) -> str:
+    """Join segment transcripts, dropping the start of a segment that repeats the end of the previous one."""
+    result = ""
+    for text in texts:
+        following = text.strip()
+        cut = _overlap(result, following)
+        if cut:
+            following = following[cut:].lstrip()
+            # Punctuation after the repeated words, when the previous segment already has it
+            if result and not result[-1].isalnum():
+                following = re.sub(r"^[^\w\s]*\s*", "", following)
+        if not following:
+            continue
+        spaced = not (UNSPACED.match(result[-1:]) and UNSPACED.match(following[0]))
+        if result and spaced and following[0] not in CLOSING_PUNCTUATION:
+            result += " "
+        result += following
+    return result
+
+
+async def transcribe_audio(
+    audio: bytes,
+    duration: float,
+    user_id: Optional[int] = None,
+    on_queued: Optional[QueueCallback] = None,
+) -> str:
+    """Transcribe an OGG/Opus voice note, in concurrent segments when it is long."""
+    settings = config.voice
+    audio_format = settings.transcode_format if settings.transcode else None
+    filename = f"voice.{audio_format}" if audio_format else VOICE_FILENAME
+
+    segments = None
+    if settings.chunk_threshold and duration > settings.chunk_threshold:
+        try:
+            silences = await detect_silences(audio, settings.silence_noise, settings.silence_duration)
+            segments = plan_segments(duration, silences, settings.segment_seconds, settings.segment_overlap)
+        except AudioProcessingError as e:
+            logging.error(f"Error detecting silences, transcribing in one piece: {e}")
+
+    if not segments or len(segments) == 1:
+        if audio_format:
+            audio = await transcode(audio, audio_format)
+        return await OpenAIService.speech_to_text(audio, filename, user_id=user_id, on_queued=on_queued)
+
+    limit = asyncio.Semaphore(settings.segment_concurrency)
+
+    async def transcribe_segment(start: float, end: float) -> str:
+        async with limit:
+            piece = await extract_segment(audio, start, end, audio_format)
+            return await OpenAIService.speech_to_text(piece, filename, user_id=user_id, on_queued=on_queued)
+
+    tasks = [asyncio.ensure_future(transcribe_segment(start, end)) for start, end in segments]
+    try:
+        texts = await asyncio.gather(*tasks)
+    finally:
+        # One failed segment fails the note, the others need not finish
+        for task in tasks:
+            task.cancel()
+    metrics.increment("transcription.chunked")
+    metrics.increment("transcription.segments", len(segments))
+    return stitch(texts)
@@ -0,0 +1,93 @@
+import asyncio
+import re
+import shutil
+from typing import List, Optional, Tuple
+
+from src.config import config
+
+# Whisper accepts Telegram's OGG/Opus voice notes as they are
+VOICE_FILENAME = "voice.ogg"
+
+# silencedetect's log lines, e.g. "silence_end: 12.84 | silence_duration: 0.61"
+SILENCE_RE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+
+# At most this many ffmpeg processes run at once, shared by all users
+_ffmpeg_slots: Optional[asyncio.Semaphore] = None
+
+
+class AudioProcessingError(Exception):
+    """ffmpeg is missing or could not process the audio."""
+
+
+def _slots() -> asyncio.Semaphore:
+    global _ffmpeg_slots
+    if _ffmpeg_slots is None:
+        _ffmpeg_slots = asyncio.Semaphore(config.voice.ffmpeg_processes)
+    return _ffmpeg_slots
+
+
+async def _ffmpeg(args: List[str], data: bytes, loglevel: str = "error") -> Tuple[bytes, str]:
+    executable = shutil.which(config.voice.ffmpeg_path)
+    if executable is None:
+        raise AudioProcessingError(f"ffmpeg not found: {config.voice.ffmpeg_path}")
+
+    async with _slots():
+        process = await asyncio.create_subprocess_exec(
+            executable, "-hide_banner", "-loglevel", loglevel, "-i", "pipe:0", *args, "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            output, log = await process.communicate(data)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+    log = log.decode(errors="replace")
+    if process.returncode != 0:
+        raise AudioProcessingError(f"ffmpeg failed: {log.strip()}")
+    return output, log
+
+
+async def run_ffmpeg(args: List[str], data: bytes) -> bytes:
+    """
+    Run ffmpeg on ``data`` piped through stdin and return its stdout.
+
+    ``args`` go between the input and output options, e.g. ``["-f", "mp3"]``.
+    Nothing touches the disk, and the shared slots bound how many transcodes
+    compete for CPU.
+    """
+    output, _ = await _ffmpeg(args, data)
+    return output
+
+
+async def transcode(data: bytes, audio_format: str) -> bytes:
+    """Convert audio to ``audio_format`` (e.g. mp3) in memory."""
+    return await run_ffmpeg(["-vn", "-f", audio_format], data)
+
+
+def parse_silences(log: str) -> List[Tuple[float, float]]:
+    """``(start, end)`` of each silence ffmpeg's silencedetect reported; one still open at the end is dropped."""
+    silences = []
+    start = None
+    for kind, value in SILENCE_RE.findall(log):
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+async def detect_silences(data: bytes, noise: str, min_duration: float) -> List[Tuple[float, float]]:
+    _, log = await _ffmpeg(
+        ["-af", f"silencedetect=noise={noise}:d={min_duration}", "-f", "null"], data, loglevel="info"
+    )
+    return parse_silences(log)
+
+
+async def extract_segment(data: bytes, start: float, end: float, audio_format: Optional[str] = None) -> bytes:
+    """Cut ``start``..``end`` seconds out of OGG audio, copied as is or encoded to ``audio_format``."""
+    codec = ["-f", audio_format] if audio_format else ["-c:a", "copy", "-f", "ogg"]
+    return await run_ffmpeg(["-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-vn", *codec], data)
@@ -1,12 +1,14 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
-
 from aiogram import Bot, types
-from pydub import AudioSegment
 
 from src.database.storage import get_or_create_user_data
-from src.services.openai_service import OpenAIService
+from src.services.response_cache import cache_key, media_cache
+from src.services.single_flight import SingleFlight
+from src.services.transcription import transcribe_audio
+from src.utils.texts import queue_position_message
+from src.utils.tokens import MESSAGE_OVERHEAD, TokenLedger, truncate_to_tokens
+
+# Transcriptions in flight, by the voice file's unique id
+voice_flights = SingleFlight("voice")
 
 async def info_menu_func(user_id):
     user_data = await get_or_create_user_data(user_id)
@@ -26,50 +28,51 @@ async def info_menu_func(user_id):
     return info_menu
 
 
-async def prune_messages(messages, max_chars):
-    pruned_messages = []
-    total_chars = 0
+async def prune_messages(messages, max_tokens, ledger: TokenLedger):
+    # Token counts are kept in the ledger, only new messages get counted
+    start = ledger.window_start(messages, max_tokens)
+    pruned_messages = messages[start:]
 
-    for message in reversed(messages):
-        content_length = len(message["content"])
-        remaining_chars = max_chars - total_chars
+    # The newest message that does not fit whole is cut down to the remaining budget
+    remaining_tokens = max_tokens - ledger.tokens_since(start) - MESSAGE_OVERHEAD
+    if start > 0 and remaining_tokens > 0:
+        message = messages[start - 1]
+        pruned_content = truncate_to_tokens(message["content"], remaining_tokens)
+        pruned_messages.insert(0, {"role": message["role"], "content": pruned_content})
 
-        if remaining_chars <= 0:
-            break
+    return pruned_messages
 
-        if content_length > remaining_chars:
-            pruned_content = message["content"][:remaining_chars]
-            pruned_messages.append({"role": message["role"], "content": pruned_content})
-            break
 
-        pruned_messages.append(message)
-        total_chars += content_length
+def queue_notice(bot: Bot, chat_id: int, message_id: int):
+    """Callback for OpenAIService calls that shows the queue position in the placeholder message."""
+    async def notify(position: int):
+        await bot.edit_message_text(
+            queue_position_message.format(position=position), chat_id=chat_id, message_id=message_id
+        )
+    return notify
 
-    return list(reversed(pruned_messages))
 
+async def process_voice_message(bot: Bot, message: types.Message, user_id: int, on_queued=None):
+    # A forwarded voice note keeps its file_unique_id, a cached transcript skips the download
+    key = cache_key("transcript", message.voice.file_unique_id)
+    cached = await media_cache.get(key)
+    if cached is not None:
+        return cached
 
-async def process_voice_message(bot: Bot, message: types.Message, user_id: int):
-    # Obtaining the ID of the voice message file
-    file_id = message.voice.file_id
-    file_info = await bot.get_file(file_id)
-    ogg_path = Path(__file__).parent.parent.parent / f"data/voice/voice_{user_id}.ogg"
-    mp3_path = Path(__file__).parent.parent.parent / f"data/voice/voice_{user_id}.mp3"
-    
-    # Ensure directory exists
-    ogg_path.parent.mkdir(parents=True, exist_ok=True)
+    # The same voice file (e.g. forwarded to several users) is transcribed once
+    text, shared = await voice_flights.run(
+        message.voice.file_unique_id,
+        lambda: transcribe_voice_message(bot, message, user_id, on_queued),
+    )
+    if not shared:
+        await media_cache.put(key, text)
+    return text
 
-    # Downloading the file
-    await bot.download_file(file_info.file_path, ogg_path)
 
-    # Audio conversion in a separate thread
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as pool:
-        await loop.run_in_executor(
-            pool,
-            lambda: AudioSegment.from_ogg(ogg_path).export(mp3_path, format="mp3"),
-        )
-    
-    return await OpenAIService.speech_to_text(mp3_path)
+async def transcribe_voice_message(bot: Bot, message: types.Message, user_id: int, on_queued=None):
+    # Downloaded into memory, so concurrent voice notes never share a file
+    audio = (await bot.download(message.voice)).getvalue()
+    return await transcribe_audio(audio, message.voice.duration, user_id=user_id, on_queued=on_queued)
 
 
 async def simple_bot_responses(user_prompt):
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import importlib.util
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+from src.config import VisionConfig, config
+from src.utils.metrics import metrics
+
+# Telegram re-encodes every photo as JPEG
+PHOTO_MIME = "image/jpeg"
+
+# Shrinking and encoding run here, off the event loop
+_workers: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _workers
+    if _workers is None:
+        _workers = ThreadPoolExecutor(max_workers=config.vision.image_workers, thread_name_prefix="images")
+    return _workers
+
+
+def close_image_workers() -> None:
+    global _workers
+    if _workers is not None:
+        _workers.shutdown(wait=False)
+        _workers = None
+
+
+@lru_cache(maxsize=1)
+def _pillow():
+    # Pillow is in requirements.txt; if it cannot load, photos are sent at the size Telegram has
+    if importlib.util.find_spec("PIL") is None:
+        return None
+    try:
+        from PIL import Image
+        return Image
+    except Exception as e:
+        logging.warning(f"Pillow unavailable, photos are not downscaled: {e}")
+        return None
+
+
+def target_size(width: int, height: int, detail: str, settings: VisionConfig) -> Tuple[int, int]:
+    """
+    Size the vision model looks at an image of ``width`` x ``height`` in.
+
+    Low detail fits the image in ``low_side`` pixels square. High detail (and
+    auto, which picks it for any photo worth scaling) fits it in ``max_side``
+    square, then shrinks its shortest side to ``high_side``. Images are only
+    ever scaled down.
+    """
+    longest, shortest = max(width, height), min(width, height)
+    if detail == "low":
+        scale = min(1.0, settings.low_side / longest)
+    else:
+        scale = min(1.0, settings.max_side / longest, settings.high_side / shortest)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def choose_photo(sizes: Sequence, detail: str, settings: VisionConfig):
+    """The smallest of Telegram's sizes of a photo that still covers the model's target size."""
+    largest = max(sizes, key=lambda size: size.width * size.height)
+    width, height = target_size(largest.width, largest.height, detail, settings)
+    covering = [size for size in sizes if size.width >= width and size.height >= height]
+    return min(covering, key=lambda size: size.width * size.height)
+
+
+def encode_photo(data: bytes, width: int, height: int, detail: str, settings: VisionConfig) -> str:
+    """Data URL of a JPEG photo, shrunk to the model's target size when that makes it smaller."""
+    image_module = _pillow()
+    target = target_size(width, height, detail, settings)
+    if settings.downscale and image_module is not None and target != (width, height):
+        try:
+            with image_module.open(io.BytesIO(data)) as image:
+                resized = image.convert("RGB").resize(target, image_module.LANCZOS)
+            output = io.BytesIO()
+            resized.save(output, format="JPEG", quality=settings.jpeg_quality, optimize=True)
+            if output.tell() < len(data):
+                data = output.getvalue()
+                metrics.increment("vision.downscaled")
+        except Exception as e:
+            logging.error(f"Error downscaling photo, sending it as is: {e}")
+    return f"data:{PHOTO_MIME};base64,{base64.b64encode(data).decode()}"
+
+
+async def load_photo(bot, sizes: Sequence, detail: Optional[str] = None) -> str:
+    """
+    Download the right size of a Telegram photo into memory and return it
+    as a data URL for the vision model.
+
+    The download goes through the bot's own session; shrinking and base64
+    encoding run in the worker pool.
+    """
+    settings = config.vision
+    detail = detail or settings.detail
+    photo = choose_photo(sizes, detail, settings)
+    data = (await bot.download(photo)).getvalue()
+    url = await asyncio.get_running_loop().run_in_executor(
+        _pool(), encode_photo, data, photo.width, photo.height, detail, settings
+    )
+    metrics.increment("vision.photo_bytes", len(data))
+    return url
@@ -0,0 +1,53 @@
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+# Samples kept per timing metric for the percentiles in snapshot()
+WINDOW_SIZE = 1000
+
+
+class Metrics:
+    """
+    In-process counters and timings.
+
+    Timings keep a sliding window of recent samples so snapshot() can report
+    percentiles without unbounded memory.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        result = {name: {"count": count} for name, count in sorted(self.counters.items())}
+        for name, samples in sorted(self.timings.items()):
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            result[name] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max": ordered[-1],
+            }
+        return result
+
+    def format(self) -> str:
+        """Human readable snapshot, one metric per line."""
+        lines = []
+        for name, values in self.snapshot().items():
+            parts = ", ".join(
+                f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in values.items()
+            )
+            lines.append(f"{name}: {parts}")
+        return "\n".join(lines) or "No metrics recorded yet"
+
+
+# Singleton instance to be used across the app
+metrics = Metrics()
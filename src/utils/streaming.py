@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.utils.formatting import Text, Bold
+
+# Telegram rejects messages longer than this
+MESSAGE_LIMIT = 4096
+
+
+def split_point(text: str, limit: int = MESSAGE_LIMIT) -> int:
+    """Where to cut ``text`` so the first part fits: the last line break, else the limit."""
+    if len(text) <= limit:
+        return len(text)
+    cut = text.rfind("\n", 0, limit)
+    return cut + 1 if cut > limit // 2 else limit
+
+
+class StreamingReply:
+    """
+    Shows a streamed answer by editing a placeholder message in place.
+
+    Edits are throttled to one per ``interval`` seconds, Telegram allows
+    roughly one edit per second in a chat. Text past MESSAGE_LIMIT continues
+    in a new message. While streaming the text is shown plain, since partial
+    Markdown does not parse; finish() applies the final formatting.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, prefix: str, interval: float):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.prefix = prefix
+        self.interval = interval
+        self.text = ""
+        self.message_ids: List[int] = [message_id]
+        # Offset in self.text where the current (last) message starts
+        self._chunk_start = 0
+        self._shown = ""
+        self._next_edit = 0.0
+
+    @property
+    def _body(self) -> str:
+        current = self.text[self._chunk_start:]
+        return self.prefix + current if len(self.message_ids) == 1 else current
+
+    async def append(self, delta: str) -> None:
+        self.text += delta
+        if time.monotonic() >= self._next_edit:
+            await self._refresh()
+
+    async def _refresh(self, wait: bool = False) -> None:
+        body = self._body
+        while len(body) > MESSAGE_LIMIT:
+            cut = split_point(body)
+            # A full message is never edited again, so this edit must not be skipped
+            await self._edit(body[:cut], wait=True)
+            prefix_length = len(body) - len(self.text) + self._chunk_start
+            self._chunk_start += cut - prefix_length
+            sent = await self.bot.send_message(self.chat_id, "…", parse_mode=None)
+            self.message_ids.append(sent.message_id)
+            self._shown = "…"
+            body = self._body
+        if body.strip() and body != self._shown:
+            await self._edit(body, wait=wait)
+
+    async def _edit(self, body: str, formatted: Optional[dict] = None, wait: bool = False) -> None:
+        kwargs = formatted or {"text": body, "parse_mode": None}
+        while True:
+            try:
+                await self.bot.edit_message_text(
+                    chat_id=self.chat_id,
+                    message_id=self.message_ids[-1],
+                    disable_web_page_preview=True,
+                    **kwargs,
+                )
+                break
+            except TelegramRetryAfter as e:
+                if not wait:
+                    # Skip this edit, the next one carries the missed text
+                    self._next_edit = time.monotonic() + e.retry_after
+                    return
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+                break
+        self._shown = body
+        self._next_edit = time.monotonic() + self.interval
+
+    async def finish(self) -> None:
+        """Show the complete text, formatted like a non-streamed answer when it fits one message."""
+        await self._refresh(wait=True)
+        if len(self.message_ids) > 1 or not self.text:
+            return
+
+        if "```" in self.text:
+            formatted = {"text": f"*{self.prefix}*{self.text}", "parse_mode": ParseMode.MARKDOWN}
+        else:
+            formatted = Text(Bold(self.prefix), self.text).as_kwargs()
+        try:
+            await self._edit(self._body, formatted, wait=True)
+        except TelegramBadRequest as e:
+            # Unbalanced Markdown in the answer, keep the plain text already shown
+            logging.error(f"Error formatting streamed message: {e}")
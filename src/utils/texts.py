@@ -1,3 +1,6 @@
 start_message = "Welcome! I am your bot. Type /help for more info."
-help_message = "Available commands:\n/start - Start the bot\n/menu - Open menu\n/help - Show this help message"
+help_message = "Available commands:\n/start - Start the bot\n/menu - Open menu\n/help - Show this help message\n/cache - Reuse answers to repeated requests (on/off)"
 system_message_text = "Please enter the new role for the system:"
+overloaded_message = "🚦 The bot is overloaded right now. Please try again in a minute."
+queue_position_message = "⏳ The bot is busy, you are #{position} in the queue. Your request will start shortly."
+unavailable_message = "⚠️ OpenAI is not responding right now. Please try again in a few minutes."
@@ -0,0 +1,116 @@
+import importlib.util
+import logging
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Tokens of conversation history each model is given. This is the context
+# window minus the room kept for the answer (max output tokens).
+HISTORY_BUDGETS: Dict[str, int] = {
+    "gpt-5": 400_000 - 128_000,
+    "gpt-5-mini": 400_000 - 128_000,
+    "gpt-5-nano": 400_000 - 128_000,
+    "gpt-4o": 128_000 - 16_384,
+    "gpt-4o-mini": 128_000 - 16_384,
+}
+DEFAULT_HISTORY_BUDGET = 100_000
+
+# Per-message framing the API adds around role and content
+MESSAGE_OVERHEAD = 4
+
+# Without tiktoken, about 4 characters per token for English text. Other
+# scripts (Cyrillic, CJK, ...) are counted as a token per character, which
+# overestimates them rather than overflowing the context window.
+CHARS_PER_TOKEN = 4
+
+
+def context_budget(model: str, limit: Optional[int] = None) -> int:
+    """History token budget of ``model``, optionally capped by a user's own limit."""
+    budget = HISTORY_BUDGETS.get(model, DEFAULT_HISTORY_BUDGET)
+    return min(budget, limit) if limit else budget
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # tiktoken is optional, the estimate is close enough for budgeting
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        return (ascii_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + len(text) - ascii_chars
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """The longest start of ``text`` that counts as at most ``max_tokens`` tokens."""
+    encoding = _encoding()
+    if encoding is not None:
+        # A cut inside a multi-byte character drops that character
+        tokens = encoding.encode(text, disallowed_special=())[:max_tokens]
+        return encoding.decode_bytes(tokens).decode("utf-8", errors="ignore")
+    text = text[:max_tokens * CHARS_PER_TOKEN]
+    while count_tokens(text) > max_tokens:
+        text = text[:len(text) * max_tokens // count_tokens(text)]
+    return text
+
+
+def message_tokens(message: Dict) -> int:
+    return MESSAGE_OVERHEAD + count_tokens(message["content"])
+
+
+class TokenLedger:
+    """
+    Token counts of a message list, as running prefix sums.
+
+    Each message is counted once, when it is first seen; finding how much of
+    the newest history fits a budget is then a binary search. Replacing the
+    list (or shrinking it) starts the ledger over, like history syncing does.
+    """
+
+    def __init__(self):
+        self._messages: Optional[List[Dict]] = None
+        # _prefix[i] is the token count of messages[:i]
+        self._prefix: List[int] = [0]
+
+    def seed(self, messages: List[Dict], counts: List[int]) -> None:
+        """Adopt counts that are already known, e.g. stored with the history."""
+        self._messages = messages
+        self._prefix = [0]
+        for count in counts:
+            self._prefix.append(self._prefix[-1] + count)
+
+    def sync(self, messages: List[Dict]) -> None:
+        """Count the messages appended since the last call."""
+        if messages is not self._messages or len(messages) < len(self._prefix) - 1:
+            self._messages = messages
+            self._prefix = [0]
+        prefix = self._prefix
+        for message in messages[len(prefix) - 1:]:
+            prefix.append(prefix[-1] + message_tokens(message))
+
+    def drop_front(self, count: int) -> None:
+        """Forget the first ``count`` messages after they were removed from the list in place."""
+        base = self._prefix[count]
+        self._prefix = [total - base for total in self._prefix[count:]]
+
+    def count(self, index: int) -> int:
+        return self._prefix[index + 1] - self._prefix[index]
+
+    def tokens_since(self, index: int) -> int:
+        """Token count of messages[index:]."""
+        return self._prefix[-1] - self._prefix[index]
+
+    def window_start(self, messages: List[Dict], budget: int) -> int:
+        """Index of the oldest message such that it and everything after fit ``budget``."""
+        self.sync(messages)
+        return min(len(messages), bisect_left(self._prefix, self._prefix[-1] - budget))
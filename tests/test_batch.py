@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import BatchConfig
+from src.services.batch import BatchError, BatchQueue, LocalBatchTransport
+
+
+async def respond(body):
+    prompt = body["messages"][-1]["content"]
+    if prompt == "fail":
+        raise RuntimeError("model error")
+    return {"choices": [{"message": {"role": "assistant", "content": f"Summary of {prompt}"}}]}
+
+
+async def test_batch():
+    with tempfile.TemporaryDirectory() as directory:
+        transport = LocalBatchTransport(Path(directory), respond)
+        queue = BatchQueue(BatchConfig(enabled=True, max_requests=3), transport)
+
+        def request(prompt):
+            body = {"model": "gpt-5-nano", "messages": [{"role": "user", "content": prompt}]}
+            return asyncio.create_task(queue.run(body))
+
+        # 1. Requests wait until the batch is full, then go out as one file
+        first, abandoned = request("first"), request("abandoned")
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        second = request("second")
+        await asyncio.sleep(0.2)
+        if list(Path(directory).iterdir()):
+            print("❌ FAILED: Batch submitted before it was full.")
+            return False
+        failing = request("fail")
+        await asyncio.sleep(0.2)
+        batches = list(Path(directory).glob("batch_*.jsonl"))
+        if len(batches) != 1 or len(batches[0].read_text().splitlines()) != 3 or "abandoned" in batches[0].read_text():
+            print("❌ FAILED: Expected one batch without the abandoned request.")
+            return False
+
+        # 2. Polling routes each result to its caller
+        await queue.poll()
+        results = await asyncio.gather(first, second, failing, return_exceptions=True)
+        if results[:2] != [
+            {"choices": [{"message": {"role": "assistant", "content": "Summary of first"}}]},
+            {"choices": [{"message": {"role": "assistant", "content": "Summary of second"}}]},
+        ] or not isinstance(results[2], BatchError):
+            print(f"❌ FAILED: Unexpected results {results}")
+            return False
+        print("✅ PASSED: Deferred requests are batched and routed back.")
+
+        # 3. Requests still waiting are flushed on demand and cancelled on stop
+        late = request("late")
+        await asyncio.sleep(0.2)
+        await queue.flush()
+        await queue.stop()
+        outcome = (await asyncio.gather(late, return_exceptions=True))[0]
+        if not isinstance(outcome, asyncio.CancelledError):
+            print(f"❌ FAILED: Submitted request not cancelled on stop: {outcome}")
+            return False
+        print("✅ PASSED: Partial batches flush and stop cancels waiters.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_batch()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
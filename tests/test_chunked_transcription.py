@@ -0,0 +1,98 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.services import transcription
+from src.services.transcription import plan_segments, stitch, transcribe_audio
+from src.utils.audio import parse_silences
+
+SILENCEDETECT_LOG = """
+[silencedetect @ 0x5581] silence_start: -0.01
+[silencedetect @ 0x5581] silence_end: 0.52 | silence_duration: 0.53
+[silencedetect @ 0x5581] silence_start: 58.1
+[silencedetect @ 0x5581] silence_end: 58.9 | silence_duration: 0.8
+[silencedetect @ 0x5581] silence_start: 131.4
+"""
+
+
+def test_pure_functions():
+    silences = parse_silences(SILENCEDETECT_LOG)
+    if silences != [(0.0, 0.52), (58.1, 58.9)]:
+        print(f"❌ FAILED: Unexpected silences {silences}")
+        return False
+
+    # Cut in the pause near 60 s, then at the target without a pause, overlapping by 1 s
+    segments = plan_segments(200, silences, length=60, overlap=1)
+    if segments != [(0.0, 58.5), (57.5, 118.5), (117.5, 200.0)]:
+        print(f"❌ FAILED: Unexpected segments {segments}")
+        return False
+    if plan_segments(80, silences, length=60, overlap=1) != [(0.0, 80.0)]:
+        print("❌ FAILED: Short audio must stay in one piece.")
+        return False
+
+    text = stitch(["So the plan is to meet on", "meet on Friday, at noon.", "At noon. Bring the notes"])
+    if text != "So the plan is to meet on Friday, at noon. Bring the notes":
+        print(f"❌ FAILED: Overlap not removed: {text}")
+        return False
+    if stitch(["It is what it", "is"]) != "It is what it is":
+        print("❌ FAILED: Words must not be dropped without an overlap.")
+        return False
+    if stitch(["I like the cat", "at the door"]) != "I like the cat at the door":
+        print("❌ FAILED: Overlaps must not start inside a word.")
+        return False
+    text = stitch(["我们明天在车站见面", "车站见面，然后一起吃饭。", "一起吃饭。别忘了带票"])
+    if text != "我们明天在车站见面，然后一起吃饭。别忘了带票":
+        print(f"❌ FAILED: Unspaced overlap not removed: {text}")
+        return False
+    print("✅ PASSED: Segments are planned at silences and stitched without duplicates.")
+    return True
+
+
+async def test_parallel_transcription():
+    running = 0
+    peak = 0
+
+    async def detect_silences(audio, noise, min_duration):
+        return [(58.1, 58.9), (119.0, 119.6)]
+
+    async def extract_segment(audio, start, end, audio_format=None):
+        return f"{start:.1f}-{end:.1f}".encode()
+
+    async def speech_to_text(piece, filename, user_id=None, on_queued=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later pieces finish first, the order must still hold
+        start = float(piece.decode().split("-")[0])
+        await asyncio.sleep(0.05 - start / 10_000)
+        running -= 1
+        return f"part from {piece.decode()}."
+
+    with patch.object(transcription, "detect_silences", detect_silences), \
+            patch.object(transcription, "extract_segment", extract_segment), \
+            patch.object(transcription.OpenAIService, "speech_to_text", speech_to_text), \
+            patch.object(config.voice, "segment_concurrency", 2):
+        text = await transcribe_audio(b"OggS", duration=300, user_id=1)
+
+    expected = [(0.0, 58.5), (57.5, 119.3), (118.3, 179.3), (178.3, 239.3), (238.3, 300.0)]
+    if text != " ".join(f"part from {start:.1f}-{end:.1f}." for start, end in expected):
+        print(f"❌ FAILED: Unexpected transcript {text}")
+        return False
+    if peak != 2:
+        print(f"❌ FAILED: Expected 2 segments at a time, saw {peak}")
+        return False
+    print("✅ PASSED: Long notes are transcribed in ordered, bounded parallel segments.")
+    return True
+
+
+if __name__ == "__main__":
+    if test_pure_functions() and asyncio.run(test_parallel_transcription()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,48 @@
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import load_config
+
+
+def test_documented_config():
+    # The "Optional tuning" block of the README, comments and all
+    readme = (project_root / "README.md").read_text(encoding="utf-8")
+    blocks = re.findall(r"```ini\r?\n(.*?)```", readme, re.S)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "config.ini"
+        # Plus the required keys of the first block
+        tuning = re.sub(r"\[OpenAI\]\r?\n", "[OpenAI]\napi_key = your_openai_api_key\n", blocks[-1], count=1)
+        required = "[Telegram]\ntoken = your_bot_token\nowner_id = 1\n"
+        path.write_text(tuning + required, encoding="utf-8")
+        try:
+            config = load_config(path)
+        except ValueError as e:
+            print(f"❌ FAILED: Documented config does not load: {e}")
+            return False
+
+    if config.openai.max_connections != 100 or config.security.cipher != "aesgcm":
+        print("❌ FAILED: Documented values were not read.")
+        return False
+    if config.security.encryption_key != "your_fernet_key":
+        print(f"❌ FAILED: Comment kept in a value: {config.security.encryption_key!r}")
+        return False
+    for section in vars(config).values():
+        for name, value in vars(section).items():
+            if isinstance(value, str) and ";" in value:
+                print(f"❌ FAILED: Comment kept in {name} = {value!r}")
+                return False
+    print("✅ PASSED: The documented config block loads with its comments.")
+    return True
+
+
+if __name__ == "__main__":
+    if test_documented_config():
+        sys.exit(0)
+    else:
+        sys.exit(1)
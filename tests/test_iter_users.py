@@ -0,0 +1,57 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.storage import init_db, close_db, iter_users
+
+
+async def test_iter_users():
+    await init_db()
+    now = int(time.time())
+    async with storage.backend.engine.writer() as db:
+        await db.execute("DELETE FROM UsersData WHERE user_id LIKE '5550%'")
+        await db.executemany(
+            "INSERT INTO UsersData (user_id, username, last_active) VALUES (?, ?, ?)",
+            [
+                (f"5550{i:02d}", f"user{i}" if i % 2 else None, now - i * 86400)
+                for i in range(25)
+            ],
+        )
+
+    async def collect(**filters):
+        batches = [batch async for batch in iter_users(batch_size=4, **filters)]
+        users = [user["user_id"] for batch in batches for user in batch if user["user_id"].startswith("5550")]
+        return batches, users
+
+    batches, users = await collect()
+    if users != sorted(users) or len(users) != 25 or any(len(batch) > 4 for batch in batches):
+        print(f"❌ FAILED: Pagination returned {users}")
+        return False
+    print("✅ PASSED: Users are streamed in ordered, bounded batches.")
+
+    _, active = await collect(active_since=now - 2.5 * 86400)
+    _, named = await collect(has_username=True)
+    if active != ["555000", "555001", "555002"] or len(named) != 12:
+        print(f"❌ FAILED: Filters returned {active} and {len(named)} named users")
+        return False
+    print("✅ PASSED: Activity and username filters are applied in SQL.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_iter_users()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
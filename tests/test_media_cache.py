@@ -0,0 +1,76 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.services import openai_service
+from src.services.openai_service import OpenAIService
+from src.services.response_cache import media_cache
+from src.utils.functions import process_voice_message
+from src.utils.metrics import metrics
+
+
+class FakeBot:
+    def __init__(self):
+        self.downloads = 0
+
+    async def download(self, file, destination=None):
+        self.downloads += 1
+        return io.BytesIO(b"OggS voice")
+
+
+def forwarded_voice(file_id):
+    # Each forward has its own file_id, the content keeps its file_unique_id
+    return SimpleNamespace(voice=SimpleNamespace(file_id=file_id, file_unique_id="voice-1", duration=3))
+
+
+async def test_media_cache():
+    # 1. A forwarded voice note is transcribed once
+    bot = FakeBot()
+    speech_to_text = AsyncMock(return_value="Hello there")
+    with patch("src.services.transcription.OpenAIService.speech_to_text", speech_to_text):
+        first = await process_voice_message(bot, forwarded_voice("a"), 1)
+        second = await process_voice_message(bot, forwarded_voice("b"), 2)
+    if first != second != "Hello there" or bot.downloads != 1 or speech_to_text.call_count != 1:
+        print(f"❌ FAILED: {bot.downloads} downloads and {speech_to_text.call_count} transcriptions")
+        return False
+    if metrics.counters["media_cache.transcript.hits"] != 1:
+        print("❌ FAILED: Transcript hit not counted.")
+        return False
+    print("✅ PASSED: Cached transcripts skip the download and the model call.")
+
+    # 2. A picture asked about again with the same caption is not fetched again
+    completion = SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content="A cat."))])
+    load_image = AsyncMock(return_value="data:image/jpeg;base64,AAAA")
+    with patch.object(openai_service.resilience, "call", AsyncMock(return_value=completion)) as call:
+        answers = [
+            await OpenAIService.vision_chat_completion(
+                text="What's in the picture?", image_id="photo-1", load_image=load_image
+            )
+            for _ in range(2)
+        ]
+        await OpenAIService.vision_chat_completion(
+            text="What color is it?", image_id="photo-1", load_image=load_image
+        )
+    if answers != ["A cat.", "A cat."] or load_image.call_count != 2 or call.call_count != 2:
+        print(f"❌ FAILED: {load_image.call_count} image loads and {call.call_count} model calls")
+        return False
+    # One hit in two transcript lookups, one in three image lookups
+    if media_cache.stats()["hit_rate"] != 0.4:
+        print(f"❌ FAILED: Unexpected media cache stats {media_cache.stats()}")
+        return False
+    print("✅ PASSED: Cached image answers skip the download, captions keep their own answers.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_media_cache()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
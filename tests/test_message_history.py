@@ -0,0 +1,156 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.database.encryption import encrypt_text, is_current_format
+from src.config import config
+
+
+async def stored_seqs(user_id):
+    async with storage.backend.engine.reader() as db:
+        async with db.execute(
+            "SELECT seq FROM ConversationMessages WHERE user_id = ? ORDER BY seq", (str(user_id),)
+        ) as cursor:
+            return [row["seq"] for row in await cursor.fetchall()]
+
+
+async def reload(user_id):
+    storage.users_data_cache.pop(user_id, None)
+    return await get_or_create_user_data(user_id)
+
+
+async def test_message_history():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    await init_db()
+    user_id = 888801
+    user_data = await reload(user_id)
+    user_data.messages = []
+    await save_user_data(user_id)
+
+    # 1. Appending only inserts the new rows
+    user_data.messages.append({"role": "user", "content": "first"})
+    user_data.messages.append({"role": "assistant", "content": "second"})
+    await save_user_data(user_id)
+    user_data.messages.append({"role": "user", "content": "third"})
+    await save_user_data(user_id)
+    if await stored_seqs(user_id) != [0, 1, 2]:
+        print(f"❌ FAILED: Unexpected rows {await stored_seqs(user_id)}")
+        return False
+    print("✅ PASSED: New messages are appended as separate rows.")
+
+    # 2. Loading stops once the token budget is covered
+    user_data.max_out = user_data.token_ledger.tokens_since(1)
+    await save_user_data(user_id)
+    loaded = await reload(user_id)
+    if [m["content"] for m in loaded.messages] != ["second", "third"]:
+        print(f"❌ FAILED: Lazy load returned {loaded.messages}")
+        return False
+    loaded.messages.append({"role": "assistant", "content": "fourth"})
+    await save_user_data(user_id)
+    if await stored_seqs(user_id) != [0, 1, 2, 3]:
+        print(f"❌ FAILED: Append after lazy load wrote {await stored_seqs(user_id)}")
+        return False
+    print("✅ PASSED: History loads newest-first within the budget.")
+
+    # 3. Settings changes only update their column
+    async def payloads():
+        async with storage.backend.engine.reader() as db:
+            async with db.execute(
+                "SELECT payload FROM ConversationMessages WHERE user_id = ? ORDER BY seq", (str(user_id),)
+            ) as cursor:
+                return [row["payload"] for row in await cursor.fetchall()]
+
+    before = await payloads()
+    loaded.pic_size = "1792x1024"
+    await save_user_data(user_id)
+    reloaded = await reload(user_id)
+    if await payloads() != before or reloaded.pic_size != "1792x1024":
+        print("❌ FAILED: A settings change rewrote the stored history.")
+        return False
+    print("✅ PASSED: Settings changes leave the history rows untouched.")
+    loaded = reloaded
+
+    # 4. Replacing the list clears the stored history
+    loaded.messages = [{"role": "user", "content": "fresh"}]
+    await save_user_data(user_id)
+    if await stored_seqs(user_id) != [0] or (await reload(user_id)).messages[0]["content"] != "fresh":
+        print("❌ FAILED: Clearing the context did not reset the stored history.")
+        return False
+    print("✅ PASSED: Clearing the context resets the stored history.")
+
+    # 5. Legacy blobs are migrated into the message table
+    legacy_id = 888802
+    storage.users_data_cache.pop(legacy_id, None)
+    config.security.cipher = "fernet"
+    blob = encrypt_text(json.dumps([{"role": "user", "content": "legacy"}]))
+    config.security.cipher = "aesgcm"
+    async with storage.backend.engine.writer() as db:
+        await db.execute("DELETE FROM ConversationMessages WHERE user_id = ?", (str(legacy_id),))
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO UsersData (user_id, model, model_message_info, model_message_chat,
+            messages, count_messages, max_out, voice_answer, system_message, pic_grade, pic_size, username)
+            VALUES (?, 'gpt-5-nano', '5 nano', '5 nano:\n\n', ?, 1, 128000, 0, '', 'standard', '1024x1024', 'legacy')
+            """,
+            (str(legacy_id), blob),
+        )
+    await close_db()
+    await init_db()
+    migrated = await reload(legacy_id)
+    if [m["content"] for m in migrated.messages] != ["legacy"]:
+        print(f"❌ FAILED: Legacy history not migrated: {migrated.messages}")
+        return False
+    print("✅ PASSED: Legacy history blobs are migrated.")
+
+    # 6. Rows in an older envelope are upgraded on the next write
+    config.security.cipher = "fernet"
+    async with storage.backend.engine.writer() as db:
+        await db.execute(
+            "UPDATE ConversationMessages SET payload = ? WHERE user_id = ? AND seq = 0",
+            (encrypt_text("legacy"), str(legacy_id)),
+        )
+    config.security.cipher = "aesgcm"
+    # Compression is opt-in
+    config.database.compression = "zlib"
+    migrated = await reload(legacy_id)
+    migrated.messages.append({"role": "assistant", "content": "new answer " * 20})
+    await save_user_data(legacy_id)
+    async with storage.backend.engine.reader() as db:
+        async with db.execute(
+            "SELECT payload FROM ConversationMessages WHERE user_id = ? ORDER BY seq", (str(legacy_id),)
+        ) as cursor:
+            stored = [row["payload"] for row in await cursor.fetchall()]
+    if not all(is_current_format(payload) for payload in stored):
+        print("❌ FAILED: Old envelopes were not upgraded on write.")
+        return False
+    if len(stored[1]) >= len("new answer " * 20):
+        print("❌ FAILED: Repetitive message was not compressed.")
+        return False
+    if [m["content"] for m in (await reload(legacy_id)).messages] != ["legacy", "new answer " * 20]:
+        print("❌ FAILED: Upgraded history does not round-trip.")
+        return False
+    print("✅ PASSED: Old envelopes are upgraded lazily and new rows are compressed.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_message_history()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
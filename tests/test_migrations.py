@@ -0,0 +1,95 @@
+import asyncio
+import json
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.database.backends import SQLiteBackend
+from src.database.encryption import encrypt_text
+from src.database.migrations import MIGRATIONS
+
+
+def create_original_schema(path: Path, user_count: int):
+    """The schema and data layout the bot shipped with before migrations existed."""
+    db = sqlite3.connect(path)
+    db.execute(
+        """
+        CREATE TABLE UsersData (
+            user_id TEXT PRIMARY KEY, model TEXT, model_message_info TEXT,
+            model_message_chat TEXT, messages TEXT, count_messages INTEGER,
+            max_out INTEGER, voice_answer BOOLEAN, system_message TEXT,
+            pic_grade TEXT, pic_size TEXT
+        )
+    """
+    )
+    config.security.cipher = "fernet"
+    db.executemany(
+        "INSERT INTO UsersData VALUES (?, 'gpt-5-nano', '5 nano', '5 nano:\n\n', ?, 1, 128000, 0, '', 'standard', '1024x1024')",
+        [
+            (str(user_id), encrypt_text(json.dumps([{"role": "user", "content": f"old {user_id}"}])))
+            for user_id in range(user_count)
+        ],
+    )
+    config.security.cipher = "aesgcm"
+    db.commit()
+    db.close()
+
+
+async def test_migrations():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "users_data.db"
+        create_original_schema(path, user_count=450)
+
+        backend = SQLiteBackend(path, config.database)
+        await backend.open()
+        try:
+            # 1. Users are readable right away, before the backfill reached them
+            loaded = await backend.load_user(449)
+            if loaded is None or loaded.messages != [{"role": "user", "content": "old 449"}]:
+                print(f"❌ FAILED: Legacy user not readable during backfill: {loaded}")
+                return False
+            print("✅ PASSED: Legacy users load while the backfill is pending.")
+
+            await backend._background_migrations
+            async with backend.engine.reader() as db:
+                async with db.execute("SELECT version FROM schema_version ORDER BY version") as cursor:
+                    versions = [row["version"] for row in await cursor.fetchall()]
+                async with db.execute("SELECT COUNT(*) FROM UsersData WHERE messages IS NOT NULL") as cursor:
+                    remaining = (await cursor.fetchone())[0]
+                async with db.execute("SELECT COUNT(DISTINCT user_id) FROM ConversationMessages") as cursor:
+                    migrated = (await cursor.fetchone())[0]
+            if versions != [m.version for m in MIGRATIONS] or remaining or migrated != 450:
+                print(f"❌ FAILED: versions={versions} remaining={remaining} migrated={migrated}")
+                return False
+            print("✅ PASSED: All migrations are recorded and the backfill completed.")
+        finally:
+            await backend.close()
+
+        # 2. Reopening applies nothing twice
+        backend = SQLiteBackend(path, config.database)
+        await backend.open()
+        try:
+            if backend._background_migrations is not None:
+                print("❌ FAILED: Migrations ran again on an up-to-date database.")
+                return False
+            print("✅ PASSED: Up-to-date databases skip every migration.")
+        finally:
+            await backend.close()
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_migrations()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
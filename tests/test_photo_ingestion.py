@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import io
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import VisionConfig
+from src.utils import images
+from src.utils.images import choose_photo, encode_photo, load_photo, target_size
+from src.utils.metrics import metrics
+
+# The sizes Telegram keeps of a 2560x1920 photo
+SIZES = [
+    SimpleNamespace(file_id=f"photo-{width}", width=width, height=height)
+    for width, height in [(90, 67), (320, 240), (800, 600), (1280, 960), (2560, 1920)]
+]
+
+
+class FakeBot:
+    def __init__(self, real_images=False):
+        self.downloaded = []
+        self.real_images = real_images
+
+    async def download(self, file, destination=None):
+        self.downloaded.append(file.file_id)
+        if not self.real_images:
+            return io.BytesIO(b"\xff\xd8 jpeg " + file.file_id.encode())
+        # A noisy photo, which JPEG cannot shrink much without downscaling
+        output = io.BytesIO()
+        image_module = images._pillow()
+        image_module.effect_noise((file.width, file.height), 64).convert("RGB").save(output, format="JPEG", quality=95)
+        output.seek(0)
+        return output
+
+
+def test_photo_choice():
+    settings = VisionConfig()
+    if target_size(2560, 1920, "low", settings) != (512, 384):
+        print("❌ FAILED: Low detail must fit 512 pixels square.")
+        return False
+    if target_size(2560, 1920, "high", settings) != (1024, 768) or target_size(600, 400, "high", settings) != (600, 400):
+        print("❌ FAILED: High detail must shrink the shortest side to 768 and never enlarge.")
+        return False
+
+    chosen = {detail: choose_photo(SIZES, detail, settings).file_id for detail in ("low", "high", "auto")}
+    if chosen != {"low": "photo-800", "high": "photo-1280", "auto": "photo-1280"}:
+        print(f"❌ FAILED: Unexpected sizes chosen {chosen}")
+        return False
+    print("✅ PASSED: The smallest size covering the detail level is chosen.")
+    return True
+
+
+async def test_load_photo():
+    bot = FakeBot()
+    threads = []
+
+    def encode(*args):
+        threads.append(threading.current_thread())
+        return encode_photo(*args)
+
+    with patch.object(images, "encode_photo", encode), patch.object(images.config.vision, "downscale", False):
+        url = await load_photo(bot, SIZES, "low")
+
+    if bot.downloaded != ["photo-800"]:
+        print(f"❌ FAILED: Downloaded {bot.downloaded}")
+        return False
+    if threads != [threads[0]] or threads[0] is threading.main_thread():
+        print("❌ FAILED: Encoding must run in the worker pool.")
+        return False
+    # Without downscaling the photo is sent as downloaded
+    if base64.b64decode(url.split(",", 1)[1]) != b"\xff\xd8 jpeg photo-800" or not url.startswith("data:image/jpeg;base64,"):
+        print(f"❌ FAILED: Unexpected data URL {url[:40]}")
+        return False
+    print("✅ PASSED: Photos are downloaded through the bot and encoded off the event loop.")
+    return True
+
+
+async def test_downscale():
+    image_module = images._pillow()
+    if image_module is None:
+        print("⚠️ SKIPPED: Pillow is not installed, downscaling not checked.")
+        return True
+
+    bot = FakeBot(real_images=True)
+    original = (await bot.download(SIZES[2])).getvalue()
+    before = metrics.counters["vision.downscaled"]
+    url = await load_photo(bot, SIZES, "low")
+    shrunk = base64.b64decode(url.split(",", 1)[1])
+    with image_module.open(io.BytesIO(shrunk)) as image:
+        size = image.size
+    if size != (512, 384) or len(shrunk) >= len(original):
+        print(f"❌ FAILED: Photo sent at {size}, {len(shrunk)} of {len(original)} bytes")
+        return False
+    if metrics.counters["vision.downscaled"] != before + 1:
+        print("❌ FAILED: Downscale not counted.")
+        return False
+
+    # A Telegram size already at the target is sent as it is
+    url = await load_photo(FakeBot(real_images=True), SIZES[:3], "high")
+    with image_module.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))) as image:
+        if image.size != (800, 600) or metrics.counters["vision.downscaled"] != before + 1:
+            print(f"❌ FAILED: Photo at its target size re-encoded to {image.size}")
+            return False
+    print("✅ PASSED: Photos are shrunk to the detail level's size before upload.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_load_photo() and await test_downscale()
+    finally:
+        images.close_image_workers()
+
+
+if __name__ == "__main__":
+    if test_photo_choice() and asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
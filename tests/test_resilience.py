@@ -0,0 +1,98 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import openai
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import ResilienceConfig
+from src.services.resilience import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    Resilience,
+    request_deadline,
+)
+
+
+def api_error(status_code, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    error_class = openai.RateLimitError if status_code == 429 else openai.APIStatusError
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+async def test_resilience():
+    resilience = Resilience(ResilienceConfig(
+        max_attempts=3, backoff_base=0.01, backoff_cap=0.05, breaker_failures=3, breaker_cooldown=60,
+    ))
+    calls = []
+
+    def flaky(errors):
+        async def request(timeout):
+            calls.append(timeout)
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+        return request
+
+    # 1. Retryable errors are retried, honoring Retry-After
+    result = await resilience.call("chat", flaky([api_error(429, {"retry-after-ms": "20"}), api_error(503)]), 10)
+    if result != "ok" or len(calls) != 3:
+        print(f"❌ FAILED: Expected success on the third attempt, got {result} after {len(calls)} calls")
+        return False
+
+    # 2. Client errors are raised at once
+    calls.clear()
+    try:
+        await resilience.call("chat", flaky([api_error(400)]), 10)
+        print("❌ FAILED: Bad request did not raise.")
+        return False
+    except openai.APIStatusError:
+        pass
+    if len(calls) != 1:
+        print(f"❌ FAILED: Bad request was retried {len(calls) - 1} times.")
+        return False
+    print("✅ PASSED: Only retryable errors are retried.")
+
+    # 3. Consecutive failures open the endpoint's circuit
+    try:
+        await resilience.call("images", flaky([api_error(500)] * 3), 10)
+    except openai.APIStatusError:
+        pass
+    calls.clear()
+    try:
+        await resilience.call("images", flaky([]), 10)
+        print("❌ FAILED: Open circuit let a call through.")
+        return False
+    except CircuitOpenError:
+        pass
+    if calls or await resilience.call("chat", flaky([]), 10) != "ok":
+        print("❌ FAILED: Circuit breakers are not per endpoint.")
+        return False
+    print("✅ PASSED: Open circuits fail fast per endpoint.")
+
+    # 4. The request deadline caps attempt timeouts and stops retries
+    calls.clear()
+    try:
+        with request_deadline(0.5):
+            await resilience.call("speech", flaky([api_error(429, {"retry-after": "5"})]), 10)
+        print("❌ FAILED: Retry past the deadline was attempted.")
+        return False
+    except DeadlineExceededError:
+        pass
+    if len(calls) != 1 or calls[0] > 0.5:
+        print(f"❌ FAILED: Attempt timeouts ignore the deadline: {calls}")
+        return False
+    print("✅ PASSED: The request deadline bounds retries.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_resilience()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
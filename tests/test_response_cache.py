@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import tempfile
+from dataclasses import replace
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.services.response_cache import ResponseCache, cache_key
+
+
+async def test_response_cache():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    messages = [{"role": "user", "content": "What is Python?"}]
+    key = cache_key("chat", "gpt-5-nano", messages)
+    if key != cache_key("chat", "gpt-5-nano", [dict(messages[0])]) or key == cache_key("chat", "gpt-5", messages):
+        print("❌ FAILED: Keys must depend on content only.")
+        return False
+
+    # 1. Memory tier: TTL and size bound
+    cache = ResponseCache(replace(config.cache, response_cache_mb=1))
+    await cache.put(key, "A programming language.")
+    if await cache.get(key) != "A programming language.":
+        print("❌ FAILED: Cached answer not returned.")
+        return False
+    await cache.put("chat:expired", "old", ttl=-1)
+    if await cache.get("chat:expired") is not None:
+        print("❌ FAILED: Expired answer returned.")
+        return False
+    for i in range(20):
+        await cache.put(f"chat:{i}", "x" * 100_000)
+    if cache.total_bytes > cache.max_bytes or await cache.get(key) is not None:
+        print("❌ FAILED: Memory budget not enforced with LRU eviction.")
+        return False
+    print("✅ PASSED: Memory tier honors TTL and its size budget.")
+
+    # 2. SQLite tier survives a restart, encrypted
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "responses.db"
+        cache = ResponseCache(config.cache, path)
+        await cache.open()
+        try:
+            await cache.put(key, "A programming language.")
+        finally:
+            await cache.close()
+
+        cache = ResponseCache(config.cache, path)
+        await cache.open()
+        try:
+            async with cache.engine.reader() as db:
+                async with db.execute("SELECT value FROM CachedResponses") as cursor:
+                    stored = (await cursor.fetchone())["value"]
+            if b"programming" in bytes(stored):
+                print("❌ FAILED: Persisted answer is not encrypted.")
+                return False
+            if await cache.get(key) != "A programming language.":
+                print("❌ FAILED: Persisted answer not found after restart.")
+                return False
+        finally:
+            await cache.close()
+
+    if cache.stats()["hit_rate"] <= 0:
+        print("❌ FAILED: Hit rate not tracked.")
+        return False
+    print("✅ PASSED: Persistent tier survives restarts.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_response_cache()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
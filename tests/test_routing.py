@@ -0,0 +1,112 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import RoutingConfig
+from src.services.resilience import resilience
+from src.services.routing import ModelRouter, chat_endpoint
+from src.services.scheduler import QueueFullError
+
+
+def fake_models(delays, errors=None, cancelled=None):
+    """open_stream() stand-in: each model waits its delay, then answers with its name."""
+    errors = errors or {}
+
+    async def open_stream(model):
+        try:
+            await asyncio.sleep(delays[model])
+            if model in errors:
+                raise errors[model]
+            yield f"{model} "
+            yield "answer"
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(model)
+            raise
+
+    return open_stream
+
+
+async def answer_of(router, model, open_stream):
+    answered, deltas = await router.stream(model, open_stream)
+    return answered, "".join([delta async for delta in deltas])
+
+
+async def test_routing():
+    router = ModelRouter(RoutingConfig(slo=0.05, fallbacks="big>mid>small"))
+
+    # 1. A fast model answers itself
+    if await answer_of(router, "big", fake_models({"big": 0})) != ("big", "big answer"):
+        print("❌ FAILED: Fast model did not answer.")
+        return False
+
+    # 2. A slow model is hedged, the first to answer wins and the other is cancelled
+    cancelled = []
+    result = await answer_of(router, "big", fake_models({"big": 1, "mid": 0.01}, cancelled=cancelled))
+    if result != ("mid", "mid answer") or cancelled != ["big"]:
+        print(f"❌ FAILED: Hedge gave {result}, cancelled {cancelled}")
+        return False
+    print("✅ PASSED: Slow models are hedged with a faster sibling.")
+
+    # 3. Overload errors fall back at once, other errors are raised
+    result = await answer_of(router, "big", fake_models({"big": 0, "mid": 0}, errors={"big": QueueFullError()}))
+    if result != ("mid", "mid answer"):
+        print(f"❌ FAILED: Overloaded model did not fall back: {result}")
+        return False
+    try:
+        await answer_of(router, "big", fake_models({"big": 0, "mid": 0}, errors={"big": ValueError("bad request")}))
+        print("❌ FAILED: A bad request must not fall back.")
+        return False
+    except ValueError:
+        pass
+
+    # 4. Open circuits are skipped
+    breaker = resilience.breaker(chat_endpoint("big"))
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    try:
+        answered, _ = await router.complete("big", lambda model: asyncio.sleep(0, f"{model} answer"))
+    finally:
+        breaker.record_success()
+    if answered != "mid":
+        print(f"❌ FAILED: Open circuit not skipped, answered by {answered}")
+        return False
+    print("✅ PASSED: Failing models hand over to their fallbacks.")
+
+    # 5. Whole answers are not held to the first-token SLO, only to completion_slo
+    async def slow_answer(model):
+        await asyncio.sleep(0.2 if model == "big" else 0)
+        return f"{model} answer"
+
+    answered, _ = await router.complete("big", slow_answer)
+    hedged, _ = await ModelRouter(
+        RoutingConfig(slo=0.05, fallbacks="big>mid>small", completion_slo=0.1)
+    ).complete("big", slow_answer)
+    per_model, _ = await ModelRouter(
+        RoutingConfig(slo=0.05, fallbacks="big>mid>small", completion_slo=0.1, model_completion_slos="big:1")
+    ).complete("big", slow_answer)
+    if (answered, hedged, per_model) != ("big", "mid", "big"):
+        print(f"❌ FAILED: Whole answers routed to {answered}, {hedged} and {per_model}")
+        return False
+    print("✅ PASSED: Whole answers are hedged on completion time only.")
+
+    # 6. Without hedging the slow model is given up
+    router = ModelRouter(RoutingConfig(slo=0.05, fallbacks="big>mid>small", hedge=False))
+    cancelled = []
+    result = await answer_of(router, "big", fake_models({"big": 0.2, "mid": 1, "small": 0}, cancelled=cancelled))
+    if result != ("small", "small answer") or cancelled != ["big", "mid"]:
+        print(f"❌ FAILED: Fallback without hedging gave {result}, cancelled {cancelled}")
+        return False
+    print("✅ PASSED: Without hedging slow models are replaced.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_routing()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import SchedulerConfig
+from src.services.scheduler import Priority, QueueFullError, RequestScheduler
+
+
+async def test_scheduler():
+    scheduler = RequestScheduler(SchedulerConfig(concurrency=1, queue_size=3, model_limits="gpt-5:2"))
+    release = asyncio.Event()
+    order = []
+    positions = {}
+
+    async def request(name, priority, model="gpt-5-nano"):
+        async def on_queued(position):
+            positions[name] = position
+
+        async with scheduler.slot(model, priority, on_queued=on_queued):
+            order.append(name)
+            await release.wait()
+
+    # 1. One slot: later requests queue and are served by priority, then arrival
+    running = asyncio.create_task(request("first", Priority.TEXT))
+    await asyncio.sleep(0)
+    waiting = [
+        asyncio.create_task(request("image", Priority.MEDIA)),
+        asyncio.create_task(request("text", Priority.TEXT)),
+        asyncio.create_task(request("owner", Priority.OWNER)),
+    ]
+    await asyncio.sleep(0)
+    if positions != {"image": 1, "text": 1, "owner": 1}:
+        print(f"❌ FAILED: Unexpected queue positions {positions}")
+        return False
+
+    # 2. A full queue sheds new requests
+    try:
+        async with scheduler.slot("gpt-5-nano", Priority.OWNER):
+            pass
+        print("❌ FAILED: Full queue accepted a request.")
+        return False
+    except QueueFullError:
+        pass
+
+    release.set()
+    await asyncio.gather(running, *waiting)
+    if order != ["first", "owner", "text", "image"]:
+        print(f"❌ FAILED: Served in the wrong order {order}")
+        return False
+    print("✅ PASSED: Requests wait by priority and a full queue sheds load.")
+
+    # 3. Per-model limits override the default
+    release.clear()
+    order.clear()
+    tasks = [asyncio.create_task(request(i, Priority.TEXT, model="gpt-5")) for i in range(3)]
+    await asyncio.sleep(0)
+    if scheduler.queues["gpt-5"].active != 2:
+        print(f"❌ FAILED: Expected 2 concurrent gpt-5 calls, got {scheduler.queues['gpt-5'].active}")
+        return False
+    release.set()
+    await asyncio.gather(*tasks)
+    print("✅ PASSED: Per-model concurrency limits apply.")
+
+    # 4. The token budget holds back requests until the window frees up
+    scheduler = RequestScheduler(SchedulerConfig(concurrency=5, tokens_per_minute=1000))
+    async with scheduler.slot("gpt-5-mini", Priority.TEXT, tokens=800):
+        pass
+    try:
+        await asyncio.wait_for(scheduler.slot("gpt-5-mini", Priority.TEXT, tokens=800).__aenter__(), 0.1)
+        print("❌ FAILED: Request over the token budget was admitted.")
+        return False
+    except asyncio.TimeoutError:
+        pass
+    if scheduler.queues["gpt-5-mini"]._waiting:
+        print("❌ FAILED: Cancelled request stayed in the queue.")
+        return False
+    print("✅ PASSED: Tokens-per-minute budgets delay requests.")
+
+    # 5. Without a token budget no spends are kept
+    scheduler = RequestScheduler(SchedulerConfig(concurrency=5, tokens_per_minute=0))
+    for _ in range(1000):
+        async with scheduler.slot("gpt-5-mini", Priority.TEXT, tokens=10):
+            pass
+    if scheduler.queues["gpt-5-mini"]._spent:
+        print(f"❌ FAILED: {len(scheduler.queues['gpt-5-mini']._spent)} spends kept without a budget.")
+        return False
+    print("✅ PASSED: Spends are not recorded without a token budget.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_scheduler()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -7,7 +7,8 @@ from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 
-from src.database.storage import init_db, save_user_data, get_or_create_user_data
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.database.encryption import is_encrypted, encrypt_text, decrypt_text
 from src.config import config
 import aiosqlite
 
@@ -32,15 +33,15 @@ async def test_security_encryption():
     db_file = project_root / "data/users_data.db"
     async with aiosqlite.connect(db_file) as db:
         db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT messages FROM UsersData WHERE user_id = ?", (str(user_id),)) as cursor:
+        async with db.execute("SELECT payload FROM ConversationMessages WHERE user_id = ?", (str(user_id),)) as cursor:
             row = await cursor.fetchone()
-            raw_msg = row["messages"]
+            raw_msg = row["payload"]
             
-            if not raw_msg.startswith("ENC:"):
+            if not is_encrypted(raw_msg):
                 print("❌ FAILED: Message is stored as plain text!")
                 return False
             
-            if secret_text in raw_msg:
+            if secret_text.encode() in raw_msg:
                  print("❌ FAILED: Secret text found in raw encrypted blob!")
                  return False
                  
@@ -59,10 +60,25 @@ async def test_security_encryption():
         print("❌ FAILED: Internal decryption failed. Context lost.")
         return False
     
+    # 4. Legacy Fernet values stay readable next to the AEAD envelopes
+    for cipher in ("fernet", "aesgcm", "chacha20"):
+        config.security.cipher = cipher
+        if decrypt_text(encrypt_text(secret_text)) != secret_text:
+            print(f"❌ FAILED: {cipher} envelope does not round-trip.")
+            return False
+    config.security.cipher = "aesgcm"
+    print("✅ PASSED: Legacy and AEAD envelopes are all readable.")
+
     return True
 
+async def run_test():
+    try:
+        return await test_security_encryption()
+    finally:
+        await close_db()
+
 if __name__ == "__main__":
-    if asyncio.run(test_security_encryption()):
+    if asyncio.run(run_test()):
         sys.exit(0)
     else:
         sys.exit(1)
@@ -0,0 +1,72 @@
+import asyncio
+import dataclasses
+import sys
+import tempfile
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.database.backends import SQLiteBackend, ShardedSQLiteBackend
+from src.database.entities import UserData
+from src.database.rebalance import rebalance
+
+
+async def write(backend, users):
+    for callback in await backend.write_users([(user, user.take_changes()) for user in users]):
+        callback()
+
+
+async def test_sharding():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = SQLiteBackend(Path(tmp) / "users_data.db", config.database)
+        sharded = ShardedSQLiteBackend(
+            Path(tmp) / "shards", 4, dataclasses.replace(config.database, shards=4)
+        )
+        await single.open()
+        await sharded.open()
+        try:
+            users = []
+            for user_id in range(1000, 1040):
+                user_data = UserData(user_id=user_id, username=f"user{user_id}")
+                user_data.messages.append({"role": "user", "content": f"hello from {user_id}"})
+                users.append(user_data)
+            await write(sharded, users)
+
+            # 1. Users are spread over the shards and load back from the right one
+            per_shard = []
+            for shard in sharded.shards:
+                per_shard.append(sum([len(batch) async for batch in shard.iter_users()]))
+            if sum(per_shard) != 40 or min(per_shard) == 0:
+                print(f"❌ FAILED: Unexpected shard distribution {per_shard}")
+                return False
+            loaded = await sharded.load_user(1007)
+            if loaded.messages[0]["content"] != "hello from 1007":
+                print("❌ FAILED: Sharded load returned the wrong history.")
+                return False
+            print(f"✅ PASSED: Users are spread over shards {per_shard}.")
+
+            # 2. Rebalancing copies every user and its history
+            copied = await rebalance(sharded, single, batch_size=7)
+            loaded = await single.load_user(1033)
+            if copied != 40 or loaded is None or loaded.messages[0]["content"] != "hello from 1033":
+                print(f"❌ FAILED: Rebalance copied {copied} users.")
+                return False
+            print("✅ PASSED: Rebalancing copies users and history between layouts.")
+        finally:
+            await single.close()
+            await sharded.close()
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_sharding()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
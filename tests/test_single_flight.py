@@ -0,0 +1,87 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.services.single_flight import SingleFlight, normalize_prompt
+
+
+async def test_single_flight():
+    flights = SingleFlight("test")
+    calls = 0
+    release = asyncio.Event()
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "answer"
+
+    # 1. Concurrent duplicates share one call
+    key = (1, normalize_prompt("  What is  Python? "), "gpt-5-nano")
+    if key != (1, normalize_prompt("what is python?"), "gpt-5-nano"):
+        print("❌ FAILED: Prompts differing in case and spacing must match.")
+        return False
+    first = asyncio.create_task(flights.run(key, answer))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flights.run(key, answer))
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(first, second)
+    if calls != 1 or results != [("answer", False), ("answer", True)] or key in flights:
+        print(f"❌ FAILED: Expected one shared call, got {calls} calls and {results}")
+        return False
+    print("✅ PASSED: Duplicates in flight share one call.")
+
+    # 2. Errors reach every waiter, a cancelled waiter does not stop the others
+    release.clear()
+
+    async def failing():
+        await release.wait()
+        raise RuntimeError("boom")
+
+    waiters = [asyncio.create_task(flights.run("error", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    await asyncio.sleep(0)
+    release.set()
+    outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+    if not isinstance(outcomes[0], asyncio.CancelledError) or not all(
+        isinstance(outcome, RuntimeError) for outcome in outcomes[1:]
+    ):
+        print(f"❌ FAILED: Unexpected outcomes {outcomes}")
+        return False
+
+    # 3. The call is cancelled once nobody waits for it
+    release.clear()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def abandoned():
+        started.set()
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(flights.run("abandoned", abandoned))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await asyncio.sleep(0)
+    if not cancelled.is_set() or "abandoned" in flights:
+        print("❌ FAILED: Abandoned call kept running.")
+        return False
+    print("✅ PASSED: Errors and cancellation are handled per waiter.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_single_flight()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,104 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.services import speech
+from src.services.response_cache import media_cache, speech_cache
+from src.services.scheduler import QueueFullError
+from src.services.speech import SpeechAnswer, split_sentences
+
+ANSWER = " ".join(f"Sentence number {i} says something short." for i in range(1, 61))
+
+
+def test_split_sentences():
+    chunks, rest = split_sentences(ANSWER, target=200, limit=400)
+    if " ".join(chunks + [rest.strip()]) != ANSWER:
+        print("❌ FAILED: Chunks must rejoin to the answer.")
+        return False
+    if len(chunks) < 3 or any(len(chunk) > 400 or not chunk.endswith(".") for chunk in chunks):
+        print(f"❌ FAILED: Unexpected chunks {chunks}")
+        return False
+
+    # The same text gives the same chunks however it arrives
+    fed = SpeechAnswer()
+    with patch.object(SpeechAnswer, "_start", lambda self, chunk: pieces.append(chunk)):
+        pieces = []
+        for i in range(0, len(ANSWER), 7):
+            fed.feed(ANSWER[i:i + 7])
+        streamed = list(pieces)
+        pieces.clear()
+        SpeechAnswer().feed(ANSWER)
+        whole = list(pieces)
+    if streamed != whole or not whole:
+        print("❌ FAILED: Streamed text must be cut like the whole text.")
+        return False
+
+    # A long run without sentence ends is cut at a space under the limit
+    chunks, rest = split_sentences("word " * 300, target=100, limit=120)
+    if not chunks or any(len(chunk) > 120 or chunk.endswith("wor") for chunk in chunks):
+        print(f"❌ FAILED: Unexpected cut without sentence ends {chunks[:2]}")
+        return False
+    print("✅ PASSED: Answers are cut at sentence ends, the same way every time.")
+    return True
+
+
+async def test_parallel_synthesis():
+    calls = []
+    running = 0
+    peak = 0
+    chunks, rest = split_sentences(ANSWER)
+    chunks.append(rest.strip())
+
+    async def text_to_speech(text, user_id=None, voice=None, model=None):
+        nonlocal running, peak
+        calls.append(text)
+        running += 1
+        peak = max(peak, running)
+        # Earlier chunks take longer, the order must still hold
+        await asyncio.sleep(0.1 if len(calls) == 1 else 0.05)
+        running -= 1
+        if text == chunks[1]:
+            raise QueueFullError("gpt-4o-mini-tts")
+        return f"<{text[:11]}>".encode()
+
+    with patch.object(speech.OpenAIService, "text_to_speech", text_to_speech), \
+            patch.object(config.voice, "speech_concurrency", 2):
+        answer = SpeechAnswer(user_id=1)
+        for i in range(0, len(ANSWER), 40):
+            answer.feed(ANSWER[i:i + 40])
+        audio = await answer.finish()
+
+        # The chunk that failed is left out, the others keep their order
+        expected = b"".join(f"<{text[:11]}>".encode() for text in chunks if text != chunks[1])
+        if len(chunks) < 4 or calls != chunks or audio != expected:
+            print(f"❌ FAILED: Unexpected audio {audio!r}")
+            return False
+        if peak != 2:
+            print(f"❌ FAILED: Expected 2 chunks at a time, saw {peak}")
+            return False
+        print("✅ PASSED: Chunks are synthesized two at a time, a failed one does not lose the rest.")
+
+        # The same answer again is served from the speech cache, only the failed chunk is retried
+        again = SpeechAnswer(user_id=2)
+        again.feed(ANSWER)
+        if await again.finish() != audio or calls[len(chunks):] != [chunks[1]]:
+            print(f"❌ FAILED: Repeated answer called TTS for {calls[len(chunks):]}")
+            return False
+    if media_cache.stats()["entries"] or speech_cache.stats()["entries"] != len(chunks) - 1:
+        print("❌ FAILED: Audio must be kept in the speech cache only.")
+        return False
+    print("✅ PASSED: Repeated answers reuse cached audio.")
+    return True
+
+
+if __name__ == "__main__":
+    if test_split_sentences() and asyncio.run(test_parallel_synthesis()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
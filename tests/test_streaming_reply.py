@@ -0,0 +1,70 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.streaming import MESSAGE_LIMIT, StreamingReply
+
+
+class FakeBot:
+    """Records what a chat would show after each edit."""
+
+    def __init__(self):
+        self.messages = {1: "⏳ Hold on"}
+        self.edits = 0
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.messages[message_id] = text
+        self.edits += 1
+
+    async def send_message(self, chat_id, text, **kwargs):
+        message_id = max(self.messages) + 1
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+
+async def test_streaming_reply():
+    # 1. Edits are throttled while streaming
+    bot = FakeBot()
+    reply = StreamingReply(bot, chat_id=1, message_id=1, prefix="5 nano:\n\n", interval=60)
+    for word in ["Hello", ", ", "world", "!"]:
+        await reply.append(word)
+    if bot.edits != 1:
+        print(f"❌ FAILED: Expected one throttled edit, got {bot.edits}")
+        return False
+
+    await reply.finish()
+    if bot.messages[1] != "5 nano:\n\nHello, world!":
+        print(f"❌ FAILED: Final text not shown: {bot.messages[1]!r}")
+        return False
+    print("✅ PASSED: Edits are throttled and the final text is shown.")
+
+    # 2. Long answers roll over into new messages without losing text
+    bot = FakeBot()
+    reply = StreamingReply(bot, chat_id=1, message_id=1, prefix="5:\n\n", interval=0)
+    lines = [f"line {i} " + "x" * 80 + "\n" for i in range(120)]
+    for line in lines:
+        await reply.append(line)
+    await reply.finish()
+
+    shown = [bot.messages[message_id] for message_id in reply.message_ids]
+    if any(len(text) > MESSAGE_LIMIT for text in shown):
+        print("❌ FAILED: A message exceeds the Telegram limit.")
+        return False
+    if len(shown) < 3 or "".join(shown) != "5:\n\n" + "".join(lines):
+        print(f"❌ FAILED: Rolled over text does not add up ({len(shown)} messages).")
+        return False
+
+    print("✅ PASSED: Long answers continue in new messages.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_streaming_reply()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+from dataclasses import replace
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.config import config
+from src.services import summarizer
+from src.services.resilience import remaining_time, request_deadline
+
+
+async def count_rows(user_id):
+    async with storage.backend.engine.reader() as db:
+        async with db.execute(
+            "SELECT COUNT(*) AS n FROM ConversationMessages WHERE user_id = ?", (str(user_id),)
+        ) as cursor:
+            return (await cursor.fetchone())["n"]
+
+
+async def test_summarization():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+    await init_db()
+
+    user_id = 888950
+    user_data = await get_or_create_user_data(user_id)
+    user_data.messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "words " * 40}
+        for i in range(40)
+    ]
+    await save_user_data(user_id)
+    newest = user_data.messages[-1]
+
+    # 1. Background compaction folds older turns into the summary
+    deadlines = []
+
+    async def summarize(**kwargs):
+        deadlines.append(remaining_time())
+        return "The user counted turns."
+
+    settings = replace(config.summary, enabled=True, threshold_tokens=500, keep_recent_tokens=200)
+    with patch.object(summarizer.config, "summary", settings), patch.object(
+        summarizer.OpenAIService, "chat_completion", AsyncMock(side_effect=summarize)
+    ) as completion:
+        # Scheduled from a handler about to run out of time
+        with request_deadline(0.01):
+            summarizer.schedule_compaction(user_id, user_data)
+        await asyncio.gather(*summarizer._tasks.values())
+
+    if deadlines != [None]:
+        print(f"❌ FAILED: Compaction ran under the request deadline {deadlines}")
+        return False
+
+    if not completion.called or "turn 0" not in completion.call_args.kwargs["messages"][0]["content"]:
+        print("❌ FAILED: Older turns were not sent to the summarizer.")
+        return False
+    kept = len(user_data.messages)
+    if kept >= 40 or user_data.messages[-1] is not newest or user_data.active_summary != "The user counted turns.":
+        print("❌ FAILED: History was not compacted.")
+        return False
+    if user_data.token_ledger.tokens_since(0) > settings.keep_recent_tokens:
+        print("❌ FAILED: Token ledger does not match the compacted history.")
+        return False
+    if await count_rows(user_id) != 40:
+        print("❌ FAILED: Archived rows must stay stored.")
+        return False
+    print("✅ PASSED: Older turns are summarized in the background.")
+
+    # 2. A reload returns the summary and only the active window
+    storage.users_data_cache.pop(user_id, None)
+    del user_data
+    reloaded = await get_or_create_user_data(user_id)
+    if len(reloaded.messages) != kept or reloaded.active_summary != "The user counted turns.":
+        print("❌ FAILED: Reload did not restore the summary and active window.")
+        return False
+    pinned = summarizer.summary_message(reloaded)
+    if pinned["role"] != "system" or "counted turns" not in pinned["content"]:
+        print("❌ FAILED: Summary is not pinned as a system message.")
+        return False
+    print("✅ PASSED: Summary and active window survive a reload.")
+
+    # 3. Clearing the context drops the summary too
+    reloaded.messages = []
+    await save_user_data(user_id)
+    storage.users_data_cache.pop(user_id, None)
+    del reloaded
+    cleared = await get_or_create_user_data(user_id)
+    if cleared.messages or cleared.active_summary:
+        print("❌ FAILED: Reset context kept the summary.")
+        return False
+    print("✅ PASSED: Reset clears the summary.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_summarization()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,107 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.config import config
+from src.utils.functions import prune_messages
+from src.utils.tokens import TokenLedger, context_budget, count_tokens, message_tokens, truncate_to_tokens
+
+
+async def test_pruning():
+    messages = [{"role": "user", "content": "word " * (i % 7 + 1)} for i in range(50)]
+    ledger = TokenLedger()
+
+    # 1. The ledger window matches a plain walk over the history
+    for budget in (0, 5, 37, 100, 10_000):
+        expected = []
+        total = 0
+        for message in reversed(messages):
+            if total + message_tokens(message) > budget:
+                break
+            total += message_tokens(message)
+            expected.insert(0, message)
+
+        pruned = await prune_messages(messages, max_tokens=budget, ledger=ledger)
+        cut = pruned[:len(pruned) - len(expected)]
+        if pruned[len(cut):] != expected or len(cut) > 1:
+            print(f"❌ FAILED: Budget {budget} kept the wrong messages.")
+            return False
+        older = messages[len(messages) - len(expected) - 1]
+        if cut and not older["content"].startswith(cut[0]["content"]):
+            print(f"❌ FAILED: Budget {budget} did not cut the next older message.")
+            return False
+
+    # 2. Appends are counted incrementally, a replaced list starts over
+    messages.append({"role": "assistant", "content": "new"})
+    await prune_messages(messages, max_tokens=10, ledger=ledger)
+    if ledger.tokens_since(0) != sum(message_tokens(m) for m in messages):
+        print("❌ FAILED: Appended message was not counted.")
+        return False
+    replaced = [{"role": "user", "content": "hi"}]
+    if await prune_messages(replaced, max_tokens=100, ledger=ledger) != replaced:
+        print("❌ FAILED: Replaced history was not recounted.")
+        return False
+
+    if context_budget("gpt-4o") >= context_budget("gpt-5") or context_budget("gpt-5", 1000) != 1000:
+        print("❌ FAILED: Per-model budgets are not applied.")
+        return False
+
+    # 3. Unspaced, non-Latin text is not undercounted, cuts stay within the budget
+    text = "会议改到星期四下午三点。" * 50
+    if count_tokens(text) < len(text) // 2:
+        print(f"❌ FAILED: {len(text)} CJK characters counted as {count_tokens(text)} tokens")
+        return False
+    if count_tokens(truncate_to_tokens(text, 40)) > 40 or not text.startswith(truncate_to_tokens(text, 40)):
+        print("❌ FAILED: Truncated text exceeds its token budget.")
+        return False
+    print("✅ PASSED: Pruning follows per-model token budgets.")
+    return True
+
+
+async def test_stored_counts():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+    await init_db()
+
+    user_id = 888901
+    user_data = await get_or_create_user_data(user_id)
+    user_data.messages = [{"role": "user", "content": "How many tokens is this?"}]
+    await save_user_data(user_id)
+
+    async with storage.backend.engine.reader() as db:
+        async with db.execute(
+            "SELECT token_count FROM ConversationMessages WHERE user_id = ?", (str(user_id),)
+        ) as cursor:
+            stored = [row["token_count"] for row in await cursor.fetchall()]
+    if stored != [message_tokens(user_data.messages[0])]:
+        print(f"❌ FAILED: Unexpected stored token counts {stored}")
+        return False
+
+    storage.users_data_cache.pop(user_id, None)
+    del user_data
+    reloaded = await get_or_create_user_data(user_id)
+    if reloaded.token_ledger.tokens_since(0) != stored[0]:
+        print("❌ FAILED: Loaded history did not seed the token ledger.")
+        return False
+    print("✅ PASSED: Token counts are stored once and reused on load.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_pruning() and await test_stored_counts()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
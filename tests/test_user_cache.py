@@ -0,0 +1,85 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.cache import UserDataCache
+from src.database.entities import UserData
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.config import config
+
+
+def test_budget_and_ttl():
+    cache = UserDataCache(max_bytes=10_000, ttl=60)
+    for user_id in range(3):
+        user_data = UserData(user_id=user_id)
+        user_data.messages = [{"role": "user", "content": "x" * 3000}]
+        cache.put(user_data)
+
+    victims = cache.victims()
+    if victims != [0]:
+        print(f"❌ FAILED: Expected the least recently used user to go, got {victims}")
+        return False
+
+    cache.get(0)
+    if cache.victims() != [1]:
+        print("❌ FAILED: Access did not refresh recency.")
+        return False
+
+    if cache.victims(now=10**9) != [1, 2]:
+        print("❌ FAILED: Idle entries were not expired.")
+        return False
+
+    print("✅ PASSED: Victims follow LRU order, memory budget and TTL.")
+    return True
+
+
+async def test_dirty_eviction():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    config.database.write_behind = True
+    config.database.flush_interval_ms = 60_000
+    await init_db()
+
+    user_id = 666001
+    storage.users_data_cache.pop(user_id, None)
+    user_data = await get_or_create_user_data(user_id)
+    user_data.messages = [{"role": "user", "content": "keep me"}]
+    await save_user_data(user_id)
+
+    # Shrink the budget so the dirty user is evicted on the next access
+    storage.users_data_cache.max_bytes = 0
+    await get_or_create_user_data(666002)
+    storage.users_data_cache.max_bytes = config.cache.user_cache_mb * 1024 * 1024
+
+    if user_id in storage.users_data_cache or user_id in storage.dirty_users:
+        print("❌ FAILED: Dirty user was not flushed and evicted.")
+        return False
+
+    del user_data
+    reloaded = await get_or_create_user_data(user_id)
+    if reloaded.messages != [{"role": "user", "content": "keep me"}]:
+        print(f"❌ FAILED: Evicted user lost data: {reloaded.messages}")
+        return False
+
+    print("✅ PASSED: Dirty users are flushed before eviction.")
+    return True
+
+
+async def run_test():
+    try:
+        return test_budget_and_ttl() and await test_dirty_eviction()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
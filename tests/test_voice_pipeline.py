@@ -0,0 +1,90 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import config
+from src.utils import audio
+from src.utils.audio import AudioProcessingError, transcode
+from src.utils.functions import process_voice_message
+
+
+class FakeBot:
+    def __init__(self, files):
+        self.files = files
+
+    async def download(self, file, destination=None):
+        await asyncio.sleep(0.01)
+        return io.BytesIO(self.files[file.file_id])
+
+
+def voice_message(file_id):
+    return SimpleNamespace(voice=SimpleNamespace(file_id=file_id, file_unique_id=f"unique-{file_id}", duration=5))
+
+
+async def test_voice_pipeline():
+    bot = FakeBot({"a": b"OggS first note", "b": b"OggS second note"})
+    uploads = []
+
+    async def speech_to_text(audio_bytes, filename, user_id=None, on_queued=None):
+        uploads.append((audio_bytes, filename))
+        return audio_bytes.decode()[5:]
+
+    # 1. Two notes from one user at once: downloaded to memory, sent as OGG
+    with patch("src.services.transcription.OpenAIService.speech_to_text", speech_to_text):
+        texts = await asyncio.gather(
+            process_voice_message(bot, voice_message("a"), 1),
+            process_voice_message(bot, voice_message("b"), 1),
+        )
+    if texts != ["first note", "second note"] or {name for _, name in uploads} != {"voice.ogg"}:
+        print(f"❌ FAILED: Concurrent voice notes mixed up: {texts}, {uploads}")
+        return False
+    if (project_root / "data/voice/voice_1.ogg").exists():
+        print("❌ FAILED: Voice note written to a temp path.")
+        return False
+    print("✅ PASSED: Voice notes are transcribed from memory without transcoding.")
+
+    # 2. Transcoding pipes through ffmpeg, bounded by the shared slots
+    with tempfile.TemporaryDirectory() as directory:
+        fake_ffmpeg = Path(directory) / "ffmpeg"
+        fake_ffmpeg.write_text("#!/bin/sh\nsleep 0.2\ncat\n")
+        os.chmod(fake_ffmpeg, 0o755)
+        with patch.object(config.voice, "ffmpeg_path", str(fake_ffmpeg)), \
+                patch.object(config.voice, "ffmpeg_processes", 2), patch.object(audio, "_ffmpeg_slots", None):
+            started = time.monotonic()
+            outputs = await asyncio.gather(*(transcode(f"clip {i}".encode(), "mp3") for i in range(5)))
+            if outputs != [f"clip {i}".encode() for i in range(5)]:
+                print(f"❌ FAILED: Unexpected transcode output {outputs}")
+                return False
+            # Five runs two at a time take three rounds
+            if time.monotonic() - started < 0.6:
+                print("❌ FAILED: More ffmpeg processes ran than allowed.")
+                return False
+
+            fake_ffmpeg.write_text("#!/bin/sh\necho 'Invalid data' >&2\nexit 1\n")
+            try:
+                await transcode(b"not audio", "mp3")
+                print("❌ FAILED: ffmpeg errors must be raised.")
+                return False
+            except AudioProcessingError as e:
+                if "Invalid data" not in str(e):
+                    print(f"❌ FAILED: ffmpeg error message lost: {e}")
+                    return False
+    print("✅ PASSED: Transcoding runs through piped, bounded ffmpeg processes.")
+    return True
+
+
+if __name__ == "__main__":
+    if asyncio.run(test_voice_pipeline()):
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Setup path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.database import storage
+from src.database.storage import init_db, close_db, save_user_data, get_or_create_user_data
+from src.config import config
+
+
+async def count_stored(user_ids):
+    async with storage.backend.engine.reader() as db:
+        placeholders = ",".join("?" for _ in user_ids)
+        async with db.execute(
+            f"SELECT COUNT(*) FROM UsersData WHERE user_id IN ({placeholders})",
+            [str(user_id) for user_id in user_ids],
+        ) as cursor:
+            return (await cursor.fetchone())[0]
+
+
+async def test_write_behind():
+    if not config.security.encryption_key:
+        from cryptography.fernet import Fernet
+        config.security.encryption_key = Fernet.generate_key().decode()
+
+    config.database.write_behind = True
+    config.database.flush_interval_ms = 60_000
+    config.database.flush_max_records = 1_000
+    await init_db()
+
+    user_ids = [777001, 777002, 777003]
+    for user_id in user_ids:
+        storage.users_data_cache.pop(user_id, None)
+    async with storage.backend.engine.writer() as db:
+        await db.executemany(
+            "DELETE FROM UsersData WHERE user_id = ?", [(str(user_id),) for user_id in user_ids]
+        )
+
+    # 1. Saves only mark users dirty
+    for user_id in user_ids:
+        user_data = await get_or_create_user_data(user_id)
+        user_data.count_messages = 5
+        await save_user_data(user_id)
+
+    if await count_stored(user_ids) != 0:
+        print("❌ FAILED: Write-behind wrote synchronously.")
+        return False
+    print("✅ PASSED: Saves are deferred while write-behind is enabled.")
+
+    # 2. A forced flush writes every dirty user in one batch
+    written = await storage.flush_dirty_users()
+    if written != len(user_ids) or await count_stored(user_ids) != len(user_ids):
+        print(f"❌ FAILED: Flush wrote {written} users.")
+        return False
+    print("✅ PASSED: Dirty users are flushed in a single batch.")
+
+    # 3. Shutdown flushes pending changes
+    user_data = await get_or_create_user_data(user_ids[0])
+    user_data.count_messages = 9
+    await save_user_data(user_ids[0])
+    await close_db()
+
+    await init_db()
+    storage.users_data_cache.pop(user_ids[0], None)
+    if (await get_or_create_user_data(user_ids[0])).count_messages != 9:
+        print("❌ FAILED: Pending write was lost on shutdown.")
+        return False
+    print("✅ PASSED: close_db() flushes pending writes.")
+    return True
+
+
+async def run_test():
+    try:
+        return await test_write_behind()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    if asyncio.run(run_test()):
+        sys.exit(0)
+    else:
+        sys.exit(1)